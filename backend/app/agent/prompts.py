@@ -1,26 +1,36 @@
 """
 Prompts for SQL generation, fixing, clarifications, and summarization.
 """
+import sys
+from functools import lru_cache
+from typing import Tuple
 
 
-def get_sql_generation_prompt(schema_info: str, dialect: str = "postgres") -> str:
-    """Get the system prompt for SQL generation."""
-    return f"""You are an expert SQL analyst for a pharmaceutical company. Generate precise SQL queries based on user questions.
+# Prompts are laid out as a fixed instruction block, then the schema, then
+# any per-request settings. Providers cache prompt prefixes, so keeping the
+# invariant text first lets repeated calls reuse the cached part.
+# The fixed segments are interned and joined with the dynamic values, so
+# identical segments are the same object across every built prompt.
+
+_SCHEMA_HEADER = sys.intern("\n\nSCHEMA:\n")
+_AVAILABLE_DATA_HEADER = sys.intern("\n\nAVAILABLE DATA:\n")
+_DIALECT_HEADER = sys.intern("\n\nDIALECT: ")
 
-SCHEMA:
-{schema_info}
+_SQL_GENERATION_RULES = """You are an expert SQL analyst for a pharmaceutical company. Generate precise SQL queries based on user questions.
 
 RULES:
 1. Generate ONLY SELECT statements. Never use INSERT, UPDATE, DELETE, DROP, or any DDL/DML.
 2. Do NOT use SELECT *. Always explicitly list the columns needed.
-3. Only reference tables and columns that exist in the schema above.
-4. Use {dialect} dialect.
+3. Only reference tables and columns that exist in the schema below.
+4. Use the SQL dialect given at the end of these instructions.
 5. Apply case-insensitive filtering for text: use LOWER(column) LIKE LOWER('%value%')
 6. Include appropriate JOINs when data from multiple tables is needed.
 7. Use meaningful column aliases for clarity.
 8. Order results logically (e.g., by revenue DESC for top products).
 9. Do NOT add LIMIT unless specifically asked - the system will apply limits.
-10. For aggregations, always include GROUP BY.
+10. For aggregations, always include GROUP BY."""
+
+_SQL_GENERATION_INSTRUCTIONS = sys.intern(_SQL_GENERATION_RULES + """
 
 OUTPUT:
 Return ONLY the SQL query. No explanations, no markdown formatting, just the raw SQL.
@@ -30,15 +40,57 @@ SELECT p.name AS product_name, SUM(s.revenue) AS total_revenue
 FROM product p
 JOIN sales s ON p.id = s.product_id
 GROUP BY p.id, p.name
-ORDER BY total_revenue DESC"""
+ORDER BY total_revenue DESC""")
 
 
-def get_sql_fix_prompt(schema_info: str) -> str:
-    """Get the system prompt for SQL fixing."""
-    return f"""You are an expert SQL debugger. Fix the SQL query based on the error provided.
+@lru_cache(maxsize=32)
+def get_sql_generation_prompt_parts(schema_info: str, dialect: str = "postgres") -> Tuple[str, str]:
+    """
+    Get the SQL generation system prompt as a (prefix, suffix) pair.
+    
+    The prefix (instructions and schema) is stable across requests and can
+    be marked for provider-side prompt caching; the suffix holds the dialect.
+    """
+    prefix = "".join((_SQL_GENERATION_INSTRUCTIONS, _SCHEMA_HEADER, schema_info))
+    suffix = "".join((_DIALECT_HEADER, dialect))
+    return prefix, suffix
 
-SCHEMA:
-{schema_info}
+
+@lru_cache(maxsize=32)
+def get_sql_generation_prompt(schema_info: str, dialect: str = "postgres") -> str:
+    """Get the system prompt for SQL generation."""
+    return "".join(get_sql_generation_prompt_parts(schema_info, dialect))
+
+
+# Same rules, but the model answers with the SQL plus assumptions and
+# follow-up questions in one JSON object, saving separate round-trips
+_SQL_PLAN_INSTRUCTIONS = sys.intern(_SQL_GENERATION_RULES + """
+
+OUTPUT:
+Return ONLY a JSON object with these keys:
+{
+  "sql": "the SQL query, no markdown",
+  "assumptions": ["short assumptions made when interpreting the question"],
+  "follow_up_questions": ["2-3 natural follow-up questions the user might ask next"]
+}
+
+Follow-up questions should be answerable with the available data.""")
+
+
+@lru_cache(maxsize=32)
+def get_sql_plan_prompt_parts(schema_info: str, dialect: str = "postgres") -> Tuple[str, str]:
+    """
+    Get the structured SQL plan system prompt as a (prefix, suffix) pair.
+    
+    Like get_sql_generation_prompt_parts, but asks for a JSON object with
+    the SQL, assumptions and follow-up questions.
+    """
+    prefix = "".join((_SQL_PLAN_INSTRUCTIONS, _SCHEMA_HEADER, schema_info))
+    suffix = "".join((_DIALECT_HEADER, dialect))
+    return prefix, suffix
+
+
+_SQL_FIX_INSTRUCTIONS = sys.intern("""You are an expert SQL debugger. Fix the SQL query based on the error provided.
 
 RULES:
 1. Fix ONLY the issue indicated by the error.
@@ -49,16 +101,17 @@ RULES:
 6. Return ONLY the fixed SQL query, no explanations.
 
 OUTPUT:
-Return ONLY the corrected SQL query. No markdown, no explanations."""
+Return ONLY the corrected SQL query. No markdown, no explanations.""")
 
 
-def get_clarifying_questions_prompt(schema_info: str) -> str:
-    """Get the system prompt for generating clarifying questions."""
-    return f"""You are a helpful data analyst assistant. The user's question is ambiguous or incomplete.
-Generate 2-3 clarifying questions to better understand what they need.
+@lru_cache(maxsize=32)
+def get_sql_fix_prompt(schema_info: str) -> str:
+    """Get the system prompt for SQL fixing."""
+    return "".join((_SQL_FIX_INSTRUCTIONS, _SCHEMA_HEADER, schema_info))
 
-AVAILABLE DATA:
-{schema_info}
+
+_CLARIFYING_QUESTIONS_INSTRUCTIONS = sys.intern("""You are a helpful data analyst assistant. The user's question is ambiguous or incomplete.
+Generate 2-3 clarifying questions to better understand what they need.
 
 GUIDELINES:
 1. Questions should be specific and actionable.
@@ -67,12 +120,16 @@ GUIDELINES:
 4. Focus on time ranges, groupings, filters, or specific metrics.
 
 OUTPUT:
-Return 2-3 numbered questions, one per line."""
+Return 2-3 numbered questions, one per line.""")
 
 
-def get_summarization_prompt() -> str:
-    """Get the system prompt for result summarization."""
-    return """You are a business analyst presenting data insights to executives. 
+@lru_cache(maxsize=32)
+def get_clarifying_questions_prompt(schema_info: str) -> str:
+    """Get the system prompt for generating clarifying questions."""
+    return "".join((_CLARIFYING_QUESTIONS_INSTRUCTIONS, _AVAILABLE_DATA_HEADER, schema_info))
+
+
+_SUMMARIZATION_PROMPT = """You are a business analyst presenting data insights to executives. 
 Summarize the query results in a clear, business-friendly way.
 
 GUIDELINES:
@@ -89,12 +146,12 @@ Write in natural language. No bullet points unless listing multiple items.
 For monetary values, use dollar signs and comma formatting (e.g., $1,234.56)."""
 
 
-def get_scope_check_prompt(schema_info: str) -> str:
-    """Get the system prompt for scope and policy checking."""
-    return f"""You are a data access policy checker. Evaluate if the user's question can be answered with the available data and follows safety policies.
+def get_summarization_prompt() -> str:
+    """Get the system prompt for result summarization."""
+    return _SUMMARIZATION_PROMPT
 
-AVAILABLE DATA:
-{schema_info}
+
+_SCOPE_CHECK_INSTRUCTIONS = sys.intern("""You are a data access policy checker. Evaluate if the user's question can be answered with the available data and follows safety policies.
 
 POLICIES:
 1. Only SELECT queries are allowed - no data modification.
@@ -104,19 +161,23 @@ POLICIES:
 5. If the question asks for data we don't have, explain what IS available.
 
 EVALUATE the user's question and respond with a JSON object:
-{{
+{
   "allowed": true/false,
   "reason": "explanation if not allowed",
   "ambiguous": true/false,
   "ambiguity_reason": "why it's ambiguous if applicable"
-}}
+}
 
-Only return the JSON object, nothing else."""
+Only return the JSON object, nothing else.""")
 
 
-def get_follow_up_generation_prompt() -> str:
-    """Get the system prompt for generating follow-up questions after a successful query."""
-    return """Based on the query results and user's original question, suggest 2-3 natural follow-up questions they might want to ask.
+@lru_cache(maxsize=32)
+def get_scope_check_prompt(schema_info: str) -> str:
+    """Get the system prompt for scope and policy checking."""
+    return "".join((_SCOPE_CHECK_INSTRUCTIONS, _AVAILABLE_DATA_HEADER, schema_info))
+
+
+_FOLLOW_UP_GENERATION_PROMPT = """Based on the query results and user's original question, suggest 2-3 natural follow-up questions they might want to ask.
 
 GUIDELINES:
 1. Questions should be logical next steps in the analysis.
@@ -126,3 +187,8 @@ GUIDELINES:
 
 OUTPUT:
 Return 2-3 questions, one per line, without numbering."""
+
+
+def get_follow_up_generation_prompt() -> str:
+    """Get the system prompt for generating follow-up questions after a successful query."""
+    return _FOLLOW_UP_GENERATION_PROMPT
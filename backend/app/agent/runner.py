@@ -0,0 +1,121 @@
+"""
+Queue-fed executor for workflow runs.
+Request handlers submit jobs and await the result; a fixed set of workers
+runs them on a dedicated thread pool, so the number of concurrent
+workflows is bounded and the event loop never runs one itself.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.agent.workflow import run_agent
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AgentJob(NamedTuple):
+    """Arguments for one run_agent call."""
+    session_id: str
+    user_question: str
+    conversation_context: str
+    on_token: Optional[Callable[[str], None]] = None
+
+
+class AgentRunner:
+    """
+    Runs workflow jobs from an asyncio queue on `workers` threads.
+
+    Before start() is called (scripts and tests that don't run the app's
+    startup) jobs run directly in a worker thread.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue: Optional["asyncio.Queue[Tuple[AgentJob, asyncio.Future]]"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        # Futures of jobs a worker is running right now
+        self._in_flight: Set[asyncio.Future] = set()
+
+    def start(self) -> None:
+        """Start the workers on the running event loop."""
+        if self._queue is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="agent")
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs still running or queued fail with RuntimeError."""
+        if self._queue is None or self._executor is None:
+            return
+        # Cancelled workers drop their job, so take the running ones first
+        pending = list(self._in_flight)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait()[1])
+        for future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Agent runner stopped"))
+        self._executor.shutdown(wait=False)
+        self._queue = self._executor = None
+        self._tasks = []
+
+    async def run(
+        self,
+        session_id: str,
+        user_question: str,
+        conversation_context: str = "",
+        on_token: Optional[Callable[[str], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the workflow for a question and return its final state.
+        on_token is passed to run_agent and is called from a worker thread.
+        """
+        job = AgentJob(session_id, user_question, conversation_context, on_token)
+        if self._queue is None:
+            return await asyncio.to_thread(run_agent, *job)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future = await self._queue.get()
+            if future.done():
+                continue  # caller went away (request cancelled)
+            self._in_flight.add(future)
+            try:
+                result = await loop.run_in_executor(self._executor, run_agent, *job)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._in_flight.discard(future)
+
+
+_agent_runner: Optional[AgentRunner] = None
+_agent_runner_lock = threading.Lock()
+
+
+def get_agent_runner() -> AgentRunner:
+    """Get the shared agent runner (singleton)."""
+    global _agent_runner
+    if _agent_runner is None:
+        with _agent_runner_lock:
+            if _agent_runner is None:
+                _agent_runner = AgentRunner(workers=get_settings().agent_workers)
+    return _agent_runner
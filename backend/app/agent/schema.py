@@ -1,54 +1,142 @@
 """
 Schema introspection and grounding for safe SQL generation.
 """
-from typing import Dict, List, Optional, Set
+import hashlib
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, Optional, Set, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import OptimizeError
+from sqlglot.optimizer.qualify_columns import qualify_columns
+from sqlglot.optimizer.scope import traverse_scope
+from sqlglot.schema import MappingSchema
 from sqlalchemy import text, inspect
 
 from app.db.engine import get_engine
 
 
 # Allowlist of tables and columns that can be queried
-# This is the source of truth for what the LLM can reference
-ALLOWED_SCHEMA: Dict[str, List[str]] = {
-    "product": ["id", "name", "category", "unit_price", "created_at"],
-    "territory": ["id", "name", "region", "country", "created_at"],
-    "hcp": ["id", "first_name", "last_name", "specialty", "territory_id", "email", "created_at"],
-    "sales": ["id", "product_id", "territory_id", "hcp_id", "quantity", "revenue", "sale_date", "created_at"],
-}
+# This is the source of truth for what the LLM can reference.
+# Frozen (read-only mapping of tuples) so it can be shared without copying;
+# callers that need to mutate must make their own copy.
+ALLOWED_SCHEMA: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+    "product": ("id", "name", "category", "unit_price", "created_at"),
+    "territory": ("id", "name", "region", "country", "created_at"),
+    "hcp": ("id", "first_name", "last_name", "specialty", "territory_id", "email", "created_at"),
+    "sales": ("id", "product_id", "territory_id", "hcp_id", "quantity", "revenue", "sale_date", "created_at"),
+})
+
+# Lower-cased column sets per table for O(1) membership checks
+_ALLOWED_COLS_LOWER: Mapping[str, FrozenSet[str]] = MappingProxyType({
+    table: frozenset(col.lower() for col in columns)
+    for table, columns in ALLOWED_SCHEMA.items()
+})
+
+# sqlglot schema used to resolve unqualified columns to their owning table
+_SCHEMA_MAPPING = MappingSchema(
+    {table: {col: "UNKNOWN" for col in columns} for table, columns in ALLOWED_SCHEMA.items()},
+    dialect="postgres",
+)
 
 # Tables that should never be exposed to queries
 BLOCKED_TABLES: Set[str] = {"audit_log"}
 
+# AST node types the validator inspects
+_REFERENCE_NODES = (exp.Table, exp.CTE, exp.Column)
+
+# DDL/DML keywords rejected before paying for a full parse. The scan runs on
+# SQL with comments, string literals and quoted identifiers blanked out, so
+# `WHERE category = 'Update'` or a leading `-- comment` don't trip it.
+_SQL_NOISE_RE = re.compile(
+    r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/",
+    re.DOTALL,
+)
+_FORBIDDEN_STATEMENT_RE = re.compile(
+    r"\b(insert|update|delete|drop|alter|truncate|create|grant|revoke|merge)\b",
+    re.IGNORECASE,
+)
+_SELECT_START_RE = re.compile(r"[\s(]*(select|with)\b", re.IGNORECASE)
+
+# Keywords that indicate specific tables
+_TABLE_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "product": ("product", "drug", "medication", "medicine"),
+    "territory": ("territory", "region", "area", "location", "geography"),
+    "hcp": ("hcp", "doctor", "physician", "healthcare", "prescriber"),
+    "sales": ("sales", "revenue", "sold", "transaction", "quantity", "purchase"),
+}
+
+# Whole-word keyword sets (singular and simple plural) per table for the
+# fast token-intersection path in ground_schema_for_question
+_TABLE_KEYWORD_SETS: Mapping[str, FrozenSet[str]] = MappingProxyType({
+    table: frozenset(keywords) | frozenset(f"{kw}s" for kw in keywords)
+    for table, keywords in _TABLE_KEYWORDS.items()
+})
 
-def get_allowed_schema() -> Dict[str, List[str]]:
+_WORD_RE = re.compile(r"[a-z]+")
+
+# One alternation with a named group per table, so a single scan of the
+# question reports every mentioned table via match.lastgroup
+_TABLE_KEYWORDS_RE = re.compile("|".join(
+    f"(?P<{table}>{'|'.join(map(re.escape, keywords))})"
+    for table, keywords in _TABLE_KEYWORDS.items()
+))
+
+
+def get_allowed_schema() -> Mapping[str, Tuple[str, ...]]:
     """
     Get the allowlist of tables and columns.
     
     Returns:
-        Dict mapping table names to list of allowed column names
+        Read-only mapping of table names to allowed column names
     """
-    return ALLOWED_SCHEMA.copy()
+    return ALLOWED_SCHEMA
 
 
 def get_schema_info_string() -> str:
     """
     Get a formatted string describing the allowed schema for LLM prompts.
     
+    The string is built once at import time, so every prompt gets a
+    byte-identical schema block.
+    
     Returns:
         Human-readable schema description
     """
+    return _SCHEMA_INFO_STRING
+
+
+# Foreign-key hints included in the schema description
+_SCHEMA_RELATIONSHIPS: Tuple[str, ...] = (
+    "sales.product_id -> product.id",
+    "sales.territory_id -> territory.id",
+    "sales.hcp_id -> hcp.id",
+    "hcp.territory_id -> territory.id",
+)
+
+
+def _build_schema_info_string() -> str:
+    """
+    Build the schema description used by get_schema_info_string.
+    
+    Tables, columns and relationships are emitted in sorted order so the
+    text is byte-stable regardless of declaration or introspection order;
+    any change to it invalidates provider-side prompt caches.
+    """
     lines = ["Available tables and columns:"]
     
-    for table, columns in ALLOWED_SCHEMA.items():
-        col_str = ", ".join(columns)
+    for table, columns in sorted(ALLOWED_SCHEMA.items()):
+        col_str = ", ".join(sorted(columns))
         lines.append(f"\n{table}: {col_str}")
     
     # Add relationship hints
     lines.append("\n\nRelationships:")
-    lines.append("- sales.product_id -> product.id")
-    lines.append("- sales.territory_id -> territory.id")
-    lines.append("- sales.hcp_id -> hcp.id")
-    lines.append("- hcp.territory_id -> territory.id")
+    lines.extend(f"- {rel}" for rel in sorted(_SCHEMA_RELATIONSHIPS))
     
     return "\n".join(lines)
 
@@ -60,19 +148,45 @@ def get_schema_summary() -> str:
     Returns:
         Brief schema summary string
     """
-    return (
-        "Pharmaceutical sales database with products, territories, "
-        "healthcare professionals (HCPs), and sales transactions."
-    )
+    return _SCHEMA_SUMMARY
+
+
+# Live introspection results are cached briefly; the DB schema rarely changes.
+# TTL is jittered so multiple workers don't all refresh at the same moment.
+_INTROSPECT_TTL_SECONDS = 60.0
+_introspect_cache: Dict[str, object] = {"value": None, "expires": 0.0}
+_introspect_lock = threading.Lock()
 
 
 def introspect_schema() -> Dict[str, List[str]]:
     """
     Introspect the actual database schema.
     
+    Results are cached for about a minute. Concurrent callers that miss the
+    cache wait on a lock so only one of them queries the database.
+    The returned dict is shared and must not be mutated.
+    
     Returns:
         Dict mapping table names to list of column names
     """
+    if time.monotonic() < _introspect_cache["expires"]:
+        return _introspect_cache["value"]
+    
+    with _introspect_lock:
+        # Another caller may have refreshed the cache while we waited
+        if time.monotonic() < _introspect_cache["expires"]:
+            return _introspect_cache["value"]
+        
+        schema = _introspect_schema_uncached()
+        _introspect_cache["value"] = schema
+        _introspect_cache["expires"] = (
+            time.monotonic() + _INTROSPECT_TTL_SECONDS * random.uniform(0.95, 1.05)
+        )
+        return schema
+
+
+def _introspect_schema_uncached() -> Dict[str, List[str]]:
+    """Query the database for table and column names."""
     engine = get_engine()
     inspector = inspect(engine)
     
@@ -82,7 +196,63 @@ def introspect_schema() -> Dict[str, List[str]]:
             columns = [col['name'] for col in inspector.get_columns(table_name)]
             schema[table_name] = columns
     
-    return schema
+    # Canonical order: the DB's table/column order isn't guaranteed stable
+    return {table: sorted(columns) for table, columns in sorted(schema.items())}
+
+
+@lru_cache(maxsize=512)
+def _parse_postgres(sql: str) -> exp.Expression:
+    """
+    Parse SQL with the postgres dialect, caching the AST per SQL string.
+    
+    The returned tree is shared between callers and must not be mutated.
+    """
+    return sqlglot.parse_one(sql, read='postgres')
+
+
+@lru_cache(maxsize=512)
+def _qualify_postgres(sql: str) -> Optional[exp.Expression]:
+    """
+    Qualify every column of the parsed SQL with its source table.
+    
+    Returns None when sqlglot cannot resolve the columns (e.g. a qualified
+    column that doesn't exist). The returned tree is shared and must not
+    be mutated.
+    """
+    try:
+        return qualify_columns(_parse_postgres(sql).copy(), schema=_SCHEMA_MAPPING)
+    except OptimizeError:
+        return None
+
+
+def _check_qualified_columns(qualified: exp.Expression) -> List[str]:
+    """Check columns of a qualified tree against the allowlist, scope by scope."""
+    violations = []
+    
+    for scope in traverse_scope(qualified):
+        for column in scope.columns:
+            col_name = column.name.lower()
+            
+            if column.table:
+                source = scope.sources.get(column.table)
+                # Columns from CTEs/subqueries are checked in their own scope
+                if isinstance(source, exp.Table):
+                    table_name = source.name.lower()
+                    if (table_name in _ALLOWED_COLS_LOWER
+                            and col_name not in _ALLOWED_COLS_LOWER[table_name]):
+                        violations.append(f"Column '{col_name}' not found in table '{table_name}'")
+                continue
+            
+            # Still unqualified after resolution: either ambiguous or unknown.
+            # Only flag it when every source is an allowed table lacking it.
+            sources = list(scope.sources.values())
+            if sources and all(
+                isinstance(src, exp.Table) and src.name.lower() in _ALLOWED_COLS_LOWER
+                for src in sources
+            ) and not any(col_name in _ALLOWED_COLS_LOWER[src.name.lower()] for src in sources):
+                violations.append(f"Unknown column '{col_name}'")
+    
+    return violations
 
 
 def validate_schema_references(sql: str) -> tuple[bool, List[str]]:
@@ -95,57 +265,73 @@ def validate_schema_references(sql: str) -> tuple[bool, List[str]]:
     Returns:
         Tuple of (is_valid, list_of_violations)
     """
-    import sqlglot
-    from sqlglot import exp
-    
     violations = []
     
+    # Cheap rejects first: obvious non-SELECT statements never reach the parser
+    keywords_only = _SQL_NOISE_RE.sub(" ", sql)
+    if _FORBIDDEN_STATEMENT_RE.search(keywords_only):
+        return False, ["Non-SELECT statement forbidden"]
+    if not _SELECT_START_RE.match(keywords_only):
+        return False, ["Only SELECT statements are allowed"]
+    
     try:
-        parsed = sqlglot.parse_one(sql, read='postgres')
+        parsed = _parse_postgres(sql)
     except Exception as e:
         return False, [f"SQL parse error: {str(e)}"]
     
-    # Collect all table references
-    referenced_tables = set()
-    for table in parsed.find_all(exp.Table):
+    qualified = _qualify_postgres(sql)
+    
+    # Single iterative walk of the raw tree collecting table references, CTE
+    # names, and (for the fallback check) table-qualified columns
+    tables: List[exp.Table] = []
+    cte_names: Set[str] = set()
+    unresolved_columns: List[exp.Column] = []
+    stack: List[exp.Expression] = [parsed]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _REFERENCE_NODES):
+            if isinstance(node, exp.Table):
+                tables.append(node)
+            elif isinstance(node, exp.CTE):
+                cte_names.add(node.alias_or_name.lower())
+            elif qualified is None and node.table:
+                unresolved_columns.append(node)
+        
+        for child in node.args.values():
+            if isinstance(child, exp.Expression):
+                stack.append(child)
+            elif isinstance(child, list):
+                stack.extend(c for c in child if isinstance(c, exp.Expression))
+    
+    # CTE names show up as table references but aren't real tables
+    table_aliases: Dict[str, str] = {}
+    for table in tables:
         table_name = table.name.lower()
-        referenced_tables.add(table_name)
+        table_aliases[table.alias_or_name.lower()] = table_name
         
+        if table_name in cte_names:
+            continue
         if table_name in BLOCKED_TABLES:
             violations.append(f"Table '{table_name}' is not accessible")
         elif table_name not in ALLOWED_SCHEMA:
             violations.append(f"Unknown table '{table_name}'")
     
-    # Collect all column references and validate against allowed columns
-    for column in parsed.find_all(exp.Column):
-        col_name = column.name.lower()
-        table_ref = column.table.lower() if column.table else None
-        
-        if table_ref:
-            # Column has explicit table reference
-            if table_ref in ALLOWED_SCHEMA:
-                allowed_cols = [c.lower() for c in ALLOWED_SCHEMA[table_ref]]
-                if col_name not in allowed_cols:
-                    violations.append(f"Column '{col_name}' not found in table '{table_ref}'")
-        else:
-            # Column without table reference - check all referenced tables
-            found = False
-            for table in referenced_tables:
-                if table in ALLOWED_SCHEMA:
-                    allowed_cols = [c.lower() for c in ALLOWED_SCHEMA[table]]
-                    if col_name in allowed_cols:
-                        found = True
-                        break
-            
-            # Also check common aliases/expressions (be lenient for aggregates)
-            if not found and col_name not in ['count', 'sum', 'avg', 'min', 'max']:
-                # Only flag as error if it looks like a real column reference
-                pass  # Be lenient for now - let DB catch actual errors
+    # Columns without a table reference may be aliases or aggregate outputs;
+    # the fallback is lenient with those and lets the DB catch actual errors
+    for column in unresolved_columns:
+        table_ref = table_aliases.get(column.table.lower(), column.table.lower())
+        if table_ref in _ALLOWED_COLS_LOWER:
+            col_name = column.name.lower()
+            if col_name not in _ALLOWED_COLS_LOWER[table_ref]:
+                violations.append(f"Column '{col_name}' not found in table '{table_ref}'")
+    
+    if qualified is not None:
+        violations.extend(_check_qualified_columns(qualified))
     
     return len(violations) == 0, violations
 
 
-def ground_schema_for_question(question: str) -> Dict[str, List[str]]:
+def ground_schema_for_question(question: str) -> Mapping[str, Tuple[str, ...]]:
     """
     Determine which tables are relevant for a given question.
     
@@ -153,38 +339,55 @@ def ground_schema_for_question(question: str) -> Dict[str, List[str]]:
         question: The user's natural language question
         
     Returns:
-        Subset of allowed schema relevant to the question
+        Subset of allowed schema relevant to the question. When every table
+        is relevant, the shared read-only ALLOWED_SCHEMA is returned as-is.
     """
-    question_lower = question.lower()
+    tables = _ground_tables(question.lower().strip())
     
-    # Start with all tables by default for comprehensive queries
-    relevant = {}
+    if tables is None:
+        return ALLOWED_SCHEMA
     
-    # Keywords that indicate specific tables
-    table_keywords = {
-        "product": ["product", "drug", "medication", "medicine"],
-        "territory": ["territory", "region", "area", "location", "geography"],
-        "hcp": ["hcp", "doctor", "physician", "healthcare", "prescriber"],
-        "sales": ["sales", "revenue", "sold", "transaction", "quantity", "purchase"],
+    # Build relevant schema only for a strict subset of tables
+    return {table: ALLOWED_SCHEMA[table] for table in tables}
+
+
+@lru_cache(maxsize=2048)
+def _ground_tables(question_lower: str) -> Optional[Tuple[str, ...]]:
+    """
+    Find the tables a lower-cased question refers to.
+    
+    Returns None when the whole schema is relevant, otherwise the tables
+    in schema order.
+    """
+    # Fast path: whole-word set intersection against the keyword sets
+    tokens = frozenset(_WORD_RE.findall(question_lower))
+    mentioned_tables = {
+        table for table, keywords in _TABLE_KEYWORD_SETS.items() if keywords & tokens
     }
     
-    # Check which tables are relevant
-    mentioned_tables = set()
-    for table, keywords in table_keywords.items():
-        if any(kw in question_lower for kw in keywords):
-            mentioned_tables.add(table)
+    # Fall back to substring matching (e.g. "regional" still matches "region")
+    if not mentioned_tables:
+        mentioned_tables = {
+            match.lastgroup for match in _TABLE_KEYWORDS_RE.finditer(question_lower)
+        }
     
     # If no specific tables mentioned, include all
     if not mentioned_tables:
-        return ALLOWED_SCHEMA.copy()
+        return None
     
     # Sales queries usually need related tables for context
     if "sales" in mentioned_tables:
-        mentioned_tables.update(["product", "territory", "hcp"])
+        return None
     
-    # Build relevant schema
-    for table in mentioned_tables:
-        if table in ALLOWED_SCHEMA:
-            relevant[table] = ALLOWED_SCHEMA[table]
-    
-    return relevant if relevant else ALLOWED_SCHEMA.copy()
+    return tuple(table for table in ALLOWED_SCHEMA if table in mentioned_tables)
+
+# Static prompt fragments, computed once at import
+_SCHEMA_INFO_STRING = _build_schema_info_string()
+
+# Fingerprint of the schema text sent to the LLM; a change here means every
+# cached prompt prefix is invalidated (useful when correlating cache misses)
+SCHEMA_FINGERPRINT = hashlib.sha256(_SCHEMA_INFO_STRING.encode("utf-8")).hexdigest()
+_SCHEMA_SUMMARY = (
+    "Pharmaceutical sales database with products, territories, "
+    "healthcare professionals (HCPs), and sales transactions."
+)
@@ -2,30 +2,58 @@
 Stub SQL Agent - Intent Router for generating SQL queries
 This is a simple rule-based router that will be replaced with LLM-based routing later.
 """
-from typing import Dict, Any, Optional, List
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping, Tuple
 import re
+import sys
 
 
-def route_intent(message: str) -> Dict[str, Any]:
-    """
-    Route user intent to appropriate SQL query or follow-up questions.
-    
-    Args:
-        message: The user's natural language question
-        
-    Returns:
-        Dict containing either:
-        - {"sql": <query>, "assumptions": [...]} for recognized intents
-        - {"sql": None, "follow_up_questions": [...]} for unclear intents
-    """
-    message_lower = message.lower().strip()
-    
-    # Intent: Top products by revenue
-    if _matches_intent(message_lower, ["top product", "best product", "top selling"]) and \
-       _matches_intent(message_lower, ["revenue", "sales", "selling"]):
-        return {
-            "sql": """
-SELECT 
+# Each intent matches when every one of its keyword groups is found in the
+# message. Intents are listed in priority order: the first match wins.
+_INTENT_KEYWORDS: Tuple[Tuple[str, Tuple[Tuple[str, ...], ...]], ...] = (
+    ("top_products_revenue", (
+        ("top product", "best product", "top selling"),
+        ("revenue", "sales", "selling"),
+    )),
+    ("revenue_by_territory", (
+        ("revenue", "sales"),
+        ("territory", "region", "area"),
+    )),
+    ("recent_sales", (
+        ("show sales", "list sales", "recent sales", "all sales", "sales data"),
+    )),
+    ("product_list", (
+        ("list product", "all product", "show product", "what product"),
+    )),
+    ("hcp_list", (
+        ("hcp", "doctor", "healthcare", "physician"),
+    )),
+    ("territory_list", (
+        ("list territor", "all territor", "show territor", "what territor"),
+    )),
+)
+
+
+def _intent_alternative(intent: str, groups: Tuple[Tuple[str, ...], ...]) -> str:
+    """Build a named group whose lookaheads require every keyword group."""
+    lookaheads = "".join(
+        f"(?=.*(?:{'|'.join(map(re.escape, keywords))}))" for keywords in groups
+    )
+    return f"(?P<{intent}>{lookaheads})"
+
+
+# All intents in one anchored alternation: alternatives are tried in order at
+# the start of the message, so match.lastgroup is the highest-priority intent
+_INTENT_DISPATCH_RE = re.compile(
+    "^(?:" + "|".join(_intent_alternative(i, g) for i, g in _INTENT_KEYWORDS) + ")"
+)
+
+
+# SQL templates, stored without surrounding whitespace and interned so
+# downstream caches keyed on the SQL text hash and compare cheaply
+
+_SQL_TOP_PRODUCTS = sys.intern("""SELECT
     p.name as product_name,
     SUM(s.revenue) as total_revenue,
     SUM(s.quantity) as total_quantity
@@ -33,22 +61,9 @@ FROM sales s
 JOIN product p ON s.product_id = p.id
 GROUP BY p.id, p.name
 ORDER BY total_revenue DESC
-LIMIT 10
-            """.strip(),
-            "assumptions": [
-                "Showing top 10 products by total revenue",
-                "Revenue includes all territories and time periods",
-                "Sorted by highest revenue first"
-            ],
-            "follow_up_questions": []
-        }
-    
-    # Intent: Revenue by territory
-    if _matches_intent(message_lower, ["revenue", "sales"]) and \
-       _matches_intent(message_lower, ["territory", "region", "area"]):
-        return {
-            "sql": """
-SELECT 
+LIMIT 10""")
+
+_SQL_REVENUE_BY_TERRITORY = sys.intern("""SELECT
     t.name as territory_name,
     t.region,
     SUM(s.revenue) as total_revenue,
@@ -56,21 +71,9 @@ SELECT
 FROM sales s
 JOIN territory t ON s.territory_id = t.id
 GROUP BY t.id, t.name, t.region
-ORDER BY total_revenue DESC
-            """.strip(),
-            "assumptions": [
-                "Aggregating revenue across all products",
-                "Including all time periods in the data",
-                "Grouped by territory with region information"
-            ],
-            "follow_up_questions": []
-        }
-    
-    # Intent: Show recent sales
-    if _matches_intent(message_lower, ["show sales", "list sales", "recent sales", "all sales", "sales data"]):
-        return {
-            "sql": """
-SELECT 
+ORDER BY total_revenue DESC""")
+
+_SQL_RECENT_SALES = sys.intern("""SELECT
     s.id,
     p.name as product_name,
     t.name as territory_name,
@@ -83,40 +86,17 @@ JOIN product p ON s.product_id = p.id
 JOIN territory t ON s.territory_id = t.id
 JOIN hcp h ON s.hcp_id = h.id
 ORDER BY s.sale_date DESC
-LIMIT 50
-            """.strip(),
-            "assumptions": [
-                "Showing most recent 50 sales transactions",
-                "Including product, territory, and HCP details",
-                "Sorted by date with newest first"
-            ],
-            "follow_up_questions": []
-        }
-    
-    # Intent: Products list
-    if _matches_intent(message_lower, ["list product", "all product", "show product", "what product"]):
-        return {
-            "sql": """
-SELECT 
+LIMIT 50""")
+
+_SQL_PRODUCT_LIST = sys.intern("""SELECT
     id,
     name,
     category,
     unit_price
 FROM product
-ORDER BY name
-            """.strip(),
-            "assumptions": [
-                "Listing all available products",
-                "Sorted alphabetically by name"
-            ],
-            "follow_up_questions": []
-        }
-    
-    # Intent: HCP/Doctor information
-    if _matches_intent(message_lower, ["hcp", "doctor", "healthcare", "physician"]):
-        return {
-            "sql": """
-SELECT 
+ORDER BY name""")
+
+_SQL_HCP_LIST = sys.intern("""SELECT
     h.id,
     h.first_name || ' ' || h.last_name as name,
     h.specialty,
@@ -124,47 +104,124 @@ SELECT
     h.email
 FROM hcp h
 JOIN territory t ON h.territory_id = t.id
-ORDER BY h.last_name, h.first_name
-            """.strip(),
-            "assumptions": [
-                "Listing all healthcare professionals",
-                "Including their specialty and territory",
-                "Sorted by name"
-            ],
-            "follow_up_questions": []
-        }
-    
-    # Intent: Territory list
-    if _matches_intent(message_lower, ["list territor", "all territor", "show territor", "what territor"]):
-        return {
-            "sql": """
-SELECT 
+ORDER BY h.last_name, h.first_name""")
+
+_SQL_TERRITORY_LIST = sys.intern("""SELECT
     id,
     name,
     region,
     country
 FROM territory
-ORDER BY region, name
-            """.strip(),
-            "assumptions": [
-                "Listing all territories",
-                "Sorted by region and name"
-            ],
-            "follow_up_questions": []
-        }
+ORDER BY region, name""")
+
+
+# Responses are built once at import and shared between calls.
+# They are read-only mappings; callers must copy before modifying.
+
+_TOP_PRODUCTS_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": _SQL_TOP_PRODUCTS,
+    "assumptions": (
+        "Showing top 10 products by total revenue",
+        "Revenue includes all territories and time periods",
+        "Sorted by highest revenue first",
+    ),
+    "follow_up_questions": (),
+})
+
+_REVENUE_BY_TERRITORY_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": _SQL_REVENUE_BY_TERRITORY,
+    "assumptions": (
+        "Aggregating revenue across all products",
+        "Including all time periods in the data",
+        "Grouped by territory with region information",
+    ),
+    "follow_up_questions": (),
+})
+
+_RECENT_SALES_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": _SQL_RECENT_SALES,
+    "assumptions": (
+        "Showing most recent 50 sales transactions",
+        "Including product, territory, and HCP details",
+        "Sorted by date with newest first",
+    ),
+    "follow_up_questions": (),
+})
+
+_PRODUCT_LIST_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": _SQL_PRODUCT_LIST,
+    "assumptions": (
+        "Listing all available products",
+        "Sorted alphabetically by name",
+    ),
+    "follow_up_questions": (),
+})
+
+_HCP_LIST_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": _SQL_HCP_LIST,
+    "assumptions": (
+        "Listing all healthcare professionals",
+        "Including their specialty and territory",
+        "Sorted by name",
+    ),
+    "follow_up_questions": (),
+})
+
+_TERRITORY_LIST_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": _SQL_TERRITORY_LIST,
+    "assumptions": (
+        "Listing all territories",
+        "Sorted by region and name",
+    ),
+    "follow_up_questions": (),
+})
+
+_UNKNOWN_RESPONSE: Mapping[str, Any] = MappingProxyType({
+    "sql": None,
+    "assumptions": (),
+    "follow_up_questions": (
+        "What are the top products by revenue?",
+        "Show me revenue breakdown by territory",
+        "Can you list recent sales transactions?",
+    ),
+})
+
+
+_RESPONSES: Mapping[str, Mapping[str, Any]] = MappingProxyType({
+    "top_products_revenue": _TOP_PRODUCTS_RESPONSE,
+    "revenue_by_territory": _REVENUE_BY_TERRITORY_RESPONSE,
+    "recent_sales": _RECENT_SALES_RESPONSE,
+    "product_list": _PRODUCT_LIST_RESPONSE,
+    "hcp_list": _HCP_LIST_RESPONSE,
+    "territory_list": _TERRITORY_LIST_RESPONSE,
+})
+
+
+# Anything that isn't a letter or digit collapses to a single space
+_NORMALIZE_RE = re.compile(r"[^a-z0-9]+")
+
+
+def route_intent(message: str) -> Mapping[str, Any]:
+    """
+    Route user intent to appropriate SQL query or follow-up questions.
+    
+    Args:
+        message: The user's natural language question
     
-    # Unknown intent - return follow-up questions
-    return {
-        "sql": None,
-        "assumptions": [],
-        "follow_up_questions": [
-            "What are the top products by revenue?",
-            "Show me revenue breakdown by territory",
-            "Can you list recent sales transactions?"
-        ]
-    }
-
-
-def _matches_intent(text: str, keywords: List[str]) -> bool:
-    """Check if any of the keywords appear in the text."""
-    return any(kw in text for kw in keywords)
+    Returns:
+        Read-only mapping containing either:
+        - {"sql": <query>, "assumptions": (...)} for recognized intents
+        - {"sql": None, "follow_up_questions": (...)} for unclear intents
+    """
+    normalized = _NORMALIZE_RE.sub(" ", message.lower()).strip()
+    return _route_normalized(normalized)
+
+
+@lru_cache(maxsize=1024)
+def _route_normalized(message_lower: str) -> Mapping[str, Any]:
+    """Route an already normalized message. Results are shared constants."""
+    match = _INTENT_DISPATCH_RE.match(message_lower)
+    if match is None:
+        # Unknown intent - return follow-up questions
+        return _UNKNOWN_RESPONSE
+    return _RESPONSES[match.lastgroup]
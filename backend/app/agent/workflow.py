@@ -1,10 +1,99 @@
 """
 LangGraph workflow for the Text-to-SQL agent.
 """
+import re
+import sqlite3
 import time
-from typing import TypedDict, Optional, List, Dict, Any, Annotated
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Optional, Callable, Deque, Iterable, List, Dict, Any, Annotated
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph import StateGraph, END
 
+from app.agent.schema import ground_schema_for_question, get_schema_info_string
+from app.core.config import get_settings
+
+
+# Small pool for CPU work that can overlap an LLM call (chart generation)
+_chart_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chart")
+
+# Schema description shared by every request; refreshed only by reload_schema()
+_SCHEMA_INFO_STRING = get_schema_info_string()
+
+
+# Canned follow-up questions, shared by every request. Nodes return list
+# copies because the state holds lists.
+_SHORT_QUESTION_FOLLOW_UPS = (
+    "Could you provide more details about what you'd like to know?",
+    "What specific metrics or data are you interested in?",
+    "Are you looking for data about products, territories, or sales?",
+)
+_VAGUE_QUESTION_FOLLOW_UPS = (
+    "What specific information would you like to see?",
+    "Would you like to see top products by revenue?",
+    "Are you interested in sales data by territory?",
+)
+_DEFAULT_CLARIFYING_QUESTIONS = (
+    "What specific metrics are you interested in?",
+    "Would you like to see data grouped by product, territory, or time period?",
+    "What time range should I consider?",
+)
+_EXECUTION_ERROR_FOLLOW_UPS = (
+    "Would you like to try a different question?",
+    "Can you be more specific about what data you need?",
+)
+_VALIDATION_ERROR_FOLLOW_UPS = (
+    "Could you rephrase your question?",
+    "What specific data would you like to see?",
+)
+_PRODUCT_FOLLOW_UPS = (
+    "How does this compare by territory?",
+    "What's the trend over the last few months?",
+)
+_TERRITORY_FOLLOW_UPS = (
+    "Which products perform best in each territory?",
+    "Show me the top HCPs by territory",
+)
+_HCP_FOLLOW_UPS = (
+    "What products do they prescribe most?",
+    "How does this compare to other HCPs?",
+)
+_GENERAL_FOLLOW_UPS = (
+    "What are the top products by revenue?",
+    "Show me revenue by territory",
+)
+
+
+# Single-pass, case-insensitive scans of generated SQL. Like plain substring
+# checks, these also match inside identifiers (e.g. product_id).
+_SQL_FEATURES_RE = re.compile(
+    r"(?P<limit>limit)|(?P<order_by>order\s+by)|(?P<desc>desc)|(?P<aggregate>sum\(|count\()",
+    re.IGNORECASE,
+)
+_FOLLOW_UP_TABLES_RE = re.compile(r"product|territory|hcp", re.IGNORECASE)
+
+# Follow-ups for the highest-priority table the SQL mentions; each tuple
+# already holds at most three questions
+_FOLLOW_UPS_BY_TABLE = (
+    ("product", _PRODUCT_FOLLOW_UPS),
+    ("territory", _TERRITORY_FOLLOW_UPS),
+    ("hcp", _HCP_FOLLOW_UPS),
+)
+
+
+def _merge_validation_errors(current: Deque[str], update: Iterable[str]) -> Deque[str]:
+    """
+    Reducer for validation_errors: an empty update clears the log,
+    otherwise the update is appended (repeats included). The result is a
+    new deque, since a checkpoint may still hold the current one.
+    """
+    if not update:
+        return deque()
+    merged = deque(current)
+    merged.extend(update)
+    return merged
+
 
 class AgentState(TypedDict):
     """State for the Text-to-SQL agent workflow."""
@@ -22,20 +111,20 @@ class AgentState(TypedDict):
     refusal_flag: bool
     refusal_reason: Optional[str]
     
-    # Schema grounding
+    # Schema grounding (runs in parallel with the scope/policy check)
     grounded_schema: Dict[str, List[str]]
     schema_info_string: str
     
     # SQL generation
     sql_candidate: Optional[str]
-    validation_errors: List[str]
+    validation_errors: Annotated[Deque[str], _merge_validation_errors]
     
     # Retry
     attempts_remaining: int
     
     # Execution results
     columns: List[str]
-    rows: List[Dict[str, Any]]
+    column_data: Dict[str, List[Any]]  # column name -> values in row order
     row_count: int
     execution_error: Optional[str]
     
@@ -45,91 +134,71 @@ class AgentState(TypedDict):
     vega_lite_spec: Dict[str, Any]
     
     # Timing
-    start_time: float
+    start_time_ns: int  # time.perf_counter_ns() at run start
     runtime_ms: int
 
 
-def preprocess_node(state: AgentState) -> AgentState:
+def preprocess_node(state: AgentState) -> Dict[str, Any]:
     """
     Preprocess and normalize the user question.
     """
-    question = state["user_question"].strip()
-    
-    # Basic normalization
-    normalized = question
-    
-    # Remove excessive whitespace
-    normalized = ' '.join(normalized.split())
-    
-    # Ensure question ends properly
-    if not normalized.endswith(('?', '.', '!')):
-        normalized = normalized + '?'
-    
     return {
-        **state,
-        "normalized_question": normalized,
+        "normalized_question": normalize_question(state["user_question"]),
     }
 
 
-def scope_policy_node(state: AgentState) -> AgentState:
+def normalize_question(question: str) -> str:
+    """
+    Collapse whitespace and make sure the question ends with punctuation.
+    
+    str.split() with no arguments already drops leading and trailing
+    whitespace, so this is a single split and join (faster here than a
+    regex substitution).
+    """
+    normalized = ' '.join(question.split())
+    if normalized[-1:] not in ('?', '.', '!'):
+        normalized += '?'
+    return normalized
+
+
+def scope_policy_node(state: AgentState) -> Dict[str, Any]:
     """
     Check if the question is in scope and allowed by policy.
+    
+    Runs concurrently with schema grounding, so it only returns the keys
+    it sets.
     """
-    from app.guardrails.validators import check_dump_request, check_sensitive_request
+    from app.guardrails.validators import screen_question
     
     question = state["normalized_question"]
     
-    # Check for dump requests
-    is_dump, dump_reason = check_dump_request(question)
-    if is_dump:
+    # One scan covers dump requests, sensitive data requests and vague wording
+    refusal_reason, has_vague_keywords = screen_question(question)
+    if refusal_reason:
         return {
-            **state,
             "refusal_flag": True,
-            "refusal_reason": dump_reason,
+            "refusal_reason": refusal_reason,
         }
     
-    # Check for sensitive data requests
-    is_sensitive, sensitive_reason = check_sensitive_request(question)
-    if is_sensitive:
-        return {
-            **state,
-            "refusal_flag": True,
-            "refusal_reason": sensitive_reason,
-        }
-    
-    # Check for ambiguous questions
-    question_lower = question.lower()
-    
     # Very short or vague questions
     word_count = len(question.split())
     if word_count < 3:
         return {
-            **state,
             "ambiguity_flag": True,
-            "follow_up_questions": [
-                "Could you provide more details about what you'd like to know?",
-                "What specific metrics or data are you interested in?",
-                "Are you looking for data about products, territories, or sales?"
-            ],
+            "follow_up_questions": list(_SHORT_QUESTION_FOLLOW_UPS),
         }
     
     # Questions that are too vague
-    vague_patterns = ["help", "something", "anything", "whatever", "stuff"]
-    if any(p in question_lower for p in vague_patterns) and word_count < 6:
+    if has_vague_keywords and word_count < 6:
         return {
-            **state,
             "ambiguity_flag": True,
-            "follow_up_questions": [
-                "What specific information would you like to see?",
-                "Would you like to see top products by revenue?",
-                "Are you interested in sales data by territory?"
-            ],
+            "follow_up_questions": list(_VAGUE_QUESTION_FOLLOW_UPS),
         }
     
-    return state
+    return {}
 
 
-def clarifying_questions_node(state: AgentState) -> AgentState:
+def clarifying_questions_node(state: AgentState) -> Dict[str, Any]:
     """
     Generate clarifying questions for ambiguous input.
     Uses LLM if available, otherwise uses pre-defined questions.
@@ -141,23 +210,19 @@ def clarifying_questions_node(state: AgentState) -> AgentState:
     if state.get("follow_up_questions"):
         answer = generate_clarification_answer(state["follow_up_questions"])
         return {
-            **state,
             "answer": answer,
         }
     
     # Generate using LLM if available
     if is_llm_available():
         try:
-            from app.agent.schema import get_schema_info_string
-            schema_info = get_schema_info_string()
             questions = generate_clarifying_questions(
                 state["normalized_question"],
-                schema_info,
+                _SCHEMA_INFO_STRING,
                 "Question is ambiguous or needs more context"
             )
             answer = generate_clarification_answer(questions)
             return {
-                **state,
                 "follow_up_questions": questions,
                 "answer": answer,
             }
@@ -165,50 +230,55 @@ def clarifying_questions_node(state: AgentState) -> AgentState:
             pass
     
     # Fallback questions
-    default_questions = [
-        "What specific metrics are you interested in?",
-        "Would you like to see data grouped by product, territory, or time period?",
-        "What time range should I consider?"
-    ]
-    answer = generate_clarification_answer(default_questions)
+    answer = generate_clarification_answer(_DEFAULT_CLARIFYING_QUESTIONS)
     
     return {
-        **state,
-        "follow_up_questions": default_questions,
+        "follow_up_questions": list(_DEFAULT_CLARIFYING_QUESTIONS),
         "answer": answer,
     }
 
 
-def schema_grounding_node(state: AgentState) -> AgentState:
+def schema_grounding_node(state: AgentState) -> Dict[str, Any]:
     """
     Ground the schema based on the question.
-    """
-    from app.agent.schema import ground_schema_for_question, get_schema_info_string
     
+    Runs concurrently with the scope/policy check, so it only returns the
+    keys it sets.
+    """
     question = state["normalized_question"]
-    grounded = ground_schema_for_question(question)
-    schema_str = get_schema_info_string()
+    # Plain dict: the shared read-only mapping can't be checkpointed
+    grounded = dict(ground_schema_for_question(question))
     
     return {
-        **state,
         "grounded_schema": grounded,
-        "schema_info_string": schema_str,
+        "schema_info_string": _SCHEMA_INFO_STRING,
     }
 
 
-def generate_sql_node(state: AgentState) -> AgentState:
+def generate_sql_node(state: AgentState) -> Dict[str, Any]:
     """
     Generate SQL using the LLM.
     """
-    from app.services.llm import is_llm_available, generate_sql, fix_sql, LLMError
+    from app.services.llm import is_llm_available, generate_sql_plan, fix_sql, LLMError
+    from app.services.sql_cache import get_sql_cache
+    
+    # Reuse SQL that already ran for the same question (first attempt only)
+    if not state.get("validation_errors"):
+        cached = get_sql_cache().get(state["normalized_question"])
+        if cached is not None:
+            return {
+                "sql_candidate": cached.sql,
+                "validation_errors": [],
+                "assumptions": list(cached.assumptions),
+            }
     
     if not is_llm_available():
         return {
-            **state,
             "sql_candidate": None,
             "validation_errors": ["LLM not available - OPENAI_API_KEY not set"],
         }
     
+    updates: Dict[str, Any] = {}
     try:
         # Check if we're retrying with errors
         if state.get("validation_errors") and state.get("sql_candidate"):
@@ -219,26 +289,33 @@ def generate_sql_node(state: AgentState) -> AgentState:
                 schema_info=state["schema_info_string"],
                 user_question=state["normalized_question"]
             )
+            model_assumptions: List[str] = []
         else:
-            # Generate fresh SQL
-            sql = generate_sql(
+            # Generate fresh SQL; the same call suggests assumptions and
+            # follow-up questions so finalize doesn't need another round-trip
+            plan = generate_sql_plan(
                 user_question=state["normalized_question"],
                 schema_info=state["schema_info_string"]
             )
+            sql = plan.sql
+            model_assumptions = plan.assumptions
+            if plan.follow_up_questions:
+                updates["follow_up_questions"] = plan.follow_up_questions[:3]
         
         # Basic assumptions based on what we're doing
         assumptions = []
-        sql_lower = sql.lower() if sql else ""
+        features = {m.lastgroup for m in _SQL_FEATURES_RE.finditer(sql)} if sql else set()
         
-        if "limit" not in sql_lower:
+        if "limit" not in features:
             assumptions.append("Results will be limited by system default (200 rows)")
-        if "order by" in sql_lower and "desc" in sql_lower:
+        if "order_by" in features and "desc" in features:
             assumptions.append("Results sorted by highest values first")
-        if "sum(" in sql_lower or "count(" in sql_lower:
+        if "aggregate" in features:
             assumptions.append("Data is aggregated across all matching records")
+        assumptions.extend(item for item in model_assumptions if item not in assumptions)
         
         return {
-            **state,
+            **updates,
             "sql_candidate": sql,
             "validation_errors": [],
             "assumptions": assumptions,
@@ -246,13 +323,12 @@ def generate_sql_node(state: AgentState) -> AgentState:
         
     except LLMError as e:
         return {
-            **state,
             "sql_candidate": None,
             "validation_errors": [str(e)],
         }
 
 
-def validate_sql_node(state: AgentState) -> AgentState:
+def validate_sql_node(state: AgentState) -> Dict[str, Any]:
     """
     Validate the generated SQL against policies and schema.
     """
@@ -262,9 +338,11 @@ def validate_sql_node(state: AgentState) -> AgentState:
     sql = state.get("sql_candidate")
     
     if not sql:
+        # Keep the generation error if there is one
+        if state.get("validation_errors"):
+            return {}
         return {
-            **state,
-            "validation_errors": state.get("validation_errors", []) or ["No SQL generated"],
+            "validation_errors": ["No SQL generated"],
         }
     
     # Run comprehensive validation
@@ -272,7 +350,6 @@ def validate_sql_node(state: AgentState) -> AgentState:
     
     if not is_valid:
         return {
-            **state,
             "validation_errors": errors,
         }
     
@@ -280,89 +357,92 @@ def validate_sql_node(state: AgentState) -> AgentState:
     try:
         validated_sql = validate_sql(sql)
         return {
-            **state,
             "sql_candidate": validated_sql,
             "validation_errors": [],
         }
     except SQLPolicyError as e:
         return {
-            **state,
             "validation_errors": [str(e)],
         }
 
 
-def fix_retry_node(state: AgentState) -> AgentState:
+def fix_retry_node(state: AgentState) -> Dict[str, Any]:
     """
     Handle retry logic - decrement attempts and prepare for retry.
     """
     attempts = state.get("attempts_remaining", 3) - 1
     
+    # The error is already in validation_errors for the fix prompt; clear it
+    # so a stale execution error doesn't trigger retries of the fixed SQL
     return {
-        **state,
         "attempts_remaining": attempts,
+        "execution_error": None,
     }
 
 
-def execute_query_node(state: AgentState) -> AgentState:
+def execute_query_node(state: AgentState) -> Dict[str, Any]:
     """
     Execute the validated SQL query.
     """
     from app.services.sql_exec import execute_query, SQLExecutionError
+    from app.services.sql_cache import get_sql_cache
     
     sql = state.get("sql_candidate")
     
     if not sql:
         return {
-            **state,
             "execution_error": "No SQL to execute",
             "columns": [],
-            "rows": [],
+            "column_data": {},
             "row_count": 0,
         }
     
     try:
-        columns, rows, row_count = execute_query(sql)
+        columns, column_data, row_count = execute_query(sql)
+        
+        # Validated and executed successfully: safe to reuse for this question
+        get_sql_cache().put(state["normalized_question"], sql, state.get("assumptions", []))
         
         return {
-            **state,
             "columns": columns,
-            "rows": rows,
+            "column_data": column_data,
             "row_count": row_count,
             "execution_error": None,
         }
         
     except SQLExecutionError as e:
         return {
-            **state,
             "execution_error": str(e),
-            "validation_errors": state.get("validation_errors", []) + [str(e)],
+            "validation_errors": [str(e)],
             "columns": [],
-            "rows": [],
+            "column_data": {},
             "row_count": 0,
         }
 
 
-def finalize_response_node(state: AgentState) -> AgentState:
+def finalize_response_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """
     Finalize the response with LLM-generated answer and chart.
+    
+    If the run was started with an on_token callback, the answer is
+    streamed through it as it is generated.
     """
     import logging
     logger = logging.getLogger(__name__)
     
     from app.services.llm import is_llm_available, LLMError
-    from app.services.answer import generate_answer, generate_error_answer
+    from app.services.answer import generate_answer, generate_answer_stream, generate_error_answer
     from app.services.chart import generate_chart_spec
     from app.agent.schema import get_schema_summary
     
     # Calculate runtime
-    runtime_ms = int((time.time() - state["start_time"]) * 1000)
+    runtime_ms = (time.perf_counter_ns() - state["start_time_ns"]) // 1_000_000
     
-    logger.info(f"finalize_response_node: rows={len(state.get('rows', []))}, columns={state.get('columns', [])}")
+    logger.info("finalize_response_node: rows=%d, columns=%s", state.get("row_count", 0), state.get("columns", []))
     
     # Check for refusal
     if state.get("refusal_flag"):
         return {
-            **state,
             "answer": state.get("refusal_reason") or "Request not allowed.",
             "sql_candidate": None,
             "vega_lite_spec": {},
@@ -372,7 +452,6 @@ def finalize_response_node(state: AgentState) -> AgentState:
     # Check for ambiguity
     if state.get("ambiguity_flag"):
         return {
-            **state,
             "sql_candidate": None,
             "vega_lite_spec": {},
             "runtime_ms": runtime_ms,
@@ -381,7 +460,6 @@ def finalize_response_node(state: AgentState) -> AgentState:
     # Check if LLM is available
     if not is_llm_available():
         return {
-            **state,
             "answer": "LLM summarization is required but not available. Set OPENAI_API_KEY.",
             "sql_candidate": None,
             "vega_lite_spec": {},
@@ -393,45 +471,55 @@ def finalize_response_node(state: AgentState) -> AgentState:
     if state.get("execution_error"):
         answer = generate_error_answer(state["execution_error"] or "Unknown error", state["user_question"])
         return {
-            **state,
             "answer": answer,
             "vega_lite_spec": {},
             "runtime_ms": runtime_ms,
-            "follow_up_questions": [
-                "Would you like to try a different question?",
-                "Can you be more specific about what data you need?"
-            ],
+            "follow_up_questions": list(_EXECUTION_ERROR_FOLLOW_UPS),
         }
     
     # Check for validation errors (after retries exhausted)
     if state.get("validation_errors"):
         error_msg = "; ".join(state["validation_errors"])
         return {
-            **state,
             "answer": f"I couldn't generate a valid query: {error_msg}",
             "sql_candidate": None,
             "vega_lite_spec": {},
             "runtime_ms": runtime_ms,
-            "follow_up_questions": [
-                "Could you rephrase your question?",
-                "What specific data would you like to see?"
-            ],
+            "follow_up_questions": list(_VALIDATION_ERROR_FOLLOW_UPS),
         }
     
+    # Build the chart on a worker thread while the LLM writes the answer
+    logger.debug("Generating chart with columns=%s, row_count=%d", state.get("columns", []), state.get("row_count", 0))
+    chart_future = _chart_executor.submit(
+        generate_chart_spec,
+        columns=state.get("columns", []),
+        column_data=state.get("column_data", {}),
+        sql=state.get("sql_candidate")
+    )
+    
     # Generate answer using LLM
+    answer_args = dict(
+        user_question=state["user_question"],
+        sql_used=state.get("sql_candidate") or "",
+        columns=state.get("columns", []),
+        column_data=state.get("column_data", {}),
+        assumptions=state.get("assumptions", []),
+        schema_summary=get_schema_summary(),
+        row_count=state.get("row_count", 0)
+    )
+    on_token = (config.get("configurable") or {}).get("on_token")
     try:
-        answer = generate_answer(
-            user_question=state["user_question"],
-            sql_used=state.get("sql_candidate") or "",
-            columns=state.get("columns", []),
-            rows=state.get("rows", []),
-            assumptions=state.get("assumptions", []),
-            schema_summary=get_schema_summary(),
-            row_count=state.get("row_count", 0)
-        )
+        if on_token is None:
+            answer = generate_answer(**answer_args)
+        else:
+            chunks = []
+            for token in generate_answer_stream(**answer_args):
+                chunks.append(token)
+                on_token(token)
+            answer = "".join(chunks).strip()
     except LLMError as e:
+        chart_future.cancel()
         return {
-            **state,
             "answer": "LLM summarization is required but not available. Set OPENAI_API_KEY.",
             "sql_candidate": None,
             "vega_lite_spec": {},
@@ -439,20 +527,15 @@ def finalize_response_node(state: AgentState) -> AgentState:
             "row_count": 0,
         }
     
-    # Generate chart
-    logger.info(f"Generating chart with columns={state.get('columns', [])}, row_count={len(state.get('rows', []))}")
-    vega_spec = generate_chart_spec(
-        columns=state.get("columns", []),
-        rows=state.get("rows", []),
-        sql=state.get("sql_candidate")
-    )
-    logger.info(f"Generated vega_spec: has_content={bool(vega_spec)}, keys={list(vega_spec.keys()) if vega_spec else []}")
+    vega_spec = chart_future.result()
+    logger.info("Generated vega_spec: has_content=%s, keys=%s", bool(vega_spec), list(vega_spec or ()))
     
-    # Generate follow-up questions
-    follow_ups = _generate_follow_ups(state.get("sql_candidate") or "", state.get("columns", []))
+    # Follow-up questions come from the SQL plan; rule-based ones are the fallback
+    follow_ups = state.get("follow_up_questions") or generate_follow_ups(
+        state.get("sql_candidate") or "", state.get("columns", [])
+    )
     
     return {
-        **state,
         "answer": answer,
         "vega_lite_spec": vega_spec,
         "runtime_ms": runtime_ms,
@@ -460,25 +543,21 @@ def finalize_response_node(state: AgentState) -> AgentState:
     }
 
 
-def _generate_follow_ups(sql: str, columns: List[str]) -> List[str]:
-    """Generate follow-up questions based on the query context."""
-    follow_ups = []
-    sql_lower = sql.lower() if sql else ""
-    
-    if "product" in sql_lower:
-        follow_ups.append("How does this compare by territory?")
-        follow_ups.append("What's the trend over the last few months?")
-    elif "territory" in sql_lower:
-        follow_ups.append("Which products perform best in each territory?")
-        follow_ups.append("Show me the top HCPs by territory")
-    elif "hcp" in sql_lower:
-        follow_ups.append("What products do they prescribe most?")
-        follow_ups.append("How does this compare to other HCPs?")
-    else:
-        follow_ups.append("What are the top products by revenue?")
-        follow_ups.append("Show me revenue by territory")
-    
-    return follow_ups[:3]
+def generate_follow_ups(sql: str, columns: List[str]) -> List[str]:
+    """Generate follow-up questions based on the tables a query touches."""
+    if sql:
+        tables = set(map(str.lower, _FOLLOW_UP_TABLES_RE.findall(sql)))
+        for table, follow_ups in _FOLLOW_UPS_BY_TABLE:
+            if table in tables:
+                return list(follow_ups)
+    return list(_GENERAL_FOLLOW_UPS)
+
+
+def policy_gate_node(state: AgentState) -> Dict[str, Any]:
+    """
+    Join point for the parallel scope/policy and schema grounding branches.
+    """
+    return {}
 
 
 # Router functions
@@ -501,16 +580,39 @@ def should_retry(state: AgentState) -> str:
     return "finalize"
 
 
+def _build_checkpointer() -> Optional[SqliteSaver]:
+    """
+    Create the SQLite checkpointer if a checkpoint path is configured.
+    
+    The connection is shared by the graph's worker threads.
+    """
+    path = get_settings().workflow_checkpoint_path
+    if not path:
+        return None
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # Every graph step writes a checkpoint: WAL with synchronous=NORMAL
+    # avoids an fsync per write (a crash can lose only the last steps)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return SqliteSaver(conn=conn)
+
+
 def build_workflow():
-    """Build and compile the LangGraph workflow."""
+    """
+    Build and compile the LangGraph workflow.
+    
+    Retries loop fix_retry -> generate_sql -> validate_sql and never revisit
+    preprocess, scope_policy or schema_ground: their results stay in state.
+    """
     
     workflow = StateGraph(AgentState)
     
     # Add nodes
     workflow.add_node("preprocess", preprocess_node)
     workflow.add_node("scope_policy", scope_policy_node)
-    workflow.add_node("clarify", clarifying_questions_node)
     workflow.add_node("schema_ground", schema_grounding_node)
+    workflow.add_node("policy_gate", policy_gate_node)
+    workflow.add_node("clarify", clarifying_questions_node)
     workflow.add_node("generate_sql", generate_sql_node)
     workflow.add_node("validate_sql", validate_sql_node)
     workflow.add_node("fix_retry", fix_retry_node)
@@ -520,22 +622,25 @@ def build_workflow():
     # Set entry point
     workflow.set_entry_point("preprocess")
     
-    # Add edges
+    # Fan out: the scope/policy check and schema grounding are independent,
+    # so they run in the same step and join at the policy gate
     workflow.add_edge("preprocess", "scope_policy")
+    workflow.add_edge("preprocess", "schema_ground")
+    workflow.add_edge("scope_policy", "policy_gate")
+    workflow.add_edge("schema_ground", "policy_gate")
     
     # Conditional edge after scope/policy check
     workflow.add_conditional_edges(
-        "scope_policy",
+        "policy_gate",
         should_ask_clarification,
         {
             "clarify": "clarify",
             "finalize": "finalize",
-            "continue": "schema_ground",
+            "continue": "generate_sql",
         }
     )
     
     workflow.add_edge("clarify", "finalize")
-    workflow.add_edge("schema_ground", "generate_sql")
     workflow.add_edge("generate_sql", "validate_sql")
     
     # Conditional edge after validation
@@ -562,22 +667,35 @@ def build_workflow():
     
     workflow.add_edge("finalize", END)
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=_build_checkpointer())
+
 
+# Graph step budget. Conditional edges take their own steps, so the default
+# of 25 is too low for a run that uses all of its fix/retry attempts.
+_RECURSION_LIMIT = 60
 
-# Singleton compiled workflow
-_compiled_workflow = None
+# Singleton compiled workflow, built at import so the first request
+# doesn't pay the compile cost
+_compiled_workflow = build_workflow()
 
 
 def get_workflow():
     """Get the compiled workflow (singleton)."""
-    global _compiled_workflow
-    if _compiled_workflow is None:
-        _compiled_workflow = build_workflow()
     return _compiled_workflow
 
 
-def run_agent(session_id: str, user_question: str, conversation_context: str = "") -> Dict[str, Any]:
+def reload_schema() -> None:
+    """Refresh the schema description used by the workflow nodes."""
+    global _SCHEMA_INFO_STRING
+    _SCHEMA_INFO_STRING = get_schema_info_string()
+
+
+def run_agent(
+    session_id: str,
+    user_question: str,
+    conversation_context: str = "",
+    on_token: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
     """
     Run the agent workflow.
     
@@ -585,6 +703,8 @@ def run_agent(session_id: str, user_question: str, conversation_context: str = "
         session_id: Session identifier
         user_question: User's natural language question
         conversation_context: Recent messages for memory (optional)
+        on_token: Optional callback receiving answer chunks as they stream.
+            Called from a graph worker thread, so it must be thread-safe.
         
     Returns:
         Final agent state with results
@@ -603,19 +723,25 @@ def run_agent(session_id: str, user_question: str, conversation_context: str = "
         "grounded_schema": {},
         "schema_info_string": "",
         "sql_candidate": None,
-        "validation_errors": [],
+        "validation_errors": deque(),
         "attempts_remaining": 3,
         "columns": [],
-        "rows": [],
+        "column_data": {},
         "row_count": 0,
         "execution_error": None,
         "assumptions": [],
         "answer": "",
         "vega_lite_spec": {},
-        "start_time": time.time(),
+        "start_time_ns": time.perf_counter_ns(),
         "runtime_ms": 0,
     }
     
-    final_state = workflow.invoke(initial_state)
+    # thread_id keys the checkpoint when checkpointing is enabled
+    configurable: Dict[str, Any] = {"thread_id": session_id}
+    if on_token is not None:
+        configurable["on_token"] = on_token
+    config: RunnableConfig = {"recursion_limit": _RECURSION_LIMIT, "configurable": configurable}
+    
+    final_state = workflow.invoke(initial_state, config=config)
     
     return final_state
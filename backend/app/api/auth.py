@@ -5,7 +5,7 @@ Handles login, logout, and current user retrieval.
 import logging
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request, Response, Cookie
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Cookie
 from pydantic import BaseModel, EmailStr
 
 from app.services.auth import (
@@ -48,9 +48,24 @@ def get_current_user(request: Request) -> Optional[dict]:
     Helper function to get the current logged-in user from the session cookie.
     Falls back to X-Session-Id header if cookie is missing (dev fallback).
     
+    The result is memoized on request.state, so the session and user are
+    resolved at most once per request however many callers ask.
+    
     Returns:
         User dict with id, email, display_name, or None if not logged in.
     """
+    try:
+        return request.state.current_user
+    except AttributeError:
+        pass
+    
+    user = _resolve_user(request)
+    request.state.current_user = user
+    return user
+
+
+def _resolve_user(request: Request) -> Optional[dict]:
+    """Look up the user for the request's session cookie or header."""
     session_id = request.cookies.get(COOKIE_NAME) or request.headers.get("X-Session-Id")
     
     if not session_id:
@@ -60,11 +75,15 @@ def get_current_user(request: Request) -> Optional[dict]:
     if not session:
         return None
     
-    user = get_user_by_id(session["user_id"])
-    return user
+    return get_user_by_id(session["user_id"])
+
+
+def current_user_dep(request: Request) -> Optional[dict]:
+    """Dependency returning the current user, or None if not logged in."""
+    return get_current_user(request)
 
 
-def require_auth(request: Request) -> dict:
+def require_auth(user: Optional[dict] = Depends(current_user_dep)) -> dict:
     """
     Dependency that requires authentication.
     Raises 401 if user is not logged in.
@@ -72,20 +91,15 @@ def require_auth(request: Request) -> dict:
     Returns:
         User dict with id, email, display_name.
     """
-    session_id = request.cookies.get(COOKIE_NAME)
-    logger.debug(f"require_auth: session_id cookie = {session_id}")
-    logger.debug(f"require_auth: all cookies = {request.cookies}")
-    
-    user = get_current_user(request)
-    
     if not user:
-        logger.warning(f"require_auth: No user found for session_id={session_id}")
+        logger.warning("require_auth: no authenticated user for request")
         raise HTTPException(
             status_code=401,
             detail="Not authenticated. Please log in."
         )
     
-    logger.debug(f"require_auth: user authenticated = {user['email']}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("require_auth: user authenticated = %s", user["email"])
     return user
 
 
@@ -145,12 +159,11 @@ async def logout(
 
 
 @router.get("/auth/me", response_model=Optional[UserResponse])
-async def get_me(request: Request):
+async def get_me(user: Optional[dict] = Depends(current_user_dep)):
     """
     Get the current logged-in user.
     Returns null if not logged in (doesn't raise 401).
     """
-    user = get_current_user(request)
     
     if not user:
         return None
@@ -1,22 +1,36 @@
 """
 Chat endpoint for Pharma Analyst Bot
 """
+import asyncio
 import time
 import logging
-from typing import Optional, List, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any, Sequence, Tuple, Union
 
-from fastapi import APIRouter, Request, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, Request, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from app.agent.workflow import run_agent
-from app.audit.repo import insert_audit_log
+from app.agent.runner import get_agent_runner
+from app.audit.writer import AuditRecord, AuditThrottle, get_audit_writer
 from app.services.llm import is_llm_available
+from app.services.response_cache import get_response_cache
 from app.api.auth import require_auth
+from app.api.chat_models import ChatRequest, ChatResponse
+from app.api.streaming import (
+    EVENT_COMPLETE,
+    EVENT_ERROR,
+    EVENT_SESSION,
+    EVENT_TOKEN,
+    SSE_HEADERS,
+    batch_sse_frames,
+    format_sse_event,
+    new_request_id,
+    with_keepalive,
+)
 from app.services.chat_history import (
     create_session as create_chat_session,
-    get_session,
+    session_belongs_to,
     add_message,
-    get_recent_messages,
+    get_conversation_context,
     auto_title_session,
     should_auto_title,
 )
@@ -25,187 +39,332 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+_llm_unavailable_audits = AuditThrottle(interval_seconds=1.0)
+
+# Static parts of the error responses, shared between requests
+_LLM_UNAVAILABLE_ANSWER = "LLM summarization is required but not available. Set OPENAI_API_KEY."
+_NO_FOLLOW_UPS: Tuple[str, ...] = ()
+_RETRY_FOLLOW_UPS: Tuple[str, ...] = ("Would you like to try a different question?",)
+
+
+async def build_conversation_context(session_id: int) -> str:
+    """
+    Build conversation context from recent messages (memory window).
+    Returns formatted string for LLM context.
+    """
+    return await get_conversation_context(session_id)
+
+
+def _elapsed_ms(start_time_ns: int) -> int:
+    return (time.perf_counter_ns() - start_time_ns) // 1_000_000
 
-class ChatRequest(BaseModel):
-    session_id: Optional[int] = None  # Now an integer (DB session ID)
-    message: str
 
+def _stream_response(events: AsyncIterator[bytes]) -> StreamingResponse:
+    """Send SSE frames the way /chat/stream does (batched, with keep-alives)."""
+    return StreamingResponse(
+        batch_sse_frames(with_keepalive(events)),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
 
-class ChatMetadata(BaseModel):
-    row_count: int
-    runtime_ms: int
-    session_id: int  # Return session ID so frontend can track it
 
+async def _single_event(payload: Dict[str, Any], request_id: str) -> AsyncIterator[bytes]:
+    yield format_sse_event(EVENT_SESSION, {"session_id": payload["metadata"]["session_id"]}, request_id)
+    yield format_sse_event(EVENT_COMPLETE, payload, request_id)
 
-class ChartSpec(BaseModel):
-    vega_lite_spec: Dict[str, Any]
 
+def _chat_payload(
+    answer: str,
+    sql: Optional[str],
+    assumptions: Sequence[str],
+    vega_spec: Dict[str, Any],
+    follow_ups: Sequence[str],
+    row_count: int,
+    runtime_ms: int,
+    session_id: int
+) -> Dict[str, Any]:
+    """Build a response shaped like ChatResponse."""
+    return {
+        "answer": answer,
+        "sql": sql,
+        "assumptions": assumptions,
+        "chart": {"vega_lite_spec": vega_spec},
+        "follow_up_questions": follow_ups,
+        "metadata": {"row_count": row_count, "runtime_ms": runtime_ms, "session_id": session_id},
+    }
+
+
+def _error_response(
+    error_answer: str,
+    error_text: Optional[str],
+    follow_ups: Sequence[str],
+    session_id: int,
+    message: str,
+    start_time_ns: int,
+    background_tasks: BackgroundTasks
+) -> Dict[str, Any]:
+    """Store and audit a response that has no query results (no audit if error_text is None)."""
+    runtime_ms = _elapsed_ms(start_time_ns)
+    background_tasks.add_task(add_message, session_id, role="assistant", content=error_answer)
+    
+    if error_text is not None:
+        get_audit_writer().submit(AuditRecord(
+            session_id=str(session_id),
+            question=message,
+            sql_text=None,
+            runtime_ms=runtime_ms,
+            row_count=0,
+            error_text=error_text
+        ))
+    
+    return _chat_payload(error_answer, None, (), {}, follow_ups, 0, runtime_ms, session_id)
 
-class ChatResponse(BaseModel):
-    answer: str
-    sql: Optional[str]
-    assumptions: List[str]
-    chart: ChartSpec
-    follow_up_questions: List[str]
-    metadata: ChatMetadata
 
+def _unexpected_error_response(
+    e: Exception,
+    session_id: int,
+    message: str,
+    start_time_ns: int,
+    background_tasks: BackgroundTasks
+) -> Dict[str, Any]:
+    return _error_response(
+        f"I encountered an unexpected error: {str(e)}. Please try again.",
+        f"Unexpected error: {str(e)}",
+        _RETRY_FOLLOW_UPS,
+        session_id, message, start_time_ns, background_tasks
+    )
 
-def build_conversation_context(session_id: int) -> str:
+
+def _finish_chat(
+    result: Dict[str, Any],
+    session_id: int,
+    message: str,
+    needs_title: bool,
+    start_time_ns: int,
+    background_tasks: BackgroundTasks
+) -> Dict[str, Any]:
+    """Store, audit and cache a workflow result and build the response."""
+    # Extract results from state
+    answer = result.get("answer", "I encountered an issue processing your request.")
+    sql = result.get("sql_candidate")
+    assumptions = result.get("assumptions", [])
+    vega_spec = result.get("vega_lite_spec", {})
+    follow_ups = result.get("follow_up_questions", [])
+    row_count = result.get("row_count", 0)
+    runtime_ms = result.get("runtime_ms", _elapsed_ms(start_time_ns))
+    
+    # Store assistant message
+    background_tasks.add_task(add_message, session_id, role="assistant", content=answer, sql_query=sql)
+    
+    logger.info("Chat API: vega_spec has content=%s, keys=%s", bool(vega_spec), list(vega_spec or ()))
+    
+    # Determine status for audit
+    error_text = None
+    if result.get("refusal_flag"):
+        error_text = f"Refused: {result.get('refusal_reason', 'Policy violation')}"
+    elif result.get("ambiguity_flag"):
+        error_text = "Needs clarification"
+    elif result.get("validation_errors"):
+        error_text = f"Validation errors: {'; '.join(result['validation_errors'])}"
+    elif result.get("execution_error"):
+        error_text = f"Execution error: {result['execution_error']}"
+    
+    if needs_title and sql and error_text is None:
+        get_response_cache().put(message, answer, sql, assumptions, vega_spec or {}, follow_ups, row_count)
+    
+    # Insert audit log
+    get_audit_writer().submit(AuditRecord(
+        session_id=str(session_id),
+        question=message,
+        sql_text=sql,
+        runtime_ms=runtime_ms,
+        row_count=row_count,
+        error_text=error_text
+    ))
+    
+    return _chat_payload(
+        answer, sql, list(assumptions), vega_spec or {}, list(follow_ups), row_count, runtime_ms, session_id
+    )
+
+
+async def _stream_chat(
+    session_id: int,
+    message: str,
+    conversation_context: str,
+    needs_title: bool,
+    start_time_ns: int,
+    background_tasks: BackgroundTasks,
+    request_id: str
+) -> AsyncIterator[bytes]:
     """
-    Build conversation context from recent messages (memory window).
-    Returns formatted string for LLM context.
+    Yield answer tokens as they are generated, then the full response.
+    
+    Uses the /chat/stream event vocabulary: a session event, token events,
+    then one complete event with the ChatResponse fields (or an error
+    event if the workflow failed).
     """
-    recent = get_recent_messages(session_id, limit=5)
+    loop = asyncio.get_running_loop()
+    tokens: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    
+    def on_token(token: str) -> None:
+        # Called from the workflow's worker thread
+        loop.call_soon_threadsafe(tokens.put_nowait, token)
     
-    if not recent:
-        return ""
+    yield format_sse_event(EVENT_SESSION, {"session_id": session_id}, request_id)
     
-    context_lines = ["Previous conversation:"]
-    for msg in recent:
-        role_label = "User" if msg["role"] == "user" else "Assistant"
-        # Truncate long messages for context
-        content = msg["content"][:500] + "..." if len(msg["content"]) > 500 else msg["content"]
-        context_lines.append(f"{role_label}: {content}")
+    task = asyncio.ensure_future(get_agent_runner().run(
+        session_id=str(session_id),
+        user_question=message,
+        conversation_context=conversation_context,
+        on_token=on_token
+    ))
+    # Tokens are queued before the run's result, so None marks the end
+    task.add_done_callback(lambda _: tokens.put_nowait(None))
+    
+    try:
+        finished = False
+        while not finished:
+            # Tokens that queued up while the last event was sent go out as one
+            parts = [await tokens.get()]
+            while not tokens.empty():
+                parts.append(tokens.get_nowait())
+            if parts[-1] is None:
+                parts.pop()
+                finished = True
+            if parts:
+                yield format_sse_event(EVENT_TOKEN, {"token": "".join(parts)}, request_id, with_timestamp=False)
+    finally:
+        if not task.done():
+            task.cancel()  # client disconnected
     
-    return "\n".join(context_lines)
+    try:
+        response = _finish_chat(
+            task.result(), session_id, message, needs_title, start_time_ns, background_tasks
+        )
+    except Exception as e:
+        _unexpected_error_response(e, session_id, message, start_time_ns, background_tasks)
+        yield format_sse_event(EVENT_ERROR, {"error": str(e)}, request_id)
+        return
+    yield format_sse_event(EVENT_COMPLETE, response, request_id)
 
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, http_request: Request, user: dict = Depends(require_auth)):
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(require_auth)
+) -> Union[ORJSONResponse, StreamingResponse]:
     """
     Process a chat message and return SQL analysis results.
     Requires authentication. Stores messages in chat history.
     
     If session_id is not provided, creates a new session automatically.
+    The assistant message and session title are written in background
+    tasks after the response is sent; audit records go to the batched
+    audit writer.
+    
+    Clients sending `Accept: text/event-stream` get the answer as
+    server-sent events in the /chat/stream format: session, token events
+    while it is generated, then a complete event carrying the same fields
+    as the JSON response.
     """
-    start_time = time.time()
+    start_time_ns = time.perf_counter_ns()
     user_id = user["id"]
     message = request.message.strip()
+    wants_stream = "text/event-stream" in http_request.headers.get("accept", "")
     
     # Get or create session
     if request.session_id:
         # Verify session belongs to user
-        session = get_session(request.session_id, user_id)
-        if not session:
+        if not await session_belongs_to(request.session_id, user_id):
             raise HTTPException(status_code=404, detail="Session not found")
         session_id = request.session_id
     else:
         # Create new session automatically
-        session = create_chat_session(user_id)
+        session = await create_chat_session(user_id)
         session_id = session["id"]
     
-    # Check if we should auto-title (first message)
-    needs_title = should_auto_title(session_id)
-    
-    # Store user message
-    add_message(session_id, role="user", content=message)
+    if request.session_id:
+        # Check if we should auto-title (first message) while storing the
+        # user message; the two are independent
+        needs_title, _ = await asyncio.gather(
+            should_auto_title(session_id),
+            add_message(session_id, role="user", content=message)
+        )
+    else:
+        # A session created just now has no title yet
+        needs_title = True
+        await add_message(session_id, role="user", content=message)
     
-    # Auto-title if this is the first message
+    # Auto-title if this is the first message (nothing below reads the title)
     if needs_title:
-        auto_title_session(session_id, message)
+        background_tasks.add_task(auto_title_session, session_id, message)
     
     # Build conversation context from recent messages
-    conversation_context = build_conversation_context(session_id)
+    conversation_context = await build_conversation_context(session_id)
+    
+    response = None
     
     # Check if LLM is available
     if not is_llm_available():
-        runtime_ms = int((time.time() - start_time) * 1000)
-        
-        error_answer = "LLM summarization is required but not available. Set OPENAI_API_KEY."
-        add_message(session_id, role="assistant", content=error_answer)
-        
-        insert_audit_log(
+        # Every request fails the same way here; audit a sample
+        audited, suppressed = _llm_unavailable_audits.allow()
+        error_text = None
+        if audited:
+            error_text = "OPENAI_API_KEY not set"
+            if suppressed:
+                error_text += f" ({suppressed} similar requests not audited)"
+        response = _error_response(
+            _LLM_UNAVAILABLE_ANSWER,
+            error_text,
+            _NO_FOLLOW_UPS,
+            session_id, message, start_time_ns, background_tasks
+        )
+    
+    # A first question doesn't depend on earlier turns, so a recent answer
+    # to the same question can be returned without running the workflow
+    elif needs_title and (cached := get_response_cache().get(message)) is not None:
+        runtime_ms = _elapsed_ms(start_time_ns)
+        background_tasks.add_task(
+            add_message, session_id, role="assistant", content=cached.answer, sql_query=cached.sql
+        )
+        get_audit_writer().submit(AuditRecord(
             session_id=str(session_id),
             question=message,
-            sql_text=None,
+            sql_text=cached.sql,
             runtime_ms=runtime_ms,
-            row_count=0,
-            error_text="OPENAI_API_KEY not set"
-        )
-        
-        return ChatResponse(
-            answer=error_answer,
-            sql=None,
-            assumptions=[],
-            chart=ChartSpec(vega_lite_spec={}),
-            follow_up_questions=[],
-            metadata=ChatMetadata(row_count=0, runtime_ms=runtime_ms, session_id=session_id)
+            row_count=cached.row_count,
+            error_text="Cache hit"
+        ))
+        response = _chat_payload(
+            cached.answer, cached.sql, cached.assumptions, cached.vega_lite_spec,
+            cached.follow_up_questions, cached.row_count, runtime_ms, session_id
         )
     
+    if response is not None:
+        return _stream_response(_single_event(response, new_request_id())) if wants_stream else ORJSONResponse(response)
+    
+    if wants_stream:
+        # Background tasks added while streaming still run once it ends
+        return _stream_response(_stream_chat(
+            session_id, message, conversation_context, needs_title, start_time_ns, background_tasks,
+            new_request_id()
+        ))
+    
     try:
         # Run the LangGraph workflow with conversation context
-        result = run_agent(
+        result = await get_agent_runner().run(
             session_id=str(session_id),
             user_question=message,
             conversation_context=conversation_context
         )
-        
-        # Extract results from state
-        answer = result.get("answer", "I encountered an issue processing your request.")
-        sql = result.get("sql_candidate")
-        assumptions = result.get("assumptions", [])
-        vega_spec = result.get("vega_lite_spec", {})
-        follow_ups = result.get("follow_up_questions", [])
-        row_count = result.get("row_count", 0)
-        runtime_ms = result.get("runtime_ms", int((time.time() - start_time) * 1000))
-        
-        # Store assistant message
-        add_message(session_id, role="assistant", content=answer, sql_query=sql)
-        
-        logger.info(f"Chat API: vega_spec has content={bool(vega_spec)}, keys={list(vega_spec.keys()) if vega_spec else []}")
-        
-        # Determine status for audit
-        error_text = None
-        if result.get("refusal_flag"):
-            error_text = f"Refused: {result.get('refusal_reason', 'Policy violation')}"
-        elif result.get("ambiguity_flag"):
-            error_text = "Needs clarification"
-        elif result.get("validation_errors"):
-            error_text = f"Validation errors: {'; '.join(result['validation_errors'])}"
-        elif result.get("execution_error"):
-            error_text = f"Execution error: {result['execution_error']}"
-        
-        # Insert audit log
-        insert_audit_log(
-            session_id=str(session_id),
-            question=message,
-            sql_text=sql,
-            runtime_ms=runtime_ms,
-            row_count=row_count,
-            error_text=error_text
-        )
-        
-        return ChatResponse(
-            answer=answer,
-            sql=sql,
-            assumptions=assumptions,
-            chart=ChartSpec(vega_lite_spec=vega_spec),
-            follow_up_questions=follow_ups,
-            metadata=ChatMetadata(row_count=row_count, runtime_ms=runtime_ms, session_id=session_id)
+        return ORJSONResponse(
+            _finish_chat(result, session_id, message, needs_title, start_time_ns, background_tasks)
         )
         
     except Exception as e:
         # Handle unexpected errors
-        runtime_ms = int((time.time() - start_time) * 1000)
-        
-        error_answer = f"I encountered an unexpected error: {str(e)}. Please try again."
-        add_message(session_id, role="assistant", content=error_answer)
-        
-        insert_audit_log(
-            session_id=str(session_id),
-            question=message,
-            sql_text=None,
-            runtime_ms=runtime_ms,
-            row_count=0,
-            error_text=f"Unexpected error: {str(e)}"
-        )
-        
-        return ChatResponse(
-            answer=error_answer,
-            sql=None,
-            assumptions=[],
-            chart=ChartSpec(vega_lite_spec={}),
-            follow_up_questions=["Would you like to try a different question?"],
-            metadata=ChatMetadata(row_count=0, runtime_ms=runtime_ms, session_id=session_id)
+        return ORJSONResponse(
+            _unexpected_error_response(e, session_id, message, start_time_ns, background_tasks)
         )
-
@@ -0,0 +1,39 @@
+"""
+Request and response models shared by the chat endpoints.
+"""
+from typing import Optional, List, Dict, Any
+
+from pydantic import BaseModel, ConfigDict
+
+
+class ChatRequest(BaseModel):
+    session_id: Optional[int] = None  # Database session ID; None starts a new session
+    message: str
+
+
+# Response models document the API; handlers build the payload as a dict
+# (see chat._chat_payload) so results aren't validated and walked again.
+
+class ChatMetadata(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
+    row_count: int
+    runtime_ms: int
+    session_id: int  # Return session ID so frontend can track it
+
+
+class ChartSpec(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
+    vega_lite_spec: Dict[str, Any]
+
+
+class ChatResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
+    answer: str
+    sql: Optional[str]
+    assumptions: List[str]
+    chart: ChartSpec
+    follow_up_questions: List[str]
+    metadata: ChatMetadata
@@ -11,7 +11,7 @@ from app.api.auth import require_auth
 from app.services.chat_history import (
     create_session,
     get_user_sessions,
-    get_session,
+    session_belongs_to,
     get_session_messages,
 )
 
@@ -45,7 +45,7 @@ async def list_sessions(request: Request, user: dict = Depends(require_auth)):
     Get all chat sessions for the current user.
     Returns most recent sessions first.
     """
-    sessions = get_user_sessions(user["id"])
+    sessions = await get_user_sessions(user["id"])
     return sessions
 
 
@@ -55,7 +55,7 @@ async def create_new_session(request: Request, user: dict = Depends(require_auth
     Create a new empty chat session.
     Title will be auto-set when first message is sent.
     """
-    session = create_session(user["id"])
+    session = await create_session(user["id"])
     return session
 
 
@@ -70,9 +70,8 @@ async def get_messages(
     Verifies that the session belongs to the current user.
     """
     # First verify the session exists and belongs to user
-    session = get_session(session_id, user["id"])
-    if not session:
+    if not await session_belongs_to(session_id, user["id"]):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    messages = get_session_messages(session_id, user["id"])
+    messages = await get_session_messages(session_id, user["id"])
     return messages
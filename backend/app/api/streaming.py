@@ -1,92 +1,276 @@
 """
 Server-Sent Events (SSE) streaming endpoint for chat.
 """
-import json
+import asyncio
+import itertools
 import time
 import uuid
 import logging
-import asyncio
-from typing import Optional, AsyncGenerator, Dict, Any, List
+from typing import Optional, AsyncGenerator, Awaitable, Dict, Any, List, Set
 
+import orjson
 from fastapi import APIRouter, Request, Depends
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from openai.types.chat import ChatCompletionMessageParam
+from sqlalchemy.ext.asyncio import AsyncConnection
 
+from app.agent.prompts import get_summarization_prompt
+from app.agent.schema import get_schema_info_string, get_schema_summary
+from app.agent.workflow import generate_follow_ups, normalize_question
 from app.api.auth import require_auth
+from app.api.chat_models import ChatRequest
+from app.audit.writer import AuditRecord, get_audit_writer
+from app.db.engine import get_async_engine
+from app.guardrails.sql_policy import validate_sql
+from app.guardrails.validators import classify_request, validate_sql_complete
+from app.services.chart import generate_chart_spec
+from app.services.chat_history import (
+    add_message,
+    auto_title_session,
+    create_session,
+    get_conversation_context,
+    session_belongs_to,
+    should_auto_title
+)
+from app.services.llm import (
+    _get_async_openai_client,
+    fix_sql,
+    generate_sql,
+    is_llm_available,
+    summarize_results
+)
+from app.services.response_cache import get_response_cache
+from app.services.sql_exec import (
+    ColumnData,
+    SQLExecutionError,
+    column_length,
+    execute_query,
+    rows_csv_from_columns
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-class StreamChatRequest(BaseModel):
-    session_id: Optional[int] = None  # Database session ID (integer)
-    message: str
-
-
 # Event types for SSE
 EVENT_STATUS = "status"
 EVENT_TOKEN = "token"
 EVENT_COMPLETE = "complete"
 EVENT_ERROR = "error"
+EVENT_SESSION = "session"
+
+# Encoded "event: <name>\ndata: " lines for the fixed event types
+_SSE_PREFIXES = {
+    event_type: b"event: " + event_type.encode() + b"\ndata: "
+    for event_type in (EVENT_STATUS, EVENT_TOKEN, EVENT_COMPLETE, EVENT_ERROR, EVENT_SESSION)
+}
+_SSE_SUFFIX = b"\n\n"
+
+# Response headers for event streams. An explicit identity Content-Encoding
+# makes the gzip middleware pass the stream through untouched even when the
+# client didn't send Accept: text/event-stream.
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Content-Encoding": "identity",
+    "X-Accel-Buffering": "no"
+}
+
+# An SSE comment is sent when a stream has been idle this long (e.g. while
+# the LLM writes SQL) so proxies don't time the connection out
+SSE_KEEPALIVE_SECONDS = 15.0
+_SSE_KEEPALIVE = b": ping\n\n"
+
+# Answer deltas are sent once this many characters or seconds accumulate
+TOKEN_FLUSH_CHARS = 32
+TOKEN_FLUSH_SECONDS = 0.016
+
+# Token frames are written to the response in chunks of this size or age
+FRAME_BATCH_BYTES = 4096
+FRAME_BATCH_SECONDS = 0.008
+
+# Suggested next question after a refusal, by request kind
+_REFUSAL_FOLLOW_UPS = {
+    "dump": "Try asking about specific products or territories.",
+    "sensitive": "Try asking about sales, products, or territories.",
+}
+
+# Schema description shared by every request, built once at import
+_SCHEMA_INFO_STRING = get_schema_info_string()
+
+# Request ids only correlate a stream's events in logs: a random prefix per
+# process plus a counter, instead of a fresh uuid4 per request
+_REQUEST_ID_PREFIX = uuid.uuid4().hex[:12]
+_request_counter = itertools.count(1)
+
+
+def new_request_id() -> str:
+    return f"{_REQUEST_ID_PREFIX}-{next(_request_counter):x}"
+
+
+# Writes scheduled after the response is sent; referenced here until done
+# so they aren't garbage collected mid-flight
+_background_writes: Set["asyncio.Task[Any]"] = set()
+
 
+def _write_in_background(write: Awaitable[Any]) -> None:
+    """Run a DB write without holding up the stream (or dying with it)."""
+    task = asyncio.ensure_future(write)
+    _background_writes.add(task)
+    task.add_done_callback(_background_write_done)
 
-def format_sse_event(event_type: str, data: Dict[str, Any], request_id: str) -> str:
-    """Format data as an SSE event."""
-    payload = {
-        "request_id": request_id,
-        "timestamp": time.time(),
-        **data
-    }
-    return f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
 
+def _background_write_done(task: "asyncio.Task[Any]") -> None:
+    _background_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background write failed: %s", task.exception())
 
-def build_conversation_context(session_id: int) -> str:
-    """Build conversation context from recent messages."""
-    from app.services.chat_history import get_recent_messages
+
+def format_sse_event(
+    event_type: str,
+    data: Dict[str, Any],
+    request_id: str,
+    with_timestamp: bool = True
+) -> bytes:
+    """
+    Format data as an SSE event (UTF-8 bytes, ready to send).
+    Token events skip the wall-clock timestamp; there are many of them
+    and the client doesn't use it.
+    """
+    if with_timestamp:
+        payload = {"request_id": request_id, "timestamp": time.time(), **data}
+    else:
+        payload = {"request_id": request_id, **data}
+    prefix = _SSE_PREFIXES.get(event_type)
+    if prefix is None:
+        prefix = b"event: " + event_type.encode() + b"\ndata: "
+    return prefix + orjson.dumps(payload, default=str) + _SSE_SUFFIX
+
+
+async def batch_sse_frames(frames: AsyncGenerator[bytes, None]) -> AsyncGenerator[bytes, None]:
+    """
+    Join consecutive SSE frames into fewer response body chunks.
+
+    Token frames are held until FRAME_BATCH_BYTES accumulate or the oldest
+    held frame is FRAME_BATCH_SECONDS old, whichever comes first; the wait
+    for the next frame is bounded by that deadline, so a held token is
+    flushed on time even when the source goes quiet. Any other event
+    flushes immediately, so progress updates and the final result are
+    never delayed.
+    """
+    loop = asyncio.get_running_loop()
+    token_prefix = _SSE_PREFIXES[EVENT_TOKEN]
+    buffer = bytearray()
+    deadline = 0.0
+    pending: Optional["asyncio.Future[bytes]"] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(frames.__anext__())
+            if buffer:
+                # asyncio.wait leaves the pending read running on timeout
+                done, _ = await asyncio.wait((pending,), timeout=max(deadline - loop.time(), 0))
+                if not done:
+                    yield bytes(buffer)
+                    buffer.clear()
+                    continue
+            try:
+                frame = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+            if not buffer:
+                deadline = loop.time() + FRAME_BATCH_SECONDS
+            buffer += frame
+            if not frame.startswith(token_prefix) or len(buffer) >= FRAME_BATCH_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+        if buffer:
+            yield bytes(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()  # client disconnected
+
+
+async def with_keepalive(
+    frames: AsyncGenerator[bytes, None],
+    interval: float = SSE_KEEPALIVE_SECONDS
+) -> AsyncGenerator[bytes, None]:
+    """
+    Forward SSE frames, adding a keep-alive comment when none were produced
+    during the last interval.
+
+    The frames are produced by a separate task; a single timer checks for
+    idleness once per interval, so there is no per-frame timeout.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[Any]" = asyncio.Queue()
+    end = object()
+    active = False
     
-    recent_messages = get_recent_messages(session_id, limit=5)
-    if not recent_messages:
-        return ""
+    async def pump() -> None:
+        nonlocal active
+        try:
+            async for frame in frames:
+                active = True
+                queue.put_nowait(frame)
+        except Exception as e:
+            queue.put_nowait(e)
+            return
+        queue.put_nowait(end)
     
-    context_lines = []
-    for msg in recent_messages:
-        role_label = "User" if msg["role"] == "user" else "Assistant"
-        context_lines.append(f"{role_label}: {msg['content']}")
+    def tick() -> None:
+        nonlocal active, timer
+        if not active:
+            queue.put_nowait(_SSE_KEEPALIVE)
+        active = False
+        timer = loop.call_later(interval, tick)
     
-    return "\n\n".join(context_lines)
+    producer = asyncio.ensure_future(pump())
+    timer = loop.call_later(interval, tick)
+    try:
+        while (item := await queue.get()) is not end:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        timer.cancel()
+        if not producer.done():
+            producer.cancel()  # client disconnected
 
 
 class StreamingWorkflowRunner:
     """
-    Runs the LangGraph workflow with streaming callbacks.
-    Emits status events as each step progresses.
+    Runs the workflow as an async generator of SSE events.
+    Yields status events as each step progresses and token events while
+    the answer is generated.
     """
     
     def __init__(self, request_id: str):
         self.request_id = request_id
-        self.events: asyncio.Queue = asyncio.Queue()
-        self.start_time = time.time()
+        self.start_time_ns = time.perf_counter_ns()
+        self.result: Dict[str, Any] = {}
+        self.answer = ""
         
-    def emit_status(self, step: str, message: str):
-        """Emit a status event."""
-        event = format_sse_event(EVENT_STATUS, {
+    def status_event(self, step: str, message: str) -> bytes:
+        """Build a status event."""
+        return format_sse_event(EVENT_STATUS, {
             "step": step,
             "message": message
         }, self.request_id)
-        self.events.put_nowait(event)
         
-    def emit_token(self, token: str):
-        """Emit a token during answer streaming."""
-        event = format_sse_event(EVENT_TOKEN, {
+    def token_event(self, token: str) -> bytes:
+        """Build a token event during answer streaming."""
+        return format_sse_event(EVENT_TOKEN, {
             "token": token
-        }, self.request_id)
-        self.events.put_nowait(event)
+        }, self.request_id, with_timestamp=False)
         
-    def emit_complete(self, result: Dict[str, Any]):
-        """Emit the complete event with full response."""
-        runtime_ms = int((time.time() - self.start_time) * 1000)
-        event = format_sse_event(EVENT_COMPLETE, {
+    def complete_event(self, result: Dict[str, Any]) -> bytes:
+        """Build the complete event with full response."""
+        runtime_ms = (time.perf_counter_ns() - self.start_time_ns) // 1_000_000
+        return format_sse_event(EVENT_COMPLETE, {
             "answer": result.get("answer", ""),
             "sql": result.get("sql_candidate"),
             "assumptions": result.get("assumptions", []),
@@ -97,42 +281,29 @@ class StreamingWorkflowRunner:
                 "runtime_ms": runtime_ms
             }
         }, self.request_id)
-        self.events.put_nowait(event)
         
-    def emit_error(self, error_message: str):
-        """Emit an error event."""
-        event = format_sse_event(EVENT_ERROR, {
+    def error_event(self, error_message: str) -> bytes:
+        """Build an error event."""
+        return format_sse_event(EVENT_ERROR, {
             "error": error_message
         }, self.request_id)
-        self.events.put_nowait(event)
         
     async def run_workflow_streaming(
         self, 
         session_id: str, 
         user_question: str,
         conversation_context: str = ""
-    ) -> Dict[str, Any]:
+    ) -> AsyncGenerator[bytes, None]:
         """
-        Run the workflow with status callbacks for streaming.
+        Run the workflow, yielding status and token events as it goes.
+        The final result is left in self.result.
         """
-        from app.services.llm import is_llm_available, generate_sql, fix_sql
-        from app.agent.schema import get_allowed_schema, get_schema_info_string
-        from app.guardrails.validators import (
-            check_dump_request, 
-            check_sensitive_request,
-            validate_sql_complete
-        )
-        from app.guardrails.sql_policy import validate_sql
-        from app.services.sql_exec import execute_query, SQLExecutionError
-        from app.services.chart import generate_chart_spec
-        
         # Step 1: Analyzing question
-        self.emit_status("analyzing_question", "Analyzing your question...")
-        await asyncio.sleep(0.05)  # Small delay to ensure event is sent
+        yield self.status_event("analyzing_question", "Analyzing your question...")
         
         # Check LLM availability
         if not is_llm_available():
-            return {
+            self.result = {
                 "answer": "LLM summarization is required but not available. Set OPENAI_API_KEY.",
                 "sql_candidate": None,
                 "assumptions": [],
@@ -140,44 +311,29 @@ class StreamingWorkflowRunner:
                 "follow_up_questions": [],
                 "row_count": 0
             }
+            return
         
         # Normalize question
-        normalized = ' '.join(user_question.strip().split())
-        if not normalized.endswith(('?', '.', '!')):
-            normalized = normalized + '?'
+        normalized = normalize_question(user_question)
             
-        # Check for policy violations
-        is_dump, dump_reason = check_dump_request(normalized)
-        if is_dump:
-            return {
-                "answer": f"I cannot help with that request: {dump_reason}",
+        # Check for policy violations (one scan for dump and sensitive requests)
+        request_kind, refusal_reason = classify_request(normalized)
+        if request_kind != "ok":
+            self.result = {
+                "answer": f"I cannot help with that request: {refusal_reason}",
                 "sql_candidate": None,
                 "assumptions": [],
                 "vega_lite_spec": {},
-                "follow_up_questions": ["Try asking about specific products or territories."],
-                "row_count": 0,
-                "refusal_flag": True
-            }
-            
-        is_sensitive, sensitive_reason = check_sensitive_request(normalized)
-        if is_sensitive:
-            return {
-                "answer": f"I cannot help with that request: {sensitive_reason}",
-                "sql_candidate": None,
-                "assumptions": [],
-                "vega_lite_spec": {},
-                "follow_up_questions": ["Try asking about sales, products, or territories."],
+                "follow_up_questions": [_REFUSAL_FOLLOW_UPS[request_kind]],
                 "row_count": 0,
                 "refusal_flag": True
             }
+            return
         
         # Step 2: Generating SQL
-        self.emit_status("generating_sql", "Generating SQL query...")
-        await asyncio.sleep(0.05)
+        yield self.status_event("generating_sql", "Generating SQL query...")
         
-        # Get schema and generate SQL
-        schema = get_allowed_schema()
-        schema_info = get_schema_info_string()
+        schema_info = _SCHEMA_INFO_STRING
         
         sql_candidate: Optional[str] = None
         validation_errors: List[str] = []
@@ -186,12 +342,13 @@ class StreamingWorkflowRunner:
         for attempt in range(max_attempts):
             try:
                 if attempt == 0:
-                    sql_candidate = generate_sql(normalized, schema_info)
+                    sql_candidate = await asyncio.to_thread(generate_sql, normalized, schema_info)
                 else:
-                    self.emit_status("fixing_sql", f"Fixing SQL (attempt {attempt + 1}/{max_attempts})...")
-                    await asyncio.sleep(0.05)
+                    yield self.status_event("fixing_sql", f"Fixing SQL (attempt {attempt + 1}/{max_attempts})...")
                     error_msg = "; ".join(validation_errors)
-                    sql_candidate = fix_sql(sql_candidate or "", error_msg, schema_info, normalized)
+                    sql_candidate = await asyncio.to_thread(
+                        fix_sql, sql_candidate or "", error_msg, schema_info, normalized
+                    )
                 
                 if not sql_candidate:
                     validation_errors = ["Failed to generate SQL"]
@@ -218,7 +375,7 @@ class StreamingWorkflowRunner:
         
         # If still invalid after retries
         if validation_errors:
-            return {
+            self.result = {
                 "answer": f"I couldn't generate a valid query: {'; '.join(validation_errors)}",
                 "sql_candidate": sql_candidate,
                 "assumptions": [],
@@ -226,15 +383,16 @@ class StreamingWorkflowRunner:
                 "follow_up_questions": ["Could you rephrase your question?"],
                 "row_count": 0
             }
+            return
         
         # Step 3: Executing SQL
-        self.emit_status("executing_sql", "Executing query...")
-        await asyncio.sleep(0.05)
+        yield self.status_event("executing_sql", "Executing query...")
         
+        # Blocking DB call; run it off the event loop so other streams keep flowing
         try:
-            columns, rows, row_count = execute_query(sql_candidate or "")
+            columns, column_data, row_count = await asyncio.to_thread(execute_query, sql_candidate or "")
         except SQLExecutionError as e:
-            return {
+            self.result = {
                 "answer": f"Query execution failed: {str(e)}",
                 "sql_candidate": sql_candidate,
                 "assumptions": [],
@@ -242,8 +400,9 @@ class StreamingWorkflowRunner:
                 "follow_up_questions": ["Try asking in a different way."],
                 "row_count": 0
             }
+            return
         except Exception as e:
-            return {
+            self.result = {
                 "answer": f"Query execution failed: {str(e)}",
                 "sql_candidate": sql_candidate,
                 "assumptions": [],
@@ -251,35 +410,37 @@ class StreamingWorkflowRunner:
                 "follow_up_questions": ["Try asking in a different way."],
                 "row_count": 0
             }
+            return
         
         # Step 4: Summarizing with streaming
-        self.emit_status("summarizing_answer", "Generating answer...")
-        await asyncio.sleep(0.05)
+        yield self.status_event("summarizing_answer", "Generating answer...")
         
         # Generate answer with streaming
-        answer = await self._generate_answer_streaming(
+        async for event in self._generate_answer_streaming(
             user_question=normalized,
             sql_used=sql_candidate or "",
             columns=columns,
-            rows=rows
-        )
+            column_data=column_data
+        ):
+            yield event
+        answer = self.answer
         
         # Generate chart
         vega_spec = generate_chart_spec(
             columns=columns,
-            rows=rows,
+            column_data=column_data,
             sql=sql_candidate or ""
         )
         
         # Generate follow-up questions
-        follow_ups = self._generate_follow_ups(sql_candidate or "", columns)
+        follow_ups = generate_follow_ups(sql_candidate or "", columns)
         
         # Build assumptions
         assumptions = ["Results sorted by highest values first"]
         if row_count > 0:
             assumptions.append("Data is aggregated across all matching records")
         
-        return {
+        self.result = {
             "answer": answer,
             "sql_candidate": sql_candidate,
             "assumptions": assumptions,
@@ -287,24 +448,20 @@ class StreamingWorkflowRunner:
             "follow_up_questions": follow_ups,
             "row_count": row_count,
             "columns": columns,
-            "rows": rows
+            "column_data": column_data
         }
+        return
     
     async def _generate_answer_streaming(
         self,
         user_question: str,
         sql_used: str,
         columns: List[str],
-        rows: List[Dict[str, Any]]
-    ) -> str:
-        """Generate answer with token streaming."""
-        from app.services.llm import _get_openai_client
-        from app.agent.prompts import get_summarization_prompt
-        from openai.types.chat import ChatCompletionMessageParam
-        
+        column_data: ColumnData
+    ) -> AsyncGenerator[bytes, None]:
+        """Generate the answer, yielding token events; the answer is left in self.answer."""
         # Prepare messages
-        display_rows = rows[:50]
-        rows_text = json.dumps(display_rows, indent=2, default=str)
+        rows_text, shown = rows_csv_from_columns(column_data)
         
         messages: List[ChatCompletionMessageParam] = [
             {"role": "system", "content": get_summarization_prompt()},
@@ -316,7 +473,7 @@ SQL Executed:
 
 Result Columns: {', '.join(columns)}
 
-Result Data (up to 50 rows):
+Result Data as CSV (first {shown} of {column_length(column_data)} rows):
 {rows_text}
 
 Please provide a concise, business-friendly summary of these results.
@@ -324,11 +481,11 @@ Please provide a concise, business-friendly summary of these results.
         ]
         
         try:
-            client = _get_openai_client()
+            client = _get_async_openai_client()
             
             # Stream the response
             full_answer = ""
-            stream = client.chat.completions.create(
+            stream = await client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=messages,
                 temperature=0.2,
@@ -336,157 +493,152 @@ Please provide a concise, business-friendly summary of these results.
                 stream=True
             )
             
-            for chunk in stream:
+            # Deltas are often a few characters; coalesce them into fewer events
+            pending: List[str] = []
+            pending_chars = 0
+            last_flush = time.monotonic()
+            async for chunk in stream:
                 if chunk.choices and chunk.choices[0].delta.content:
                     token = chunk.choices[0].delta.content
                     full_answer += token
-                    self.emit_token(token)
-                    await asyncio.sleep(0.01)  # Small delay for smooth streaming
+                    pending.append(token)
+                    pending_chars += len(token)
+                    now = time.monotonic()
+                    if pending_chars >= TOKEN_FLUSH_CHARS or now - last_flush >= TOKEN_FLUSH_SECONDS:
+                        yield self.token_event("".join(pending))
+                        pending.clear()
+                        pending_chars = 0
+                        last_flush = now
+            if pending:
+                yield self.token_event("".join(pending))
             
-            return full_answer.strip()
+            self.answer = full_answer.strip()
             
         except Exception as e:
             logger.error(f"Streaming answer generation failed: {e}")
             # Fallback to non-streaming
-            from app.services.llm import summarize_results
-            from app.agent.schema import get_schema_summary
-            return summarize_results(
+            self.answer = await asyncio.to_thread(
+                summarize_results,
                 user_question=user_question,
                 sql_used=sql_used,
                 columns=columns,
-                rows=rows,
+                column_data=column_data,
                 assumptions=[],
                 schema_summary=get_schema_summary()
             )
     
-    def _generate_follow_ups(self, sql: str, columns: List[str]) -> List[str]:
-        """Generate follow-up questions based on context."""
-        follow_ups = []
-        sql_lower = sql.lower() if sql else ""
-        
-        if "product" in sql_lower:
-            follow_ups.extend([
-                "How does this compare by territory?",
-                "What's the trend over the last few months?"
-            ])
-        elif "territory" in sql_lower:
-            follow_ups.extend([
-                "Which products perform best in each territory?",
-                "Show me the top HCPs by territory"
-            ])
-        elif "hcp" in sql_lower:
-            follow_ups.extend([
-                "What products do they prescribe most?",
-                "How does this compare to other HCPs?"
-            ])
-        else:
-            follow_ups.extend([
-                "What are the top products by revenue?",
-                "Show me revenue by territory"
-            ])
-        
-        return follow_ups[:3]
-
 
 async def stream_chat_response(
     session_id: int,
     user_id: int,
     message: str,
     request_id: str
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """
     Generator that yields SSE events for the chat response.
     """
-    from app.audit.repo import insert_audit_log
-    from app.services.chat_history import (
-        add_message, 
-        should_auto_title, 
-        auto_title_session
-    )
-    
     runner = StreamingWorkflowRunner(request_id)
-    start_time = time.time()
-    
-    # Store user message
-    add_message(session_id, "user", message)
+    start_time_ns = time.perf_counter_ns()
     
-    # Auto-title on first user message
-    if should_auto_title(session_id):
-        auto_title_session(session_id, message)
+    # The setup queries run back to back on one pooled connection
+    async with get_async_engine().connect() as conn:
+        # Store user message
+        await add_message(session_id, "user", message, conn=conn)
+        
+        # Auto-title on first user message
+        first_question = await should_auto_title(session_id, conn=conn)
+        if first_question:
+            await auto_title_session(session_id, message, conn=conn)
+        
+        # A first question doesn't depend on earlier turns, so a recent answer
+        # to the same question is replayed without running the workflow
+        cached = get_response_cache().get(message) if first_question else None
+        if cached is None:
+            # Same windowed, cached conversation memory as /chat
+            conversation_context = await get_conversation_context(session_id, conn=conn)
     
-    # Build conversation context for memory
-    conversation_context = build_conversation_context(session_id)
+    if cached is not None:
+        result = {
+            "answer": cached.answer,
+            "sql_candidate": cached.sql,
+            "assumptions": list(cached.assumptions),
+            "vega_lite_spec": cached.vega_lite_spec,
+            "follow_up_questions": list(cached.follow_up_questions),
+            "row_count": cached.row_count
+        }
+        yield runner.token_event(cached.answer)
+        yield runner.complete_event(result)
+        _write_in_background(add_message(session_id, "assistant", cached.answer, sql_query=cached.sql))
+        get_audit_writer().submit(AuditRecord(
+            session_id=str(session_id),
+            question=message,
+            sql_text=cached.sql,
+            runtime_ms=(time.perf_counter_ns() - start_time_ns) // 1_000_000,
+            row_count=cached.row_count,
+            error_text="Cache hit"
+        ))
+        return
     
     try:
-        # Run workflow in a separate task so we can yield events
-        workflow_task = asyncio.create_task(
-            runner.run_workflow_streaming(str(session_id), message, conversation_context)
-        )
-        
-        # Yield events as they come in
-        while not workflow_task.done():
-            try:
-                # Get event with timeout
-                event = await asyncio.wait_for(
-                    runner.events.get(), 
-                    timeout=0.1
-                )
-                yield event
-            except asyncio.TimeoutError:
-                continue
-        
-        # Drain any remaining events
-        while not runner.events.empty():
-            event = runner.events.get_nowait()
+        # Forward events as the workflow produces them
+        async for event in runner.run_workflow_streaming(str(session_id), message, conversation_context):
             yield event
         
-        # Get final result
-        result = await workflow_task
+        result = runner.result
         
-        # Store assistant response
-        add_message(
+        # Emit complete event, then store the assistant response; the write
+        # is detached so a client disconnecting after "complete" can't cancel it
+        yield runner.complete_event(result)
+        _write_in_background(add_message(
             session_id, 
             "assistant", 
             result.get("answer", ""),
             sql_query=result.get("sql_candidate")
-        )
-        
-        # Emit complete event
-        runner.emit_complete(result)
-        yield runner.events.get_nowait()
+        ))
+        
+        # Only results that ran a query to completion are cached
+        if first_question and result.get("sql_candidate") and "column_data" in result:
+            get_response_cache().put(
+                message,
+                result["answer"],
+                result["sql_candidate"],
+                result.get("assumptions", []),
+                result.get("vega_lite_spec") or {},
+                result.get("follow_up_questions", []),
+                result.get("row_count", 0)
+            )
         
-        # Log to audit
-        runtime_ms = int((time.time() - start_time) * 1000)
-        insert_audit_log(
+        # Log to audit (batched by the audit writer)
+        runtime_ms = (time.perf_counter_ns() - start_time_ns) // 1_000_000
+        get_audit_writer().submit(AuditRecord(
             session_id=str(session_id),
             question=message,
             sql_text=result.get("sql_candidate"),
             runtime_ms=runtime_ms,
             row_count=result.get("row_count", 0),
             error_text=None if not result.get("refusal_flag") else "Refused"
-        )
+        ))
         
     except Exception as e:
         logger.error(f"Streaming error: {e}", exc_info=True)
         
         # Emit error event
-        runner.emit_error(str(e))
-        yield runner.events.get_nowait()
+        yield runner.error_event(str(e))
         
         # Log error to audit
-        runtime_ms = int((time.time() - start_time) * 1000)
-        insert_audit_log(
+        runtime_ms = (time.perf_counter_ns() - start_time_ns) // 1_000_000
+        get_audit_writer().submit(AuditRecord(
             session_id=str(session_id),
             question=message,
             sql_text=None,
             runtime_ms=runtime_ms,
             row_count=0,
             error_text=f"Streaming error: {str(e)}"
-        )
+        ))
 
 
 @router.post("/chat/stream")
-async def chat_stream(request: StreamChatRequest, http_request: Request, user: dict = Depends(require_auth)):
+async def chat_stream(request: ChatRequest, http_request: Request, user: dict = Depends(require_auth)):
     """
     Stream chat response using Server-Sent Events.
     Requires authentication.
@@ -499,9 +651,7 @@ async def chat_stream(request: StreamChatRequest, http_request: Request, user: d
     
     All events include request_id for debugging.
     """
-    from app.services.chat_history import create_session, get_session
-    
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id()
     message = request.message.strip()
     user_id = user['id']
     
@@ -514,19 +664,14 @@ async def chat_stream(request: StreamChatRequest, http_request: Request, user: d
         return StreamingResponse(
             error_stream(),
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
+            headers=SSE_HEADERS
         )
     
     # Get or create session
     session_id = request.session_id
     if session_id:
         # Verify session belongs to user
-        session = get_session(session_id)
-        if not session or session["user_id"] != user_id:
+        if not await session_belongs_to(session_id, user_id):
             async def error_stream():
                 yield format_sse_event(EVENT_ERROR, {
                     "error": "Session not found or access denied"
@@ -535,30 +680,22 @@ async def chat_stream(request: StreamChatRequest, http_request: Request, user: d
             return StreamingResponse(
                 error_stream(),
                 media_type="text/event-stream",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "X-Accel-Buffering": "no"
-                }
+                headers=SSE_HEADERS
             )
     else:
         # Create new session
-        new_session = create_session(user_id)
+        new_session = await create_session(user_id)
         session_id = new_session["id"]
     
     async def stream_with_session_id():
         """Wrap stream to include session_id in first event."""
         # Send session_id as first event so frontend knows which session to use
-        yield format_sse_event("session", {"session_id": session_id}, request_id)
+        yield format_sse_event(EVENT_SESSION, {"session_id": session_id}, request_id)
         async for event in stream_chat_response(session_id, user_id, message, request_id):
             yield event
     
     return StreamingResponse(
-        stream_with_session_id(),
+        batch_sse_frames(with_keepalive(stream_with_session_id())),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
+        headers=SSE_HEADERS
     )
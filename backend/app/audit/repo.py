@@ -1,59 +1,70 @@
 """
 Audit logging repository
-Handles inserting records into the audit_log table for every request.
+Handles inserting records into the audit_log table. Request handlers don't
+call it directly; they submit records to the batched writer in
+app.audit.writer.
 """
-from typing import Optional
-from sqlalchemy import text
+from typing import Any, Mapping, Optional, Sequence
+from sqlalchemy import RowMapping, column, insert, table, text
 
-from app.db.engine import get_engine
+from app.db.engine import get_async_engine, get_engine
 
 
-def insert_audit_log(
-    session_id: str,
-    question: str,
-    sql_text: Optional[str],
-    runtime_ms: int,
-    row_count: int,
-    error_text: Optional[str]
-) -> None:
+# Lightweight table construct for multi-row inserts
+_AUDIT_LOG = table(
+    "audit_log",
+    column("session_id"),
+    column("question"),
+    column("sql_text"),
+    column("runtime_ms"),
+    column("row_count"),
+    column("error_text"),
+)
+
+
+def insert_audit_logs(records: Sequence[Mapping[str, Any]]) -> None:
     """
-    Insert an audit log entry for a chat request.
+    Insert several audit log entries with one multi-row INSERT.
     
     Args:
-        session_id: The session identifier
-        question: The user's original question
-        sql_text: The generated SQL query (if any)
-        runtime_ms: Query execution time in milliseconds
-        row_count: Number of rows returned
-        error_text: Error message if any error occurred
+        records: Mappings with session_id, question, sql_text, runtime_ms,
+            row_count and error_text keys
     """
-    engine = get_engine()
+    if not records:
+        return
     
-    insert_query = text("""
-        INSERT INTO audit_log (session_id, question, sql_text, runtime_ms, row_count, error_text)
-        VALUES (:session_id, :question, :sql_text, :runtime_ms, :row_count, :error_text)
-    """)
+    engine = get_engine()
     
     try:
         with engine.connect() as conn:
-            conn.execute(
-                insert_query,
-                {
-                    "session_id": session_id,
-                    "question": question,
-                    "sql_text": sql_text,
-                    "runtime_ms": runtime_ms,
-                    "row_count": row_count,
-                    "error_text": error_text
-                }
-            )
+            conn.execute(insert(_AUDIT_LOG).values([dict(record) for record in records]))
             conn.commit()
     except Exception as e:
         # Log the error but don't fail the request
-        print(f"Failed to insert audit log: {e}")
+        print(f"Failed to insert {len(records)} audit logs: {e}")
+
+
+async def insert_audit_logs_async(records: Sequence[Mapping[str, Any]]) -> None:
+    """
+    Async variant of insert_audit_logs on the asyncpg engine, used by the
+    batched writer so flushes don't tie up a worker thread.
+    
+    Args:
+        records: Mappings with session_id, question, sql_text, runtime_ms,
+            row_count and error_text keys
+    """
+    if not records:
+        return
+    
+    try:
+        async with get_async_engine().begin() as conn:
+            await conn.execute(insert(_AUDIT_LOG).values([dict(record) for record in records]))
+    except Exception as e:
+        # Log the error but don't fail the request
+        print(f"Failed to insert {len(records)} audit logs: {e}")
 
 
-def get_audit_logs(session_id: Optional[str] = None, limit: int = 100):
+def get_audit_logs(session_id: Optional[str] = None, limit: int = 100) -> Sequence[RowMapping]:
     """
     Retrieve audit logs, optionally filtered by session_id.
     
@@ -62,7 +73,7 @@ def get_audit_logs(session_id: Optional[str] = None, limit: int = 100):
         limit: Maximum number of records to return
         
     Returns:
-        List of audit log records
+        List of audit log records (read-only mappings keyed by column)
     """
     engine = get_engine()
     
@@ -85,7 +96,5 @@ def get_audit_logs(session_id: Optional[str] = None, limit: int = 100):
         params = {"limit": limit}
     
     with engine.connect() as conn:
-        result = conn.execute(query, params)
-        rows = result.fetchall()
-        columns = result.keys()
-        return [dict(zip(columns, row)) for row in rows]
+        # RowMappings are read-only dict-like views over the fetched rows
+        return conn.execute(query, params).mappings().all()
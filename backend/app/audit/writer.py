@@ -0,0 +1,153 @@
+"""
+Batched audit log writer.
+Requests enqueue audit records; a background task flushes them to the
+database in multi-row INSERTs instead of one round-trip per request.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+from app.audit.repo import insert_audit_logs, insert_audit_logs_async
+
+logger = logging.getLogger(__name__)
+
+
+class AuditRecord(NamedTuple):
+    """One audit_log row."""
+    session_id: str
+    question: str
+    sql_text: Optional[str]
+    runtime_ms: int
+    row_count: int
+    error_text: Optional[str]
+
+
+class AuditWriter:
+    """
+    Buffers audit records in a bounded queue and flushes them in batches.
+
+    A batch is written when it reaches max_batch records or max_wait_ms
+    after its first record arrived. When the queue is full the oldest
+    record is dropped. Before start() is called (e.g. in scripts and tests
+    that don't run the app's startup) records are written immediately.
+    """
+
+    def __init__(self, max_queue: int = 10_000, max_batch: int = 256, max_wait_ms: float = 50.0):
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.dropped = 0
+        self._queue: Optional["asyncio.Queue[AuditRecord]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._batch: List[AuditRecord] = []
+
+    def start(self) -> None:
+        """Start the flusher on the running event loop."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still queued."""
+        if self._task is None or self._queue is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        # Records taken off the queue for a batch that hadn't been written yet
+        remaining, self._batch = self._batch, []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        await self._flush(remaining)
+        self._task = self._queue = self._loop = self._loop_thread = None
+
+    def submit(self, record: AuditRecord) -> None:
+        """Queue a record for writing. Never blocks; safe from any thread."""
+        if self._loop is None:
+            insert_audit_logs([record._asdict()])
+        elif threading.get_ident() == self._loop_thread:
+            self._put(record)
+        else:
+            self._loop.call_soon_threadsafe(self._put, record)
+
+    def _put(self, record: AuditRecord) -> None:
+        assert self._queue is not None
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+            logger.warning("Audit queue full; dropped oldest record (%d dropped so far)", self.dropped)
+        self._queue.put_nowait(record)
+
+    async def _run(self) -> None:
+        assert self._queue is not None and self._loop is not None
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = self._loop.time() + self.max_wait
+            while len(self._batch) < self.max_batch:
+                # Take what's already queued without arming a timeout
+                if not self._queue.empty():
+                    self._batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[AuditRecord]) -> None:
+        if batch:
+            await insert_audit_logs_async([record._asdict() for record in batch])
+
+
+class AuditThrottle:
+    """
+    Lets through at most one audit record per interval and counts the rest.
+
+    For failure modes where every request fails the same way, so a degraded
+    service doesn't also flood the audit table.
+    """
+
+    def __init__(self, interval_seconds: float = 1.0):
+        self.interval = interval_seconds
+        self._next_allowed = 0.0
+        self._suppressed = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Tuple[bool, int]:
+        """Return (allowed, records suppressed since the last allowed one)."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_allowed:
+                self._suppressed += 1
+                return False, 0
+            self._next_allowed = now + self.interval
+            suppressed, self._suppressed = self._suppressed, 0
+            return True, suppressed
+
+
+_audit_writer: Optional[AuditWriter] = None
+_audit_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    """Get the shared audit writer (singleton)."""
+    global _audit_writer
+    if _audit_writer is None:
+        with _audit_writer_lock:
+            if _audit_writer is None:
+                _audit_writer = AuditWriter()
+    return _audit_writer
@@ -0,0 +1,22 @@
+"""
+Response compression middleware.
+"""
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import Receive, Scope, Send
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZip for regular responses. Requests asking for server-sent events are
+    passed through untouched: gzip buffers small writes, which would hold
+    streamed tokens back until the response ends. Event streams also set
+    Content-Encoding: identity, which the base class leaves alone, so they
+    are never compressed even without that Accept header.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
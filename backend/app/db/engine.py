@@ -3,7 +3,8 @@ SQLAlchemy database engine configuration
 """
 from functools import lru_cache
 from sqlalchemy import create_engine
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 from app.core.config import get_settings
 
@@ -18,8 +19,10 @@ def get_engine() -> Engine:
     
     engine = create_engine(
         settings.database_url,
-        pool_size=5,
-        max_overflow=10,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_use_lifo=True,  # Reuse recently used connections; idle extras can time out
         pool_pre_ping=True,  # Enable connection health checks
         echo=settings.debug  # Log SQL queries in debug mode
     )
@@ -27,6 +30,28 @@ def get_engine() -> Engine:
     return engine
 
 
+@lru_cache()
+def get_async_engine() -> AsyncEngine:
+    """
+    Get cached async SQLAlchemy engine (asyncpg driver).
+    Used by request handlers so DB calls don't block the event loop.
+    """
+    settings = get_settings()
+    url = make_url(settings.database_url).set(drivername="postgresql+asyncpg")
+    
+    engine = create_async_engine(
+        url,
+        pool_size=settings.db_async_pool_size,
+        max_overflow=settings.db_async_max_overflow,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_use_lifo=True,
+        pool_pre_ping=True,
+        echo=settings.debug
+    )
+    
+    return engine
+
+
 def get_connection():
     """Get a database connection from the pool."""
     engine = get_engine()
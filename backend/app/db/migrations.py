@@ -0,0 +1,28 @@
+"""
+Schema upgrades for databases created before a column was added.
+
+The scripts in db/init only run when Postgres starts on an empty data
+volume, so columns added after the initial release are brought in here,
+at application startup. Every statement is idempotent.
+"""
+import logging
+
+from sqlalchemy import text
+
+from app.db.engine import get_async_engine
+
+logger = logging.getLogger(__name__)
+
+_MIGRATIONS = (
+    # Conversation summary (context window)
+    text("ALTER TABLE chat_session ADD COLUMN IF NOT EXISTS summary TEXT"),
+    text("ALTER TABLE chat_session ADD COLUMN IF NOT EXISTS summary_through_id INTEGER"),
+)
+
+
+async def apply_migrations() -> None:
+    """Apply the schema upgrades in one transaction."""
+    async with get_async_engine().begin() as conn:
+        for statement in _MIGRATIONS:
+            await conn.execute(statement)
+    logger.info("Applied %d schema migrations", len(_MIGRATIONS))
@@ -2,13 +2,16 @@
 SQL validators and guardrails.
 """
 import re
-from typing import List, Optional, Tuple
+from typing import List, Literal, Optional, Tuple
 
 import sqlglot
 from sqlglot import exp
 
 from app.agent.schema import ALLOWED_SCHEMA, BLOCKED_TABLES
 
+# Lower-cased allowed table names, built once for O(1) membership checks
+_ALLOWED_TABLES_LOWER = frozenset(t.lower() for t in ALLOWED_SCHEMA)
+
 
 class ValidationError(Exception):
     """Exception raised when SQL validation fails."""
@@ -88,7 +91,7 @@ def validate_allowlist(sql: str) -> List[str]:
         
         if table_name in BLOCKED_TABLES:
             errors.append(f"Access to table '{table_name}' is not permitted")
-        elif table_name not in [t.lower() for t in ALLOWED_SCHEMA.keys()]:
+        elif table_name not in _ALLOWED_TABLES_LOWER:
             errors.append(f"Unknown table: '{table_name}'")
     
     return errors
@@ -163,6 +166,121 @@ def validate_sql_complete(sql: str) -> Tuple[bool, List[str]]:
     return len(errors) == 0, errors
 
 
+# Phrases that indicate an attempt to export whole datasets
+_DUMP_PATTERNS: Tuple[str, ...] = (
+    "dump everything",
+    "dump all",
+    "export all",
+    "give me everything",
+    "all the data",
+    "entire database",
+    "all records",
+    "all rows",
+    "download everything",
+    "extract all",
+)
+
+_DUMP_REFUSAL = (
+    "I can't export entire datasets. Please ask a specific question about the data, "
+    "such as 'What are the top 10 products by revenue?' or 'Show sales by territory'."
+)
+
+# Patterns that might indicate inappropriate access attempts, with the refusal
+_SENSITIVE_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ("password", "I cannot provide password information."),
+    ("credential", "I cannot provide credential information."),
+    ("api key", "I cannot provide API key information."),
+    ("secret", "I cannot provide secret information."),
+    ("audit_log", "Access to audit logs is restricted."),
+)
+
+# Words that make a short question too vague to answer
+_VAGUE_PATTERNS: Tuple[str, ...] = ("help", "something", "anything", "whatever", "stuff")
+
+
+def _named_alternatives(prefix: str, patterns: Tuple[str, ...]) -> str:
+    """Build a regex alternation with one named group per pattern."""
+    return "|".join(f"(?P<{prefix}{i}>{re.escape(p)})" for i, p in enumerate(patterns))
+
+
+_DUMP_RE = re.compile("|".join(map(re.escape, _DUMP_PATTERNS)), re.IGNORECASE)
+_SENSITIVE_RE = re.compile(
+    "(?=(?:" + _named_alternatives("sensitive", tuple(p for p, _ in _SENSITIVE_PATTERNS)) + "))",
+    re.IGNORECASE,
+)
+_SENSITIVE_REASONS = {f"sensitive{i}": reason for i, (_, reason) in enumerate(_SENSITIVE_PATTERNS)}
+# When several sensitive words appear, the earliest pattern in
+# _SENSITIVE_PATTERNS decides the refusal, wherever it is in the question
+_SENSITIVE_PRIORITY = {f"sensitive{i}": i for i in range(len(_SENSITIVE_PATTERNS))}
+
+# Every screening keyword in one alternation. It is wrapped in a lookahead so
+# finditer reports matches starting at every position, including overlapping ones.
+_SCREEN_RE = re.compile(
+    "(?=(?:"
+    + "|".join((
+        _named_alternatives("dump", _DUMP_PATTERNS),
+        _named_alternatives("sensitive", tuple(p for p, _ in _SENSITIVE_PATTERNS)),
+        _named_alternatives("vague", _VAGUE_PATTERNS),
+    ))
+    + "))",
+    re.IGNORECASE,
+)
+
+
+# Outcome of the refusal screen: allowed, a bulk dump, or sensitive data
+RequestKind = Literal["ok", "dump", "sensitive"]
+
+
+def _scan_question(question: str) -> Tuple[RequestKind, Optional[str], bool]:
+    """Single pass over the question: (kind, refusal_reason, has_vague_keywords)."""
+    sensitive_group = None
+    vague_found = False
+    
+    for match in _SCREEN_RE.finditer(question):
+        group = match.lastgroup
+        if group.startswith("dump"):
+            return "dump", _DUMP_REFUSAL, vague_found
+        if group.startswith("sensitive"):
+            if sensitive_group is None or _SENSITIVE_PRIORITY[group] < _SENSITIVE_PRIORITY[sensitive_group]:
+                sensitive_group = group
+        else:
+            vague_found = True
+    
+    if sensitive_group is not None:
+        return "sensitive", _SENSITIVE_REASONS[sensitive_group], vague_found
+    return "ok", None, vague_found
+
+
+def classify_request(question: str) -> Tuple[RequestKind, Optional[str]]:
+    """
+    Check a question for dump and sensitive data requests in one scan.
+    
+    Args:
+        question: User's question
+        
+    Returns:
+        Tuple of (kind, refusal_reason). Dump requests take precedence over
+        sensitive ones; refusal_reason is None when kind is "ok".
+    """
+    kind, reason, _ = _scan_question(question)
+    return kind, reason
+
+
+def screen_question(question: str) -> Tuple[Optional[str], bool]:
+    """
+    Scan the question once for dump, sensitive and vague keywords.
+    
+    Args:
+        question: User's question
+        
+    Returns:
+        Tuple of (refusal_reason, has_vague_keywords). Dump requests take
+        precedence over sensitive ones; refusal_reason is None if allowed.
+    """
+    _, reason, vague_found = _scan_question(question)
+    return reason, vague_found
+
+
 def check_dump_request(question: str) -> Tuple[bool, Optional[str]]:
     """
     Check if the user is trying to dump all data.
@@ -173,27 +291,8 @@ def check_dump_request(question: str) -> Tuple[bool, Optional[str]]:
     Returns:
         Tuple of (is_dump_request, refusal_reason)
     """
-    question_lower = question.lower()
-    
-    dump_patterns = [
-        "dump everything",
-        "dump all",
-        "export all",
-        "give me everything",
-        "all the data",
-        "entire database",
-        "all records",
-        "all rows",
-        "download everything",
-        "extract all"
-    ]
-    
-    for pattern in dump_patterns:
-        if pattern in question_lower:
-            return True, (
-                "I can't export entire datasets. Please ask a specific question about the data, "
-                "such as 'What are the top 10 products by revenue?' or 'Show sales by territory'."
-            )
+    if _DUMP_RE.search(question):
+        return True, _DUMP_REFUSAL
     
     return False, None
 
@@ -208,19 +307,8 @@ def check_sensitive_request(question: str) -> Tuple[bool, Optional[str]]:
     Returns:
         Tuple of (is_sensitive, refusal_reason)
     """
-    question_lower = question.lower()
-    
-    # Patterns that might indicate inappropriate access attempts
-    sensitive_patterns = [
-        ("password", "I cannot provide password information."),
-        ("credential", "I cannot provide credential information."),
-        ("api key", "I cannot provide API key information."),
-        ("secret", "I cannot provide secret information."),
-        ("audit_log", "Access to audit logs is restricted."),
-    ]
-    
-    for pattern, reason in sensitive_patterns:
-        if pattern in question_lower:
-            return True, reason
+    groups = [match.lastgroup for match in _SENSITIVE_RE.finditer(question)]
+    if groups:
+        return True, _SENSITIVE_REASONS[min(groups, key=_SENSITIVE_PRIORITY.__getitem__)]
     
     return False, None
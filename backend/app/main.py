@@ -3,6 +3,7 @@ Pharma Analyst Bot - FastAPI Main Application
 """
 import logging
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.health import router as health_router
@@ -10,6 +11,10 @@ from app.api.chat import router as chat_router
 from app.api.streaming import router as streaming_router
 from app.api.auth import router as auth_router
 from app.api.sessions import router as sessions_router
+from app.agent.runner import get_agent_runner
+from app.audit.writer import get_audit_writer
+from app.core.compression import CompressionMiddleware
+from app.db.migrations import apply_migrations
 
 # Configure logging
 logging.basicConfig(
@@ -21,7 +26,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Pharma Analyst Bot",
     description="AI-powered SQL agent for pharmaceutical data analysis",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson is much faster than stdlib json for chart specs and row payloads
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware for frontend (credentials required for cookies)
@@ -33,6 +40,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses (chart specs carry data values); small
+# responses such as refusals aren't worth the CPU
+app.add_middleware(CompressionMiddleware, minimum_size=1024, compresslevel=5)
+
 # Include routers
 app.include_router(health_router, prefix="/api", tags=["Health"])
 app.include_router(auth_router, prefix="/api", tags=["Auth"])
@@ -45,9 +56,17 @@ app.include_router(streaming_router, prefix="/api", tags=["Chat Streaming"])
 async def startup_event():
     """Initialize application on startup."""
     print("🚀 Pharma Analyst Bot API starting up...")
+    try:
+        await apply_migrations()
+    except Exception as e:
+        logger.error("Schema migrations failed: %s", e)
+    get_audit_writer().start()
+    get_agent_runner().start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
     print("👋 Pharma Analyst Bot API shutting down...")
+    await get_agent_runner().stop()
+    await get_audit_writer().stop()
@@ -1,16 +1,17 @@
 """
 Answer generation service - LLM-based summarization only.
 """
-from typing import List, Dict, Any
+from typing import Iterator, List, Sequence
 
-from app.services.llm import summarize_results, is_llm_available, LLMError
+from app.services.llm import summarize_results, summarize_results_stream, is_llm_available, LLMError
+from app.services.sql_exec import ColumnData
 
 
 def generate_answer(
     user_question: str,
     sql_used: str,
     columns: List[str],
-    rows: List[Dict[str, Any]],
+    column_data: ColumnData,
     assumptions: List[str],
     schema_summary: str,
     row_count: int
@@ -24,7 +25,7 @@ def generate_answer(
         user_question: Original user question
         sql_used: The SQL query that was executed
         columns: Column names from result
-        rows: Result rows
+        column_data: Result values per column
         assumptions: Assumptions made during query generation
         schema_summary: Brief schema context
         row_count: Total row count
@@ -44,7 +45,7 @@ def generate_answer(
             user_question=user_question,
             sql_used=sql_used,
             columns=columns,
-            rows=[],
+            column_data={},
             assumptions=assumptions,
             schema_summary=schema_summary
         )
@@ -54,7 +55,7 @@ def generate_answer(
         user_question=user_question,
         sql_used=sql_used,
         columns=columns,
-        rows=rows,  # Already limited by caller
+        column_data=column_data,
         assumptions=assumptions,
         schema_summary=schema_summary
     )
@@ -62,6 +63,37 @@ def generate_answer(
     return answer
 
 
+def generate_answer_stream(
+    user_question: str,
+    sql_used: str,
+    columns: List[str],
+    column_data: ColumnData,
+    assumptions: List[str],
+    schema_summary: str,
+    row_count: int
+) -> Iterator[str]:
+    """
+    Stream a business-friendly answer for query results.
+    
+    Same contract as generate_answer, but yields the answer in chunks as
+    the LLM produces them.
+    
+    Raises:
+        LLMError: If LLM is not available or fails
+    """
+    if not is_llm_available():
+        raise LLMError("LLM summarization is required but OPENAI_API_KEY is not set")
+    
+    return summarize_results_stream(
+        user_question=user_question,
+        sql_used=sql_used,
+        columns=columns,
+        column_data=column_data if row_count else {},
+        assumptions=assumptions,
+        schema_summary=schema_summary
+    )
+
+
 def generate_refusal_answer(reason: str) -> str:
     """
     Generate an answer explaining why a query was refused.
@@ -89,7 +121,7 @@ def generate_error_answer(error: str, user_question: str) -> str:
     return f"I encountered an issue while processing your query: {error}. Please try rephrasing your question."
 
 
-def generate_clarification_answer(follow_up_questions: List[str]) -> str:
+def generate_clarification_answer(follow_up_questions: Sequence[str]) -> str:
     """
     Generate an answer asking for clarification.
     
@@ -5,11 +5,13 @@ Simple session-based auth for the POC.
 import secrets
 import logging
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Hashable, Optional, Tuple
 
 import bcrypt
 from sqlalchemy import text
 
+from app.core.cache import TTLCache
+from app.core.config import get_settings
 from app.db.engine import get_engine
 
 logger = logging.getLogger(__name__)
@@ -18,6 +20,39 @@ logger = logging.getLogger(__name__)
 SESSION_DURATION_DAYS = 7
 
 
+class _LookupCache(TTLCache[Hashable, dict]):
+    """
+    TTL + LRU cache for session and user lookups.
+    
+    Only found rows are cached, so a freshly created session or user is
+    never hidden behind a cached miss. Rows are copied in and out so
+    callers can't mutate a cached row.
+    """
+    
+    def get(self, key: Hashable) -> Optional[dict]:
+        value = super().get(key)
+        return None if value is None else dict(value)
+    
+    def put(self, key: Hashable, value: dict) -> None:
+        super().put(key, dict(value))
+
+
+_settings = get_settings()
+_session_cache = _LookupCache(_settings.auth_cache_max_entries, _settings.auth_cache_ttl_seconds)
+_user_cache = _LookupCache(_settings.auth_cache_max_entries, _settings.auth_cache_ttl_seconds)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a cached user row; call after updating the user's profile."""
+    _user_cache.pop(user_id)
+
+
+def clear_auth_caches() -> None:
+    """Drop all cached sessions and users."""
+    _session_cache.clear()
+    _user_cache.clear()
+
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt."""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -61,6 +96,10 @@ def get_user_by_id(user_id: int) -> Optional[dict]:
     Returns:
         User dict with id, email, display_name, or None if not found.
     """
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
     engine = get_engine()
     
     with engine.connect() as conn:
@@ -71,11 +110,13 @@ def get_user_by_id(user_id: int) -> Optional[dict]:
         row = result.fetchone()
         
         if row:
-            return {
+            user = {
                 "id": row[0],
                 "email": row[1],
                 "display_name": row[2]
             }
+            _user_cache.put(user_id, user)
+            return user
         return None
 
 
@@ -129,7 +170,7 @@ def create_session(user_id: int) -> str:
         )
         conn.commit()
     
-    logger.info(f"Created session for user_id={user_id}")
+    logger.info("Created session for user_id=%s", user_id)
     return session_id
 
 
@@ -142,6 +183,14 @@ def get_session(session_id: str) -> Optional[dict]:
     """
     if not session_id:
         return None
+    
+    cached = _session_cache.get(session_id)
+    if cached is not None:
+        # The cache TTL is short, but never serve a session past its expiry
+        if cached["expires_at"] > datetime.utcnow():
+            return cached
+        _session_cache.pop(session_id)
+        return None
         
     engine = get_engine()
     
@@ -157,10 +206,12 @@ def get_session(session_id: str) -> Optional[dict]:
         row = result.fetchone()
         
         if row:
-            return {
+            session = {
                 "user_id": row[0],
                 "expires_at": row[1]
             }
+            _session_cache.put(session_id, session)
+            return session
         return None
 
 
@@ -173,7 +224,9 @@ def delete_session(session_id: str) -> bool:
     """
     if not session_id:
         return False
-        
+    
+    _session_cache.pop(session_id)
+    
     engine = get_engine()
     
     with engine.connect() as conn:
@@ -185,7 +238,7 @@ def delete_session(session_id: str) -> bool:
         
         deleted = result.rowcount > 0
         if deleted:
-            logger.info(f"Deleted session {session_id[:8]}...")
+            logger.info("Deleted session %s...", session_id[:8])
         return deleted
 
 
@@ -206,5 +259,5 @@ def cleanup_expired_sessions() -> int:
         
         count = result.rowcount
         if count > 0:
-            logger.info(f"Cleaned up {count} expired sessions")
+            logger.info("Cleaned up %d expired sessions", count)
         return count
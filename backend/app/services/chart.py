@@ -1,16 +1,22 @@
 """
 Vega-Lite chart specification generator.
 """
+import heapq
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence
 from decimal import Decimal
 
+from app.services.sql_exec import ColumnData, column_length
+
 logger = logging.getLogger(__name__)
 
+# Points plotted per chart; bar charts keep the largest values
+MAX_CHART_POINTS = 50
+
 
 def generate_chart_spec(
     columns: List[str],
-    rows: List[Dict[str, Any]],
+    column_data: ColumnData,
     sql: Optional[str] = None
 ) -> Dict[str, Any]:
     """
@@ -18,37 +24,27 @@ def generate_chart_spec(
     
     Args:
         columns: Column names from the result
-        rows: Result data as list of dicts
+        column_data: Result values per column
         sql: The SQL query (for context)
         
     Returns:
         Vega-Lite specification dict, or empty dict if no chart is appropriate
     """
-    logger.info(f"generate_chart_spec called: columns={columns}, row_count={len(rows) if rows else 0}")
+    row_count = column_length(column_data)
+    logger.debug("generate_chart_spec called: columns=%s, row_count=%d", columns, row_count)
     
-    if not rows or not columns:
+    if not row_count or not columns:
         logger.warning("No rows or columns, returning empty chart spec")
         return {}
     
-    # Limit data for visualization
-    display_data = rows[:50]
-    
     # Identify column types
     numeric_cols = []
     categorical_cols = []
     date_cols = []
     
-    first_row = rows[0]
-    logger.info(f"First row sample: {first_row}")
-    
     for col in columns:
-        val = first_row.get(col)
-        if val is None:
-            # Check other rows for non-null values
-            for row in rows[:10]:
-                if row.get(col) is not None:
-                    val = row.get(col)
-                    break
+        # First non-null value among the first 10 rows
+        val = next((v for v in column_data.get(col, ())[:10] if v is not None), None)
         
         if val is None:
             categorical_cols.append(col)
@@ -59,14 +55,14 @@ def generate_chart_spec(
         else:
             categorical_cols.append(col)
     
-    logger.info(f"Column classification: numeric={numeric_cols}, categorical={categorical_cols}, date={date_cols}")
+    logger.debug("Column classification: numeric=%s, categorical=%s, date=%s", numeric_cols, categorical_cols, date_cols)
     
     # Decide chart type based on data shape
     chart_spec = _select_chart_type(
-        display_data, columns, numeric_cols, categorical_cols, date_cols, sql
+        column_data, columns, numeric_cols, categorical_cols, date_cols, sql
     )
     
-    logger.info(f"Generated chart spec: {bool(chart_spec)}")
+    logger.info("Generated chart spec: %s", bool(chart_spec))
     return chart_spec
 
 
@@ -87,7 +83,7 @@ def _is_date_like(col_name: str, value: Any) -> bool:
 
 
 def _select_chart_type(
-    data: List[Dict[str, Any]],
+    data: ColumnData,
     columns: List[str],
     numeric_cols: List[str],
     categorical_cols: List[str],
@@ -95,17 +91,14 @@ def _select_chart_type(
     sql: Optional[str]
 ) -> Dict[str, Any]:
     """Select and build appropriate chart type."""
-    logger.info(f"_select_chart_type: data_len={len(data)}, numeric={numeric_cols}, categorical={categorical_cols}")
+    data_len = column_length(data)
+    logger.debug("_select_chart_type: data_len=%d, numeric=%s, categorical=%s", data_len, numeric_cols, categorical_cols)
     
     # Skip charts for single row
-    if len(data) < 1:
+    if data_len < 1:
         logger.warning("Not enough data for chart")
         return {}
     
-    # Truncate large datasets
-    if len(data) > 50:
-        data = data[:50]
-    
     # Time series: date column + numeric column
     if date_cols and numeric_cols:
         logger.info("Building line chart (time series)")
@@ -115,19 +108,19 @@ def _select_chart_type(
     if categorical_cols and numeric_cols:
         y_col = _pick_best_numeric(numeric_cols)
         x_col = _pick_best_categorical(categorical_cols)
-        logger.info(f"Building bar chart with x={x_col}, y={y_col}")
+        logger.info("Building bar chart with x=%s, y=%s", x_col, y_col)
         return _build_bar_chart(data, x_col, y_col)
     
     # Just numeric columns: use first column as labels
     if numeric_cols and len(columns) >= 2:
         x_col = columns[0]
         y_col = numeric_cols[0]
-        logger.info(f"Building bar chart (numeric only) with x={x_col}, y={y_col}")
+        logger.info("Building bar chart (numeric only) with x=%s, y=%s", x_col, y_col)
         return _build_bar_chart(data, x_col, y_col)
     
     # Fallback: use first two columns
     if len(columns) >= 2:
-        logger.info(f"Fallback bar chart with first two columns: {columns[0]}, {columns[1]}")
+        logger.info("Fallback bar chart with first two columns: %s, %s", columns[0], columns[1])
         return _build_bar_chart(data, columns[0], columns[1])
     
     logger.warning("Could not determine chart type")
@@ -161,7 +154,7 @@ def _pick_best_categorical(cols: List[str]) -> str:
 
 
 def _build_bar_chart(
-    data: List[Dict[str, Any]],
+    data: ColumnData,
     x_field: str,
     y_field: str
 ) -> Dict[str, Any]:
@@ -169,7 +162,7 @@ def _build_bar_chart(
     return {
         "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
         "description": "Query Results",
-        "data": {"values": _sanitize_data(data)},
+        "data": {"values": _chart_values(data, x_field, y_field, _top_indices(data[y_field]))},
         "mark": "bar",
         "encoding": {
             "x": {
@@ -193,7 +186,7 @@ def _build_bar_chart(
 
 
 def _build_line_chart(
-    data: List[Dict[str, Any]],
+    data: ColumnData,
     x_field: str,
     y_field: str
 ) -> Dict[str, Any]:
@@ -201,7 +194,7 @@ def _build_line_chart(
     return {
         "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
         "description": "Query Results Over Time",
-        "data": {"values": _sanitize_data(data)},
+        "data": {"values": _chart_values(data, x_field, y_field, range(MAX_CHART_POINTS))},
         "mark": {"type": "line", "point": True},
         "encoding": {
             "x": {
@@ -223,18 +216,43 @@ def _build_line_chart(
     }
 
 
-def _sanitize_data(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Sanitize data for JSON serialization."""
-    sanitized = []
-    for row in data:
-        clean_row = {}
-        for k, v in row.items():
-            # Convert Decimal to float, dates to strings
-            if hasattr(v, '__float__'):
-                clean_row[k] = float(v)
-            elif hasattr(v, 'isoformat'):
-                clean_row[k] = v.isoformat()
-            else:
-                clean_row[k] = v
-        sanitized.append(clean_row)
-    return sanitized
+def _top_indices(values: List[Any], k: int = MAX_CHART_POINTS) -> List[int]:
+    """
+    Row indices of the k largest values, in their original order.
+    Non-numeric columns just keep their first k rows.
+    """
+    if len(values) <= k:
+        return list(range(len(values)))
+    if not all(v is None or isinstance(v, (int, float, Decimal)) for v in values):
+        return list(range(k))
+    top = heapq.nlargest(
+        k, range(len(values)), key=lambda i: float("-inf") if values[i] is None else values[i]
+    )
+    return sorted(top)
+
+
+def _chart_values(
+    data: ColumnData,
+    x_field: str,
+    y_field: str,
+    indices: Sequence[int]
+) -> List[Dict[str, Any]]:
+    """Build Vega-Lite data values for the given rows, holding only the plotted fields."""
+    x_values = data[x_field]
+    indices = indices[:len(x_values)]
+    xs = [_sanitize_value(x_values[i]) for i in indices]
+    if y_field == x_field:
+        return [{x_field: x} for x in xs]
+    y_values = data[y_field]
+    ys = [_sanitize_value(y_values[i]) for i in indices]
+    return [{x_field: x, y_field: y} for x, y in zip(xs, ys)]
+
+
+def _sanitize_value(value: Any) -> Any:
+    """Sanitize a value for JSON serialization."""
+    # Convert Decimal to float, dates to strings
+    if hasattr(value, '__float__'):
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
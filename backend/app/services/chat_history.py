@@ -2,34 +2,262 @@
 Chat session and message repository.
 Handles persistence of chat sessions and message history.
 """
-from typing import List, Optional, Dict, Any
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from app.db.engine import get_engine
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.db.engine import get_async_engine
 
 
-def create_session(user_id: int) -> Dict[str, Any]:
+# Conversation memory: the most recent messages are kept verbatim within a
+# character budget (~4 chars per token); user questions that fall out of it
+# are folded into a short summary stored on the session.
+CONTEXT_MAX_CHARS = 2000
+_RECENT_BUDGET = CONTEXT_MAX_CHARS * 4 // 5
+_SUMMARY_BUDGET = CONTEXT_MAX_CHARS - _RECENT_BUDGET
+_SUMMARY_QUESTION_CHARS = 150
+_CONTEXT_LOAD_LIMIT = 200
+
+
+# Statements are built once at import and reused on every call
+
+_INSERT_SESSION = text("""
+    INSERT INTO chat_session (user_id)
+    VALUES (:user_id)
+    RETURNING id, user_id, title, created_at, updated_at
+""")
+
+_SELECT_USER_SESSIONS = text("""
+    SELECT id, user_id, title, created_at, updated_at
+    FROM chat_session
+    WHERE user_id = :user_id
+    ORDER BY updated_at DESC
+""")
+
+_SELECT_OWNED_SESSION = text("""
+    SELECT id, user_id, title, created_at, updated_at
+    FROM chat_session
+    WHERE id = :session_id AND user_id = :user_id
+""")
+
+_SELECT_SESSION = text("""
+    SELECT id, user_id, title, created_at, updated_at
+    FROM chat_session
+    WHERE id = :session_id
+""")
+
+_SESSION_OWNED_EXISTS = text(
+    "SELECT EXISTS(SELECT 1 FROM chat_session WHERE id = :session_id AND user_id = :user_id)"
+)
+
+_SELECT_OWNERSHIP = text("SELECT 1 FROM chat_session WHERE id = :session_id AND user_id = :user_id")
+
+_SELECT_SESSION_MESSAGES = text("""
+    SELECT id, session_id, role, content, sql_query, created_at
+    FROM chat_message
+    WHERE session_id = :session_id
+    ORDER BY created_at ASC
+""")
+
+_SELECT_RECENT_MESSAGES = text("""
+    SELECT id, role, content, sql_query, created_at
+    FROM chat_message
+    WHERE session_id = :session_id
+    ORDER BY created_at DESC
+    LIMIT :limit
+""")
+
+_SELECT_SESSION_SUMMARY = text("SELECT summary, summary_through_id FROM chat_session WHERE id = :session_id")
+
+_SELECT_UNSUMMARIZED_MESSAGES = text("""
+    SELECT id, role, content
+    FROM chat_message
+    WHERE session_id = :session_id AND id > :through_id
+    ORDER BY created_at DESC, id DESC
+    LIMIT :limit
+""")
+
+_UPDATE_SESSION_SUMMARY = text("""
+    UPDATE chat_session SET summary = :summary, summary_through_id = :through_id
+    WHERE id = :session_id
+""")
+
+# Inserts the message and bumps the session's updated_at in one round-trip
+_INSERT_MESSAGE = text("""
+    WITH touched AS (
+        UPDATE chat_session SET updated_at = NOW() WHERE id = :session_id
+    )
+    INSERT INTO chat_message (session_id, role, content, sql_query)
+    VALUES (:session_id, :role, :content, :sql_query)
+    RETURNING id, session_id, role, content, sql_query, created_at
+""")
+
+_SET_SESSION_TITLE = text("""
+    UPDATE chat_session
+    SET title = :title
+    WHERE id = :session_id AND title IS NULL
+""")
+
+_SELECT_SESSION_TITLE = text("SELECT title FROM chat_session WHERE id = :session_id")
+
+
+class _ConversationWindow:
+    """Recent messages of one session plus the summary of older questions."""
+    
+    __slots__ = ("messages", "chars", "summary", "summary_through_id")
+    
+    def __init__(self, summary: Optional[str] = None, summary_through_id: Optional[int] = None):
+        self.messages: Deque[Tuple[int, str, str]] = deque()
+        self.chars = 0
+        self.summary: List[str] = summary.split("\n") if summary else []
+        self.summary_through_id = summary_through_id or 0
+    
+    def add(self, message_id: int, role: str, content: str) -> bool:
+        """Append a message, summarizing older ones out of the budget. Returns True if the summary changed."""
+        self.messages.append((message_id, role, content))
+        self.chars += len(content)
+        changed = False
+        while self.chars > _RECENT_BUDGET and len(self.messages) > 1:
+            old_id, old_role, old_content = self.messages.popleft()
+            self.chars -= len(old_content)
+            self._summarize(old_id, old_role, old_content)
+            changed = True
+        return changed
+    
+    def _summarize(self, message_id: int, role: str, content: str) -> None:
+        self.summary_through_id = max(self.summary_through_id, message_id)
+        if role != "user":
+            return
+        question = " ".join(content.split())
+        if len(question) > _SUMMARY_QUESTION_CHARS:
+            question = question[:_SUMMARY_QUESTION_CHARS] + "..."
+        self.summary.append(question)
+        while len(self.summary) > 1 and sum(len(q) + 2 for q in self.summary) > _SUMMARY_BUDGET:
+            self.summary.pop(0)
+    
+    def stored_summary(self) -> Optional[str]:
+        """Summary as stored in chat_session.summary (one question per line)."""
+        return "\n".join(self.summary) or None
+    
+    def render(self) -> str:
+        """Format the window as LLM context."""
+        if not self.messages and not self.summary:
+            return ""
+        lines = ["Previous conversation:"]
+        if self.summary:
+            lines.append("Earlier questions: " + "; ".join(self.summary))
+        for _, role, content in self.messages:
+            label = "User: " if role == "user" else "Assistant: "
+            # Only a single message larger than the whole budget is cut
+            if len(content) > _RECENT_BUDGET:
+                content = content[:_RECENT_BUDGET] + "..."
+            lines.append(label + content)
+        return "\n".join(lines)
+
+
+class _ContextWindowCache:
+    """
+    Per-session cache of conversation windows (TTL + LRU).
+    
+    add_message appends to a cached window instead of invalidating it, so
+    a turn-taking session reads its context from memory. A load token
+    guards against a slow DB load overwriting a message appended meanwhile.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._windows: TTLCache[int, _ConversationWindow] = TTLCache(max_entries, ttl_seconds)
+        self._loading: Dict[int, object] = {}
+        self._lock = threading.Lock()
+    
+    def render(self, session_id: int) -> Optional[str]:
+        """Rendered context for a cached session, or None on a miss."""
+        with self._lock:
+            window = self._windows.get(session_id)
+            return None if window is None else window.render()
+    
+    def begin_load(self, session_id: int) -> object:
+        token = object()
+        with self._lock:
+            self._loading[session_id] = token
+        return token
+    
+    def finish_load(self, session_id: int, token: object, window: _ConversationWindow) -> None:
+        with self._lock:
+            if self._loading.get(session_id) is not token:
+                return  # a message was added during the load; don't cache
+            del self._loading[session_id]
+            self._windows.put(session_id, window)
+    
+    def append(self, session_id: int, message_id: int, role: str, content: str) -> Optional[_ConversationWindow]:
+        """Add a message to a cached window. Returns the window if its summary changed."""
+        with self._lock:
+            self._loading.pop(session_id, None)
+            window = self._windows.get(session_id)
+            if window is not None and window.add(message_id, role, content):
+                return window
+            return None
+    
+    def discard(self, session_id: int) -> None:
+        with self._lock:
+            self._windows.pop(session_id)
+            self._loading.pop(session_id, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._windows.clear()
+            self._loading.clear()
+
+
+_settings = get_settings()
+_context_cache = _ContextWindowCache(
+    _settings.context_cache_max_entries, _settings.context_cache_ttl_seconds
+)
+# (session_id, user_id) pairs known to match. Only confirmed ownership is
+# cached; sessions are never reassigned or deleted, so entries can't go stale.
+_ownership_cache: TTLCache[Tuple[int, int], bool] = TTLCache(
+    _settings.auth_cache_max_entries, _settings.auth_cache_ttl_seconds
+)
+
+
+@asynccontextmanager
+async def _connect(conn: Optional[AsyncConnection]) -> AsyncIterator[AsyncConnection]:
+    """
+    Use the caller's connection if one is given, otherwise check one out.
+    
+    Request handlers that make several calls in a row pass one connection
+    through them, so the pool is visited (and pre-pinged) once.
+    """
+    if conn is not None:
+        yield conn
+    else:
+        async with get_async_engine().connect() as own_conn:
+            yield own_conn
+
+
+async def create_session(user_id: int) -> Dict[str, Any]:
     """
     Create a new chat session for a user.
     
     Returns:
         Session dict with id, user_id, title, created_at, updated_at
     """
-    engine = get_engine()
-    
-    with engine.connect() as conn:
-        result = conn.execute(
-            text("""
-                INSERT INTO chat_session (user_id)
-                VALUES (:user_id)
-                RETURNING id, user_id, title, created_at, updated_at
-            """),
+    engine = get_async_engine()
+    
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            _INSERT_SESSION,
             {"user_id": user_id}
         )
-        conn.commit()
+        await conn.commit()
         row = result.fetchone()
+        _ownership_cache.put((row[0], row[1]), True)
         
         return {
             "id": row[0],
@@ -40,23 +268,18 @@ def create_session(user_id: int) -> Dict[str, Any]:
         }
 
 
-def get_user_sessions(user_id: int) -> List[Dict[str, Any]]:
+async def get_user_sessions(user_id: int) -> List[Dict[str, Any]]:
     """
     Get all sessions for a user, most recent first.
     
     Returns:
         List of session dicts
     """
-    engine = get_engine()
-    
-    with engine.connect() as conn:
-        result = conn.execute(
-            text("""
-                SELECT id, user_id, title, created_at, updated_at
-                FROM chat_session
-                WHERE user_id = :user_id
-                ORDER BY updated_at DESC
-            """),
+    engine = get_async_engine()
+    
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            _SELECT_USER_SESSIONS,
             {"user_id": user_id}
         )
         
@@ -73,7 +296,7 @@ def get_user_sessions(user_id: int) -> List[Dict[str, Any]]:
         return sessions
 
 
-def get_session(session_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+async def get_session(session_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
     """
     Get a specific session.
     If user_id is provided, verifies ownership.
@@ -81,25 +304,17 @@ def get_session(session_id: int, user_id: Optional[int] = None) -> Optional[Dict
     Returns:
         Session dict or None if not found/not owned
     """
-    engine = get_engine()
+    engine = get_async_engine()
     
-    with engine.connect() as conn:
+    async with engine.connect() as conn:
         if user_id is not None:
-            result = conn.execute(
-                text("""
-                    SELECT id, user_id, title, created_at, updated_at
-                    FROM chat_session
-                    WHERE id = :session_id AND user_id = :user_id
-                """),
+            result = await conn.execute(
+                _SELECT_OWNED_SESSION,
                 {"session_id": session_id, "user_id": user_id}
             )
         else:
-            result = conn.execute(
-                text("""
-                    SELECT id, user_id, title, created_at, updated_at
-                    FROM chat_session
-                    WHERE id = :session_id
-                """),
+            result = await conn.execute(
+                _SELECT_SESSION,
                 {"session_id": session_id}
             )
         row = result.fetchone()
@@ -116,32 +331,50 @@ def get_session(session_id: int, user_id: Optional[int] = None) -> Optional[Dict
         }
 
 
-def get_session_messages(session_id: int, user_id: int) -> List[Dict[str, Any]]:
+async def session_belongs_to(session_id: int, user_id: int) -> bool:
+    """
+    Check that a session exists and belongs to a user.
+    Confirmed ownership is cached briefly, so chat turns skip the query.
+    """
+    key = (session_id, user_id)
+    if key in _ownership_cache:
+        return True
+    
+    engine = get_async_engine()
+    
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            _SESSION_OWNED_EXISTS,
+            {"session_id": session_id, "user_id": user_id}
+        )
+        owned = bool(result.scalar())
+    
+    if owned:
+        _ownership_cache.put(key, True)
+    return owned
+
+
+async def get_session_messages(session_id: int, user_id: int) -> List[Dict[str, Any]]:
     """
     Get all messages for a session (verifies ownership).
     
     Returns:
         List of message dicts, ordered by created_at ASC
     """
-    engine = get_engine()
+    engine = get_async_engine()
     
-    with engine.connect() as conn:
+    async with engine.connect() as conn:
         # First verify ownership
-        ownership = conn.execute(
-            text("SELECT 1 FROM chat_session WHERE id = :session_id AND user_id = :user_id"),
+        ownership = (await conn.execute(
+            _SELECT_OWNERSHIP,
             {"session_id": session_id, "user_id": user_id}
-        ).fetchone()
+        )).fetchone()
         
         if not ownership:
             return []
         
-        result = conn.execute(
-            text("""
-                SELECT id, session_id, role, content, sql_query, created_at
-                FROM chat_message
-                WHERE session_id = :session_id
-                ORDER BY created_at ASC
-            """),
+        result = await conn.execute(
+            _SELECT_SESSION_MESSAGES,
             {"session_id": session_id}
         )
         
@@ -159,25 +392,21 @@ def get_session_messages(session_id: int, user_id: int) -> List[Dict[str, Any]]:
         return messages
 
 
-def get_recent_messages(session_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+async def get_recent_messages(
+    session_id: int,
+    limit: int = 5,
+    conn: Optional[AsyncConnection] = None
+) -> List[Dict[str, Any]]:
     """
     Get the most recent N messages for context (memory window).
     
     Returns:
         List of message dicts, ordered by created_at ASC (oldest first within window)
     """
-    engine = get_engine()
-    
-    with engine.connect() as conn:
+    async with _connect(conn) as conn:
         # Get recent messages in reverse order, then reverse again for chronological order
-        result = conn.execute(
-            text("""
-                SELECT id, role, content, sql_query, created_at
-                FROM chat_message
-                WHERE session_id = :session_id
-                ORDER BY created_at DESC
-                LIMIT :limit
-            """),
+        result = await conn.execute(
+            _SELECT_RECENT_MESSAGES,
             {"session_id": session_id, "limit": limit}
         )
         
@@ -195,11 +424,70 @@ def get_recent_messages(session_id: int, limit: int = 5) -> List[Dict[str, Any]]
         return list(reversed(messages))
 
 
-def add_message(
+async def get_conversation_context(session_id: int, conn: Optional[AsyncConnection] = None) -> str:
+    """
+    Format the conversation so far as LLM context.
+    
+    Recent messages are included verbatim, newest last, up to a character
+    budget; earlier user questions appear as a one-line summary. Hot
+    sessions are served from the in-memory window cache.
+    
+    Returns:
+        Formatted context, or "" if the session has no messages.
+    """
+    context = _context_cache.render(session_id)
+    if context is None:
+        token = _context_cache.begin_load(session_id)
+        window = await _load_conversation_window(session_id, conn)
+        _context_cache.finish_load(session_id, token, window)
+        context = window.render()
+    return context
+
+
+async def _load_conversation_window(
+    session_id: int,
+    conn: Optional[AsyncConnection] = None
+) -> _ConversationWindow:
+    """
+    Rebuild a session's window from its stored summary and the messages it
+    doesn't cover yet, persisting the summary if it advanced.
+    """
+    async with _connect(conn) as conn:
+        session = (await conn.execute(
+            _SELECT_SESSION_SUMMARY,
+            {"session_id": session_id}
+        )).fetchone()
+        window = _ConversationWindow(*session) if session else _ConversationWindow()
+        
+        rows = (await conn.execute(
+            _SELECT_UNSUMMARIZED_MESSAGES,
+            {"session_id": session_id, "through_id": window.summary_through_id, "limit": _CONTEXT_LOAD_LIMIT}
+        )).fetchall()
+        
+        changed = False
+        for message_id, role, content in reversed(rows):
+            changed |= window.add(message_id, role, content)
+        
+        if changed:
+            await _save_summary(conn, session_id, window)
+            await conn.commit()
+    
+    return window
+
+
+async def _save_summary(conn, session_id: int, window: _ConversationWindow) -> None:
+    await conn.execute(
+        _UPDATE_SESSION_SUMMARY,
+        {"session_id": session_id, "summary": window.stored_summary(), "through_id": window.summary_through_id}
+    )
+
+
+async def add_message(
     session_id: int,
     role: str,
     content: str,
-    sql_query: Optional[str] = None
+    sql_query: Optional[str] = None,
+    conn: Optional[AsyncConnection] = None
 ) -> Dict[str, Any]:
     """
     Add a message to a session and update session's updated_at.
@@ -209,20 +497,15 @@ def add_message(
         role: 'user' or 'assistant'
         content: The message content
         sql_query: Optional SQL (for assistant messages)
+        conn: Optional connection to use instead of checking one out
     
     Returns:
         The created message dict
     """
-    engine = get_engine()
-    
-    with engine.connect() as conn:
-        # Insert message
-        result = conn.execute(
-            text("""
-                INSERT INTO chat_message (session_id, role, content, sql_query)
-                VALUES (:session_id, :role, :content, :sql_query)
-                RETURNING id, session_id, role, content, sql_query, created_at
-            """),
+    async with _connect(conn) as conn:
+        # Insert message and update session's updated_at
+        result = await conn.execute(
+            _INSERT_MESSAGE,
             {
                 "session_id": session_id,
                 "role": role,
@@ -232,13 +515,17 @@ def add_message(
         )
         row = result.fetchone()
         
-        # Update session's updated_at
-        conn.execute(
-            text("UPDATE chat_session SET updated_at = NOW() WHERE id = :session_id"),
-            {"session_id": session_id}
-        )
-        
-        conn.commit()
+        try:
+            # Keep the cached context window current; persist its summary
+            # in the same transaction when older messages were folded in
+            window = _context_cache.append(session_id, row[0], role, content)
+            if window is not None:
+                await _save_summary(conn, session_id, window)
+            
+            await conn.commit()
+        except Exception:
+            _context_cache.discard(session_id)
+            raise
         
         return {
             "id": row[0],
@@ -250,7 +537,11 @@ def add_message(
         }
 
 
-def auto_title_session(session_id: int, first_message: str) -> str:
+async def auto_title_session(
+    session_id: int,
+    first_message: str,
+    conn: Optional[AsyncConnection] = None
+) -> str:
     """
     Auto-set session title from first user message.
     Takes first ~6-10 words, max 60 chars.
@@ -269,31 +560,23 @@ def auto_title_session(session_id: int, first_message: str) -> str:
     elif len(words) > 8:
         title = title + '...'
     
-    engine = get_engine()
-    
-    with engine.connect() as conn:
-        conn.execute(
-            text("""
-                UPDATE chat_session 
-                SET title = :title 
-                WHERE id = :session_id AND title IS NULL
-            """),
+    async with _connect(conn) as conn:
+        await conn.execute(
+            _SET_SESSION_TITLE,
             {"session_id": session_id, "title": title}
         )
-        conn.commit()
+        await conn.commit()
     
     return title
 
 
-def should_auto_title(session_id: int) -> bool:
+async def should_auto_title(session_id: int, conn: Optional[AsyncConnection] = None) -> bool:
     """
     Check if a session needs auto-titling (has no title yet).
     """
-    engine = get_engine()
-    
-    with engine.connect() as conn:
-        result = conn.execute(
-            text("SELECT title FROM chat_session WHERE id = :session_id"),
+    async with _connect(conn) as conn:
+        result = await conn.execute(
+            _SELECT_SESSION_TITLE,
             {"session_id": session_id}
         )
         row = result.fetchone()
@@ -2,11 +2,15 @@
 LLM client wrapper with retries and timeouts.
 """
 import os
-import json
-from typing import Optional, List, Dict, Any
+from typing import Optional, Iterator, List, Dict, Any
 
-# OpenAI client will be lazy-loaded
+from pydantic import BaseModel, ValidationError
+
+from app.services.sql_exec import ColumnData, column_length, rows_csv_from_columns
+
+# OpenAI clients will be lazy-loaded
 _openai_client = None
+_async_openai_client = None
 
 
 class LLMError(Exception):
@@ -14,6 +18,13 @@ class LLMError(Exception):
     pass
 
 
+class SQLPlan(BaseModel):
+    """Structured SQL generation result returned in a single LLM call."""
+    sql: str
+    assumptions: List[str] = []
+    follow_up_questions: List[str] = []
+
+
 def _get_openai_client():
     """Get or create OpenAI client (lazy initialization)."""
     global _openai_client
@@ -32,6 +43,24 @@ def _get_openai_client():
     return _openai_client
 
 
+def _get_async_openai_client():
+    """Get or create the async OpenAI client, for streaming on the event loop."""
+    global _async_openai_client
+    
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise LLMError("OPENAI_API_KEY environment variable is not set")
+    
+    if _async_openai_client is None:
+        try:
+            from openai import AsyncOpenAI
+            _async_openai_client = AsyncOpenAI(api_key=api_key)
+        except ImportError:
+            raise LLMError("openai package is not installed")
+    
+    return _async_openai_client
+
+
 def is_llm_available() -> bool:
     """Check if LLM is available (API key is set)."""
     return bool(os.environ.get("OPENAI_API_KEY"))
@@ -43,7 +72,8 @@ def chat_completion(
     temperature: float = 0.0,
     max_tokens: int = 2000,
     timeout: float = 30.0,
-    retries: int = 2
+    retries: int = 2,
+    response_format: Optional[Dict[str, str]] = None
 ) -> str:
     """
     Call OpenAI chat completion with retries.
@@ -55,6 +85,7 @@ def chat_completion(
         max_tokens: Maximum response tokens
         timeout: Request timeout in seconds
         retries: Number of retry attempts
+        response_format: Optional response format (e.g. {"type": "json_object"})
         
     Returns:
         The assistant's response text
@@ -64,6 +95,10 @@ def chat_completion(
     """
     client = _get_openai_client()
     
+    extra_args: Dict[str, Any] = {}
+    if response_format is not None:
+        extra_args["response_format"] = response_format
+    
     last_error = None
     for attempt in range(retries + 1):
         try:
@@ -72,7 +107,8 @@ def chat_completion(
                 messages=messages,  # type: ignore
                 temperature=temperature,
                 max_tokens=max_tokens,
-                timeout=timeout
+                timeout=timeout,
+                **extra_args
             )
             return response.choices[0].message.content or ""
         except Exception as e:
@@ -99,10 +135,14 @@ def generate_sql(
     Returns:
         Generated SQL query string
     """
-    from app.agent.prompts import get_sql_generation_prompt
+    from app.agent.prompts import get_sql_generation_prompt_parts
     
+    # Stable instructions + schema go first as their own message so the
+    # provider's prefix cache covers them; per-request content comes last
+    static_prefix, dynamic_suffix = get_sql_generation_prompt_parts(schema_info, dialect)
     messages = [
-        {"role": "system", "content": get_sql_generation_prompt(schema_info, dialect)},
+        {"role": "system", "content": static_prefix},
+        {"role": "system", "content": dynamic_suffix.strip()},
         {"role": "user", "content": user_question}
     ]
     
@@ -113,6 +153,49 @@ def generate_sql(
     return sql
 
 
+def generate_sql_plan(
+    user_question: str,
+    schema_info: str,
+    dialect: str = "postgres"
+) -> SQLPlan:
+    """
+    Generate SQL, assumptions and follow-up questions in one LLM call.
+    
+    Args:
+        user_question: The user's natural language question
+        schema_info: String describing available tables and columns
+        dialect: SQL dialect to use
+        
+    Returns:
+        SQLPlan with the generated query and its context
+        
+    Raises:
+        LLMError: If the call fails or returns an invalid plan
+    """
+    from app.agent.prompts import get_sql_plan_prompt_parts
+    
+    static_prefix, dynamic_suffix = get_sql_plan_prompt_parts(schema_info, dialect)
+    messages = [
+        {"role": "system", "content": static_prefix},
+        {"role": "system", "content": dynamic_suffix.strip()},
+        {"role": "user", "content": user_question}
+    ]
+    
+    response = chat_completion(
+        messages,
+        temperature=0.0,
+        response_format={"type": "json_object"}
+    )
+    
+    try:
+        plan = SQLPlan.model_validate_json(response)
+    except ValidationError as e:
+        raise LLMError(f"LLM returned an invalid SQL plan: {e}")
+    
+    # Models sometimes wrap the SQL in markdown even inside JSON
+    return plan.model_copy(update={"sql": _extract_sql(plan.sql)})
+
+
 def fix_sql(
     original_sql: str,
     error_message: str,
@@ -202,36 +285,29 @@ Generate 2-3 clarifying questions.
     return questions[:3]
 
 
-def summarize_results(
+def _summarization_messages(
     user_question: str,
     sql_used: str,
     columns: List[str],
-    rows: List[Dict[str, Any]],
+    column_data: ColumnData,
     assumptions: List[str],
     schema_summary: str
-) -> str:
-    """
-    Generate a business-friendly answer summarizing query results.
-    
-    Args:
-        user_question: Original user question
-        sql_used: The SQL query that was executed
-        columns: Column names from result
-        rows: Result rows (limited to first 50)
-        assumptions: Assumptions made during query generation
-        schema_summary: Brief schema context
-        
-    Returns:
-        Human-readable summary of the results
-    """
+) -> List[Dict[str, Any]]:
+    """Build the chat messages for result summarization."""
     from app.agent.prompts import get_summarization_prompt
     
-    # Format rows for display (limit to 50)
-    display_rows = rows[:50]
-    rows_text = json.dumps(display_rows, indent=2, default=str)
+    # Format rows for display (up to 50, within the prompt byte budget)
+    rows_text, shown = rows_csv_from_columns(column_data)
     
-    messages = [
-        {"role": "system", "content": get_summarization_prompt()},
+    # Static instructions and schema context first (cacheable prefix),
+    # then the per-request question, SQL and rows
+    return [
+        {"role": "system", "content": f"""{get_summarization_prompt()}
+
+Schema Context: {schema_summary}
+
+Please provide a concise, business-friendly summary of the results you are given. 
+Only reference numbers that appear in the data. Do not hallucinate."""},
         {"role": "user", "content": f"""
 User Question: {user_question}
 
@@ -240,22 +316,86 @@ SQL Executed:
 
 Result Columns: {', '.join(columns)}
 
-Result Data (up to 50 rows):
+Result Data as CSV (first {shown} of {column_length(column_data)} rows):
 {rows_text}
 
 Assumptions Made: {', '.join(assumptions) if assumptions else 'None'}
-
-Schema Context: {schema_summary}
-
-Please provide a concise, business-friendly summary of these results. 
-Only reference numbers that appear in the data. Do not hallucinate.
 """}
     ]
+
+
+def summarize_results(
+    user_question: str,
+    sql_used: str,
+    columns: List[str],
+    column_data: ColumnData,
+    assumptions: List[str],
+    schema_summary: str
+) -> str:
+    """
+    Generate a business-friendly answer summarizing query results.
+    
+    Args:
+        user_question: Original user question
+        sql_used: The SQL query that was executed
+        columns: Column names from result
+        column_data: Result values per column (up to 50 rows within a 4 KB budget are shown)
+        assumptions: Assumptions made during query generation
+        schema_summary: Brief schema context
+        
+    Returns:
+        Human-readable summary of the results
+    """
+    messages = _summarization_messages(
+        user_question, sql_used, columns, column_data, assumptions, schema_summary
+    )
     
     response = chat_completion(messages, temperature=0.2, max_tokens=500)
     return response.strip()
 
 
+def summarize_results_stream(
+    user_question: str,
+    sql_used: str,
+    columns: List[str],
+    column_data: ColumnData,
+    assumptions: List[str],
+    schema_summary: str,
+    model: str = "gpt-4o-mini",
+    timeout: float = 30.0
+) -> Iterator[str]:
+    """
+    Stream a business-friendly summary of query results token by token.
+    
+    Takes the same arguments as summarize_results.
+    
+    Yields:
+        Answer text chunks as the model produces them
+        
+    Raises:
+        LLMError: If the streaming call fails
+    """
+    client = _get_openai_client()
+    messages = _summarization_messages(
+        user_question, sql_used, columns, column_data, assumptions, schema_summary
+    )
+    
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,  # type: ignore
+            temperature=0.2,
+            max_tokens=500,
+            timeout=timeout,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        raise LLMError(f"LLM streaming call failed: {e}")
+
+
 def _extract_sql(response: str) -> str:
     """Extract SQL from LLM response, handling markdown code blocks."""
     response = response.strip()
@@ -0,0 +1,82 @@
+"""
+In-process cache of complete chat responses for repeated questions.
+"""
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from app.agent.schema import SCHEMA_FINGERPRINT
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+
+
+# Case, punctuation and spacing don't change the question being asked
+_NORMALIZE_RE = re.compile(r"[^a-z0-9]+")
+
+
+class CachedResponse(NamedTuple):
+    """A successful workflow result for a question."""
+    answer: str
+    sql: str
+    assumptions: Tuple[str, ...]
+    vega_lite_spec: Dict[str, Any]
+    follow_up_questions: Tuple[str, ...]
+    row_count: int
+
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache mapping questions to full chat responses.
+
+    Only questions asked without earlier conversation are cached, since a
+    follow-up's answer depends on what came before. The TTL bounds how
+    stale the underlying data may be.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self._entries: TTLCache[Tuple[str, str], CachedResponse] = TTLCache(max_entries, ttl_seconds)
+
+    @staticmethod
+    def _key(question: str) -> Tuple[str, str]:
+        return SCHEMA_FINGERPRINT, _NORMALIZE_RE.sub(" ", question.lower()).strip()
+
+    def get(self, question: str) -> Optional[CachedResponse]:
+        """Return the cached response for a question, or None if missing/expired."""
+        return self._entries.get(self._key(question))
+
+    def put(
+        self,
+        question: str,
+        answer: str,
+        sql: str,
+        assumptions: Sequence[str],
+        vega_lite_spec: Dict[str, Any],
+        follow_up_questions: Sequence[str],
+        row_count: int,
+    ) -> None:
+        """Store a successful response for a question."""
+        self._entries.put(self._key(question), CachedResponse(
+            answer, sql, tuple(assumptions), vega_lite_spec, tuple(follow_up_questions), row_count
+        ))
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        self._entries.clear()
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the shared response cache (singleton)."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                settings = get_settings()
+                _response_cache = ResponseCache(
+                    max_entries=settings.response_cache_max_entries,
+                    ttl_seconds=settings.response_cache_ttl_seconds,
+                )
+    return _response_cache
@@ -0,0 +1,61 @@
+"""
+In-process cache of generated SQL, keyed by question and schema version.
+"""
+import threading
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+from app.agent.schema import SCHEMA_FINGERPRINT
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+
+
+class CachedSQL(NamedTuple):
+    """A validated SQL query previously generated for a question."""
+    sql: str
+    assumptions: Tuple[str, ...]
+
+
+class SQLCache:
+    """
+    Thread-safe TTL + LRU cache mapping questions to generated SQL.
+
+    Keys include the schema fingerprint, so entries generated against an
+    older schema description are never returned.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self._entries: TTLCache[Tuple[str, str], CachedSQL] = TTLCache(max_entries, ttl_seconds)
+
+    @staticmethod
+    def _key(question: str) -> Tuple[str, str]:
+        return SCHEMA_FINGERPRINT, " ".join(question.lower().split())
+
+    def get(self, question: str) -> Optional[CachedSQL]:
+        """Return the cached SQL for a question, or None if missing/expired."""
+        return self._entries.get(self._key(question))
+
+    def put(self, question: str, sql: str, assumptions: Sequence[str] = ()) -> None:
+        """Store SQL that was validated and executed for a question."""
+        self._entries.put(self._key(question), CachedSQL(sql, tuple(assumptions)))
+
+    def clear(self) -> None:
+        """Drop all cached entries."""
+        self._entries.clear()
+
+
+_sql_cache: Optional[SQLCache] = None
+_sql_cache_lock = threading.Lock()
+
+
+def get_sql_cache() -> SQLCache:
+    """Get the shared SQL cache (singleton)."""
+    global _sql_cache
+    if _sql_cache is None:
+        with _sql_cache_lock:
+            if _sql_cache is None:
+                settings = get_settings()
+                _sql_cache = SQLCache(
+                    max_entries=settings.sql_cache_max_entries,
+                    ttl_seconds=settings.sql_cache_ttl_seconds,
+                )
+    return _sql_cache
@@ -1,8 +1,11 @@
 """
 Safe SQL execution with timeout and row cap.
 """
+import csv
+import io
 import time
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Sequence, Tuple, Optional
+
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -10,16 +13,66 @@ from app.db.engine import get_engine
 from app.core.config import get_settings
 
 
+# Query results are kept column-wise: column name -> values in row order.
+# This avoids building a dict per row; prompt formatting writes only the rows
+# it shows as CSV via rows_csv_from_columns.
+ColumnData = Dict[str, List[Any]]
+
+
 class SQLExecutionError(Exception):
     """Exception raised when SQL execution fails."""
     pass
 
 
+def columns_from_rows(columns: List[str], rows: Sequence[Sequence[Any]]) -> ColumnData:
+    """Transpose row tuples into per-column value lists."""
+    if not rows:
+        return {col: [] for col in columns}
+    return dict(zip(columns, map(list, zip(*rows))))
+
+
+def rows_csv_from_columns(
+    column_data: ColumnData,
+    max_rows: int = 50,
+    max_chars: int = 4096,
+    max_cell_chars: int = 120
+) -> Tuple[str, int]:
+    """
+    Format leading rows as CSV (header line first) for an LLM prompt.
+
+    CSV names each column once instead of once per row, so it costs far
+    fewer prompt tokens than JSON objects. Rows are added until max_rows or
+    max_chars is reached and long cells are cut to max_cell_chars, so wide
+    results can't blow up the prompt. The first row is always included.
+
+    Returns:
+        Tuple of (CSV text, number of rows included)
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(column_data)
+    shown = 0
+    end = buffer.tell()
+    values = [column_data[name][:max_rows] for name in column_data]
+    for row in zip(*values):
+        writer.writerow(["" if v is None else str(v)[:max_cell_chars] for v in row])
+        if shown and buffer.tell() > max_chars:
+            break
+        shown += 1
+        end = buffer.tell()
+    return buffer.getvalue()[:end], shown
+
+
+def column_length(column_data: ColumnData) -> int:
+    """Number of rows held in column data."""
+    return len(next(iter(column_data.values()), ()))
+
+
 def execute_query(
     sql: str,
     timeout_seconds: float = 30.0,
     row_cap: int = 200
-) -> Tuple[List[str], List[Dict[str, Any]], int]:
+) -> Tuple[List[str], ColumnData, int]:
     """
     Execute a SQL query safely with timeout and row cap.
     
@@ -29,7 +82,7 @@ def execute_query(
         row_cap: Maximum number of rows to return
         
     Returns:
-        Tuple of (columns, rows_as_dicts, total_row_count)
+        Tuple of (columns, column_data, total_row_count)
         
     Raises:
         SQLExecutionError: If execution fails
@@ -56,13 +109,12 @@ def execute_query(
             if total_count > effective_row_cap:
                 rows = rows[:effective_row_cap]
             
-            # Convert to list of dicts
-            rows_as_dicts = [dict(zip(columns, row)) for row in rows]
+            column_data = columns_from_rows(columns, rows)
             
             # Reset statement timeout
             conn.execute(text("SET statement_timeout = 0"))
             
-            return columns, rows_as_dicts, total_count
+            return columns, column_data, total_count
             
     except SQLAlchemyError as e:
         error_msg = str(e)
@@ -82,7 +134,7 @@ def execute_query(
 
 def sanity_check_results(
     columns: List[str],
-    rows: List[Dict[str, Any]],
+    column_data: ColumnData,
     row_count: int
 ) -> Tuple[bool, Optional[str]]:
     """
@@ -90,7 +142,7 @@ def sanity_check_results(
     
     Args:
         columns: Column names
-        rows: Result rows
+        column_data: Result values per column
         row_count: Total row count
         
     Returns:
@@ -107,10 +159,9 @@ def sanity_check_results(
         warnings.append(f"Very large result set ({row_count} rows). Consider adding filters.")
     
     # Check for potential null-heavy columns
-    if rows:
+    if column_length(column_data):
         for col in columns:
-            null_count = sum(1 for row in rows if row.get(col) is None)
-            if null_count == len(rows):
+            if all(value is None for value in column_data.get(col, ())):
                 warnings.append(f"Column '{col}' contains only NULL values.")
     
     warning_msg = ' '.join(warnings) if warnings else None
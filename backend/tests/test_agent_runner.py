@@ -0,0 +1,83 @@
+"""
+Tests for the queue-fed workflow runner.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from app.agent import runner
+from app.agent.runner import AgentRunner
+
+
+class TestAgentRunner:
+    """Tests for AgentRunner."""
+    
+    def test_runs_job_off_the_event_loop(self, monkeypatch):
+        """Jobs run on a worker thread and their result is returned."""
+        loop_thread = threading.get_ident()
+        
+        def fake_run_agent(session_id, user_question, conversation_context, on_token):
+            assert threading.get_ident() != loop_thread
+            return {"answer": f"{session_id}:{user_question}:{conversation_context}"}
+        
+        monkeypatch.setattr(runner, "run_agent", fake_run_agent)
+        
+        async def run():
+            agent = AgentRunner(workers=2)
+            agent.start()
+            results = await asyncio.gather(*(agent.run(str(i), "q", "ctx") for i in range(3)))
+            await agent.stop()
+            return results
+        
+        results = asyncio.run(run())
+        assert [r["answer"] for r in results] == ["0:q:ctx", "1:q:ctx", "2:q:ctx"]
+    
+    def test_error_propagates(self, monkeypatch):
+        """Exceptions from the workflow are raised to the caller."""
+        def failing_run_agent(*args):
+            raise ValueError("boom")
+        
+        monkeypatch.setattr(runner, "run_agent", failing_run_agent)
+        
+        async def run():
+            agent = AgentRunner(workers=1)
+            agent.start()
+            try:
+                await agent.run("1", "q")
+            finally:
+                await agent.stop()
+        
+        with pytest.raises(ValueError, match="boom"):
+            asyncio.run(run())
+    
+    def test_runs_directly_before_start(self, monkeypatch):
+        """Without start() jobs still run."""
+        monkeypatch.setattr(runner, "run_agent", lambda *args: {"answer": "ok"})
+        assert asyncio.run(AgentRunner().run("1", "q"))["answer"] == "ok"
+    
+    def test_stop_fails_running_job(self, monkeypatch):
+        """A job still running when the runner stops fails instead of hanging."""
+        started = threading.Event()
+        release = threading.Event()
+        
+        def slow_run_agent(*args):
+            started.set()
+            release.wait(5)
+            return {"answer": "late"}
+        
+        monkeypatch.setattr(runner, "run_agent", slow_run_agent)
+        
+        async def run():
+            agent = AgentRunner(workers=1)
+            agent.start()
+            job = asyncio.ensure_future(agent.run("1", "q"))
+            await asyncio.to_thread(started.wait, 5)
+            await agent.stop()
+            try:
+                return await asyncio.wait_for(job, 1)
+            finally:
+                release.set()
+        
+        with pytest.raises(RuntimeError, match="Agent runner stopped"):
+            asyncio.run(run())
@@ -110,3 +110,16 @@ def test_chat_session_id():
     assert response.status_code == 200
     data = response.json()
     assert "answer" in data
+
+
+def test_me_without_session():
+    """/auth/me returns null rather than 401 when not logged in."""
+    response = client.get("/api/auth/me")
+    assert response.status_code == 200
+    assert response.json() is None
+
+
+def test_protected_endpoint_without_session():
+    """Endpoints using require_auth reject anonymous requests."""
+    response = client.get("/api/sessions")
+    assert response.status_code == 401
@@ -0,0 +1,98 @@
+"""
+Tests for the batched audit writer.
+"""
+import asyncio
+import time
+
+from app.audit import writer
+from app.audit.writer import AuditRecord, AuditThrottle, AuditWriter
+
+
+def _record(i: int) -> AuditRecord:
+    return AuditRecord(str(i), f"question {i}", None, i, 0, None)
+
+
+def _async_sink(sink):
+    """Stand-in for insert_audit_logs_async that hands each batch to sink."""
+    async def insert(records):
+        sink(records)
+    return insert
+
+
+class TestAuditWriter:
+    """Tests for AuditWriter batching."""
+    
+    def test_records_flushed_in_one_batch(self, monkeypatch):
+        """Records submitted together are written in a single insert."""
+        batches = []
+        monkeypatch.setattr(writer, "insert_audit_logs_async", _async_sink(batches.append))
+        
+        async def run():
+            audit = AuditWriter(max_wait_ms=20)
+            audit.start()
+            for i in range(5):
+                audit.submit(_record(i))
+            await asyncio.sleep(0.1)
+            await audit.stop()
+        
+        asyncio.run(run())
+        assert len(batches) == 1
+        assert [r["session_id"] for r in batches[0]] == ["0", "1", "2", "3", "4"]
+    
+    def test_stop_flushes_pending(self, monkeypatch):
+        """Stopping the writer writes records still in the queue."""
+        written = []
+        monkeypatch.setattr(writer, "insert_audit_logs_async", _async_sink(written.extend))
+        
+        async def run():
+            audit = AuditWriter(max_wait_ms=10_000)
+            audit.start()
+            audit.submit(_record(1))
+            await asyncio.sleep(0)
+            await audit.stop()
+        
+        asyncio.run(run())
+        assert len(written) == 1
+    
+    def test_full_queue_drops_oldest(self, monkeypatch):
+        """When the queue is full the oldest record is dropped."""
+        written = []
+        monkeypatch.setattr(writer, "insert_audit_logs_async", _async_sink(written.extend))
+        
+        async def run():
+            audit = AuditWriter(max_queue=2)
+            audit.start()
+            for i in range(3):
+                audit.submit(_record(i))
+            await audit.stop()
+            return audit.dropped
+        
+        assert asyncio.run(run()) == 1
+        assert [r["session_id"] for r in written] == ["1", "2"]
+    
+    def test_submit_without_start_writes_immediately(self, monkeypatch):
+        """Without a running flusher records are written synchronously."""
+        written = []
+        monkeypatch.setattr(writer, "insert_audit_logs", lambda records: written.extend(records))
+        AuditWriter().submit(_record(1))
+        assert len(written) == 1
+
+
+class TestAuditThrottle:
+    """Tests for AuditThrottle."""
+    
+    def test_one_record_per_interval(self):
+        """Within an interval only the first record is allowed."""
+        throttle = AuditThrottle(interval_seconds=60)
+        assert throttle.allow() == (True, 0)
+        assert throttle.allow() == (False, 0)
+        assert throttle.allow() == (False, 0)
+    
+    def test_reports_suppressed_count(self):
+        """The next allowed record reports how many were suppressed."""
+        throttle = AuditThrottle(interval_seconds=0.05)
+        throttle.allow()
+        throttle.allow()
+        throttle.allow()
+        time.sleep(0.06)
+        assert throttle.allow() == (True, 2)
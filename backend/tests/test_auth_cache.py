@@ -0,0 +1,34 @@
+"""
+Tests for the authentication lookup cache.
+"""
+from datetime import datetime, timedelta
+
+from app.services import auth
+
+
+class TestAuthCache:
+    """Tests for cached session and user lookups."""
+    
+    def setup_method(self):
+        auth.clear_auth_caches()
+    
+    def teardown_method(self):
+        auth.clear_auth_caches()
+    
+    def test_cached_user_skips_database(self, monkeypatch):
+        """A cached user should be returned without touching the engine."""
+        auth._user_cache.put(1, {"id": 1, "email": "a@b.c", "display_name": "A"})
+        monkeypatch.setattr(auth, "get_engine", lambda: (_ for _ in ()).throw(AssertionError))
+        assert auth.get_user_by_id(1)["email"] == "a@b.c"
+    
+    def test_cached_value_is_a_copy(self):
+        """Mutating a returned dict must not change the cache."""
+        auth._user_cache.put(1, {"id": 1, "email": "a@b.c", "display_name": "A"})
+        auth.get_user_by_id(1)["email"] = "x"
+        assert auth.get_user_by_id(1)["email"] == "a@b.c"
+    
+    def test_expired_session_not_served(self, monkeypatch):
+        """Sessions past expires_at are dropped even if still cached."""
+        auth._session_cache.put("s", {"user_id": 1, "expires_at": datetime.utcnow() - timedelta(seconds=1)})
+        assert auth.get_session("s") is None
+        assert auth._session_cache.get("s") is None
@@ -0,0 +1,53 @@
+"""
+Tests for the shared TTL + LRU cache.
+"""
+from app.core.cache import TTLCache
+
+
+class TestTTLCache:
+    """Tests for TTLCache."""
+
+    def test_get_and_contains(self):
+        """Stored values are returned; unknown keys miss."""
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        cache.put("a", 1)
+        assert cache.get("a") == 1
+        assert "a" in cache
+        assert cache.get("b") is None
+        assert "b" not in cache
+
+    def test_expired_entry(self):
+        """Entries past their TTL are not returned and are dropped on read."""
+        cache = TTLCache(max_entries=10, ttl_seconds=0)
+        cache.put("a", 1)
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        """A read refreshes recency; the least recently used entry goes first."""
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_put_replaces_value(self):
+        """Storing an existing key replaces its value without growing the cache."""
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("a", 2)
+        assert cache.get("a") == 2
+        assert len(cache) == 1
+
+    def test_pop_and_clear(self):
+        """pop removes one entry and returns it; clear removes all."""
+        cache = TTLCache(max_entries=10, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.pop("a") == 1
+        assert cache.pop("a") is None
+        cache.clear()
+        assert len(cache) == 0
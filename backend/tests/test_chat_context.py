@@ -0,0 +1,142 @@
+"""
+Tests for the conversation context window and its cache.
+"""
+import asyncio
+
+from app.services import chat_history
+from app.services.chat_history import CONTEXT_MAX_CHARS, _ConversationWindow
+
+
+class TestConversationContext:
+    """Tests for get_conversation_context caching."""
+    
+    def setup_method(self):
+        chat_history._context_cache.clear()
+    
+    def teardown_method(self):
+        chat_history._context_cache.clear()
+    
+    def test_loaded_once_then_cached(self, monkeypatch):
+        """The window is read from the database only on a miss."""
+        loads = []
+        
+        async def fake_load(session_id, conn=None):
+            loads.append(session_id)
+            window = _ConversationWindow()
+            window.add(1, "user", "hi")
+            return window
+        
+        monkeypatch.setattr(chat_history, "_load_conversation_window", fake_load)
+        assert asyncio.run(chat_history.get_conversation_context(1)) == "Previous conversation:\nUser: hi"
+        assert asyncio.run(chat_history.get_conversation_context(1)) == "Previous conversation:\nUser: hi"
+        assert loads == [1]
+    
+    def test_new_messages_extend_window(self, monkeypatch):
+        """Appended messages show up without reloading."""
+        async def empty_load(session_id, conn=None):
+            return _ConversationWindow()
+        
+        monkeypatch.setattr(chat_history, "_load_conversation_window", empty_load)
+        assert asyncio.run(chat_history.get_conversation_context(1)) == ""
+        chat_history._context_cache.append(1, 1, "user", "q")
+        chat_history._context_cache.append(1, 2, "assistant", "a")
+        assert asyncio.run(chat_history.get_conversation_context(1)) == "Previous conversation:\nUser: q\nAssistant: a"
+    
+    def test_append_during_load_discards_load(self):
+        """A load that raced with a new message is not cached."""
+        cache = chat_history._context_cache
+        token = cache.begin_load(1)
+        cache.append(1, 2, "user", "new")
+        cache.finish_load(1, token, _ConversationWindow())
+        assert cache.render(1) is None
+
+
+class TestConversationWindow:
+    """Tests for the character budget and summary."""
+    
+    def test_old_questions_summarized(self):
+        """Messages over the budget fall out; their questions are summarized."""
+        window = _ConversationWindow()
+        long_answer = "x" * (CONTEXT_MAX_CHARS // 2)
+        changed = [
+            window.add(1, "user", "first question"),
+            window.add(2, "assistant", long_answer),
+            window.add(3, "user", "second question"),
+            window.add(4, "assistant", long_answer),
+        ]
+        assert changed == [False, False, False, True]
+        assert window.summary == ["first question"]
+        assert window.summary_through_id == 2
+        lines = window.render().split("\n")
+        assert lines[1] == "Earlier questions: first question"
+        assert lines[2:] == ["User: second question", "Assistant: " + long_answer]
+    
+    def test_summary_round_trips_through_storage(self):
+        """The stored summary restores the same window summary."""
+        window = _ConversationWindow("q1\nq2", 7)
+        assert window.summary == ["q1", "q2"]
+        assert window.stored_summary() == "q1\nq2"
+        assert window.summary_through_id == 7
+    
+    def test_oversized_message_kept_truncated(self):
+        """A single message larger than the budget is still included, cut short."""
+        window = _ConversationWindow()
+        window.add(1, "assistant", "x" * (CONTEXT_MAX_CHARS * 2))
+        line = window.render().split("\n")[1]
+        assert line.startswith("Assistant: x") and line.endswith("...")
+        assert len(line) < CONTEXT_MAX_CHARS + 20
+
+
+class TestSharedConnection:
+    """Tests for passing one connection through several history calls."""
+    
+    def test_given_connection_is_used(self, monkeypatch):
+        """A caller-supplied connection is used instead of the pool."""
+        def no_engine():
+            raise AssertionError("engine should not be used")
+        
+        class FakeResult:
+            def fetchone(self):
+                return (None,)
+        
+        class FakeConn:
+            def __init__(self):
+                self.statements = []
+            
+            async def execute(self, statement, params):
+                self.statements.append(statement)
+                return FakeResult()
+        
+        monkeypatch.setattr(chat_history, "get_async_engine", no_engine)
+        conn = FakeConn()
+        assert asyncio.run(chat_history.should_auto_title(1, conn=conn))
+        assert conn.statements == [chat_history._SELECT_SESSION_TITLE]
+    
+    def test_context_load_uses_given_connection(self, monkeypatch):
+        """A context cache miss loads the window on the caller's connection."""
+        def no_engine():
+            raise AssertionError("engine should not be used")
+        
+        class FakeResult:
+            def __init__(self, row=None, rows=()):
+                self.row, self.rows = row, rows
+            
+            def fetchone(self):
+                return self.row
+            
+            def fetchall(self):
+                return list(self.rows)
+        
+        class FakeConn:
+            async def execute(self, statement, params):
+                if statement is chat_history._SELECT_SESSION_SUMMARY:
+                    return FakeResult(row=(None, None))
+                return FakeResult(rows=[(1, "user", "hi")])
+        
+        chat_history._context_cache.clear()
+        monkeypatch.setattr(chat_history, "get_async_engine", no_engine)
+        try:
+            context = asyncio.run(chat_history.get_conversation_context(1, conn=FakeConn()))
+        finally:
+            chat_history._context_cache.clear()
+        assert context == "Previous conversation:\nUser: hi"
@@ -0,0 +1,126 @@
+"""
+Tests for the streamed (Accept: text/event-stream) branch of POST /api/chat.
+"""
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from app.agent import runner
+from app.api import chat
+from app.api.auth import require_auth
+from app.main import app
+from app.services.response_cache import ResponseCache
+
+
+def _events(body: str) -> list:
+    """(event type, decoded payload) for every frame in an SSE body."""
+    events = []
+    for frame in body.split("\n\n"):
+        lines = frame.split("\n")
+        if lines[0].startswith("event: "):
+            events.append((lines[0][len("event: "):], orjson.loads(lines[1][len("data: "):])))
+    return events
+
+
+class _AuditRecorder:
+    """Stands in for the audit writer and keeps submitted records."""
+
+    def __init__(self):
+        self.records = []
+
+    def submit(self, record):
+        self.records.append(record)
+
+
+class TestChatStream:
+    """Tests for token streaming from the chat endpoint."""
+
+    @pytest.fixture(autouse=True)
+    def _stub_services(self, monkeypatch):
+        self.messages = []
+        self.audit = _AuditRecorder()
+
+        async def fake_belongs(session_id, user_id):
+            return True
+
+        async def fake_should_auto_title(session_id):
+            return False
+
+        async def fake_add_message(session_id, role, content, sql_query=None):
+            self.messages.append((role, content, sql_query))
+
+        async def fake_context(session_id):
+            return ""
+
+        monkeypatch.setattr(chat, "session_belongs_to", fake_belongs)
+        monkeypatch.setattr(chat, "should_auto_title", fake_should_auto_title)
+        monkeypatch.setattr(chat, "add_message", fake_add_message)
+        monkeypatch.setattr(chat, "build_conversation_context", fake_context)
+        monkeypatch.setattr(chat, "is_llm_available", lambda: True)
+        monkeypatch.setattr(chat, "get_audit_writer", lambda: self.audit)
+        monkeypatch.setattr(chat, "get_response_cache", ResponseCache)
+        app.dependency_overrides[require_auth] = lambda: {"id": 1}
+        yield
+        app.dependency_overrides.pop(require_auth, None)
+
+    def _post(self):
+        client = TestClient(app)
+        return client.post(
+            "/api/chat",
+            json={"message": "Top products?", "session_id": 7},
+            headers={"Accept": "text/event-stream"},
+        )
+
+    def test_tokens_then_complete(self, monkeypatch):
+        """Session, token events, then one complete event; the answer is stored and audited."""
+        def fake_run_agent(session_id, question, context, on_token):
+            for token in ("Aspirin ", "leads."):
+                on_token(token)
+            return {"answer": "Aspirin leads.", "sql_candidate": "SELECT name FROM product", "row_count": 1}
+
+        monkeypatch.setattr(runner, "run_agent", fake_run_agent)
+        response = self._post()
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _events(response.text)
+        types = [event for event, _ in events]
+        assert types[0] == "session" and events[0][1]["session_id"] == 7
+        assert set(types[1:-1]) == {"token"}
+        assert types[-1] == "complete"
+        assert "".join(payload["token"] for event, payload in events if event == "token") == "Aspirin leads."
+        complete = events[-1][1]
+        assert complete["request_id"] == events[0][1]["request_id"]
+        assert complete["answer"] == "Aspirin leads."
+        assert complete["sql"] == "SELECT name FROM product"
+        assert complete["metadata"]["session_id"] == 7
+        assert self.messages == [
+            ("user", "Top products?", None),
+            ("assistant", "Aspirin leads.", "SELECT name FROM product"),
+        ]
+        assert len(self.audit.records) == 1
+        assert self.audit.records[0].sql_text == "SELECT name FROM product"
+        assert self.audit.records[0].error_text is None
+
+    def test_workflow_error_ends_with_error_event(self, monkeypatch):
+        """A failing workflow ends the stream with an error event and is still recorded."""
+        def failing_run_agent(session_id, question, context, on_token):
+            on_token("partial")
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(runner, "run_agent", failing_run_agent)
+        events = _events(self._post().text)
+
+        assert [event for event, _ in events] == ["session", "token", "error"]
+        assert events[-1][1]["error"] == "boom"
+        assert self.messages[-1][0] == "assistant"
+        assert self.audit.records[0].error_text == "Unexpected error: boom"
+
+    def test_llm_unavailable_single_complete(self, monkeypatch):
+        """Responses decided before the workflow are sent as one complete event."""
+        monkeypatch.setattr(chat, "is_llm_available", lambda: False)
+        monkeypatch.setattr(runner, "run_agent", lambda *args: pytest.fail("workflow should not run"))
+        events = _events(self._post().text)
+
+        assert [event for event, _ in events] == ["session", "complete"]
+        assert "OPENAI_API_KEY" in events[1][1]["answer"]
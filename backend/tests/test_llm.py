@@ -0,0 +1,60 @@
+"""
+Tests for LLM response parsing.
+"""
+import orjson
+import pytest
+
+from app.services import llm
+from app.services.llm import LLMError, generate_sql_plan
+
+
+class TestGenerateSqlPlan:
+    """Tests for the single-call SQL plan with a stubbed chat_completion."""
+
+    def _stub_response(self, monkeypatch, response: str):
+        calls = []
+
+        def fake_chat_completion(messages, **kwargs):
+            calls.append(kwargs)
+            return response
+
+        monkeypatch.setattr(llm, "chat_completion", fake_chat_completion)
+        return calls
+
+    def test_valid_plan(self, monkeypatch):
+        """A well-formed JSON plan is returned as an SQLPlan in JSON mode."""
+        calls = self._stub_response(monkeypatch, orjson.dumps({
+            "sql": "SELECT name FROM product",
+            "assumptions": ["All time"],
+            "follow_up_questions": ["By region?"],
+        }).decode())
+        plan = generate_sql_plan("Top products?", "product: id, name")
+        assert plan.sql == "SELECT name FROM product"
+        assert plan.assumptions == ["All time"]
+        assert plan.follow_up_questions == ["By region?"]
+        assert calls[0]["response_format"] == {"type": "json_object"}
+
+    def test_optional_lists_default_empty(self, monkeypatch):
+        """Assumptions and follow-ups may be omitted."""
+        self._stub_response(monkeypatch, '{"sql": "SELECT 1"}')
+        plan = generate_sql_plan("q", "schema")
+        assert plan.assumptions == []
+        assert plan.follow_up_questions == []
+
+    @pytest.mark.parametrize("response", [
+        "not json",
+        '{"assumptions": []}',
+        '{"sql": ["SELECT 1"]}',
+    ])
+    def test_invalid_plan_raises(self, monkeypatch, response):
+        """Malformed JSON or a plan missing/mistyping sql raises LLMError."""
+        self._stub_response(monkeypatch, response)
+        with pytest.raises(LLMError, match="invalid SQL plan"):
+            generate_sql_plan("q", "schema")
+
+    def test_fenced_sql_unwrapped(self, monkeypatch):
+        """SQL wrapped in a markdown fence inside the JSON is extracted."""
+        self._stub_response(monkeypatch, orjson.dumps({
+            "sql": "```sql\nSELECT name FROM product\n```",
+        }).decode())
+        assert generate_sql_plan("q", "schema").sql == "SELECT name FROM product"
@@ -0,0 +1,33 @@
+"""
+Tests for the startup schema migrations.
+"""
+import asyncio
+import contextlib
+
+from app.db import migrations
+
+
+class TestApplyMigrations:
+    """Tests for apply_migrations."""
+    
+    def test_runs_every_statement_in_one_transaction(self, monkeypatch):
+        """All migrations run on a single transactional connection."""
+        executed = []
+        
+        class FakeConn:
+            async def execute(self, statement):
+                executed.append(str(statement))
+        
+        class FakeEngine:
+            @contextlib.asynccontextmanager
+            async def begin(self):
+                yield FakeConn()
+        
+        monkeypatch.setattr(migrations, "get_async_engine", FakeEngine)
+        asyncio.run(migrations.apply_migrations())
+        assert executed == [str(statement) for statement in migrations._MIGRATIONS]
+    
+    def test_statements_are_idempotent(self):
+        """Every statement can run against an already-upgraded database."""
+        for statement in migrations._MIGRATIONS:
+            assert "IF NOT EXISTS" in str(statement)
@@ -0,0 +1,28 @@
+"""
+Tests for the chat response cache.
+"""
+from app.services.response_cache import ResponseCache
+
+
+def _put(cache, question, answer="answer"):
+    cache.put(question, answer, "SELECT name FROM product", ["a"], {"mark": "bar"}, ["f"], 3)
+
+
+class TestResponseCache:
+    """Tests for ResponseCache."""
+    
+    def test_hit_ignores_case_punctuation_and_spacing(self):
+        """Near-identical phrasings share an entry."""
+        cache = ResponseCache()
+        _put(cache, "Top products by revenue?")
+        entry = cache.get("  top products, by REVENUE ")
+        assert entry is not None
+        assert entry.answer == "answer"
+        assert entry.assumptions == ("a",)
+        assert entry.row_count == 3
+    
+    def test_different_question_misses(self):
+        """Different questions don't share an entry."""
+        cache = ResponseCache()
+        _put(cache, "top products by revenue")
+        assert cache.get("top territories by revenue") is None
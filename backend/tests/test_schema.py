@@ -0,0 +1,180 @@
+"""
+Tests for schema allowlist and grounding.
+"""
+from app.agent.schema import (
+    validate_schema_references,
+    ground_schema_for_question,
+    get_schema_info_string,
+    get_schema_summary,
+    ALLOWED_SCHEMA,
+    SCHEMA_FINGERPRINT,
+)
+
+
+class TestSchemaReferences:
+    """Tests for schema reference validation."""
+
+    def test_valid_qualified_columns(self):
+        """Columns qualified with an allowed table should pass."""
+        sql = "SELECT product.name, product.category FROM product"
+        is_valid, violations = validate_schema_references(sql)
+        assert is_valid
+        assert violations == []
+
+    def test_unknown_column(self):
+        """Unknown column on an allowed table should fail."""
+        sql = "SELECT product.nme FROM product"
+        is_valid, violations = validate_schema_references(sql)
+        assert not is_valid
+        assert "nme" in violations[0]
+
+    def test_unknown_unqualified_column(self):
+        """Unqualified columns are resolved against the tables in scope."""
+        is_valid, violations = validate_schema_references("SELECT nme FROM product")
+        assert not is_valid
+        assert "nme" in violations[0]
+
+    def test_unknown_aliased_column(self):
+        """Columns qualified by a table alias are checked against the real table."""
+        is_valid, violations = validate_schema_references("SELECT p.nme FROM product p")
+        assert not is_valid
+        assert "nme" in violations[0]
+
+    def test_ambiguous_column_left_to_db(self):
+        """Columns present in several joined tables are not flagged."""
+        sql = "SELECT name FROM product p JOIN territory t ON p.id = t.id"
+        is_valid, _ = validate_schema_references(sql)
+        assert is_valid
+
+    def test_blocked_table(self):
+        """Blocked table (audit_log) should fail."""
+        sql = "SELECT id FROM audit_log"
+        is_valid, violations = validate_schema_references(sql)
+        assert not is_valid
+        assert "audit_log" in violations[0]
+
+    def test_unknown_table(self):
+        """Unknown table should fail."""
+        sql = "SELECT id FROM secret_table"
+        is_valid, violations = validate_schema_references(sql)
+        assert not is_valid
+        assert "secret_table" in violations[0]
+
+    def test_parse_error(self):
+        """Unparseable SQL should fail."""
+        is_valid, violations = validate_schema_references("SELECT FROM WHERE (((")
+        assert not is_valid
+        assert "parse error" in violations[0].lower()
+
+    def test_rejects_dml_before_parsing(self):
+        """DML/DDL keywords should be rejected without parsing."""
+        for sql in ("DELETE FROM product", "drop table product", "SELECT 1; UPDATE product SET name = 'x'"):
+            is_valid, violations = validate_schema_references(sql)
+            assert not is_valid
+            assert violations == ["Non-SELECT statement forbidden"]
+
+    def test_rejects_non_select_start(self):
+        """Statements that don't start with SELECT or WITH should be rejected."""
+        is_valid, violations = validate_schema_references("EXPLAIN SELECT name FROM product")
+        assert not is_valid
+
+    def test_keywords_in_literals_and_comments_allowed(self):
+        """Keywords inside strings or comments should not trigger the DML reject."""
+        for sql in (
+            "SELECT name FROM product WHERE category = 'Update'",
+            "-- top products\nSELECT name FROM product",
+            "/* delete me */ SELECT name FROM product",
+        ):
+            is_valid, violations = validate_schema_references(sql)
+            assert is_valid, violations
+
+    def test_allows_parenthesized_select(self):
+        """A leading parenthesis (e.g. a UNION of subqueries) should be allowed."""
+        sql = "(SELECT name FROM product) UNION (SELECT name FROM territory)"
+        is_valid, violations = validate_schema_references(sql)
+        assert is_valid, violations
+
+    def test_rejects_dml_after_comment(self):
+        """Blanking comments should not hide a real DML statement."""
+        is_valid, violations = validate_schema_references("-- note\nDELETE FROM product")
+        assert not is_valid
+        assert violations == ["Non-SELECT statement forbidden"]
+
+    def test_allows_cte(self):
+        """WITH queries over allowed tables should pass."""
+        sql = "WITH p AS (SELECT product.name FROM product) SELECT name FROM p"
+        is_valid, _ = validate_schema_references(sql)
+        assert is_valid
+
+
+class TestSchemaStrings:
+    """Tests for the precomputed schema descriptions."""
+
+    def test_schema_info_lists_every_table(self):
+        """Schema info should describe every allowed table."""
+        info = get_schema_info_string()
+        for table in ALLOWED_SCHEMA:
+            assert f"{table}:" in info
+
+    def test_schema_fingerprint_is_stable(self):
+        """
+        The schema text must not drift unnoticed: any change busts every
+        cached prompt prefix. Update this value deliberately with the schema.
+        """
+        assert SCHEMA_FINGERPRINT == (
+            "55ca9b7267a8063e4023f795f78874383eb322cf19749cabda8f3b0e2958a842"
+        )
+
+    def test_schema_summary(self):
+        """Schema summary should be a non-empty string."""
+        assert get_schema_summary()
+
+
+class TestSchemaGrounding:
+    """Tests for question-to-table grounding."""
+
+    def test_single_table(self):
+        """Question about doctors should ground to hcp only."""
+        grounded = ground_schema_for_question("Which doctors are in the list?")
+        assert list(grounded) == ["hcp"]
+
+    def test_substring_fallback(self):
+        """Keyword variants that aren't whole words still ground via substring."""
+        grounded = ground_schema_for_question("Show regional numbers")
+        assert list(grounded) == ["territory"]
+
+    def test_sales_pulls_in_all_tables(self):
+        """Sales questions need every related table."""
+        grounded = ground_schema_for_question("Show total sales")
+        assert set(grounded) == set(ALLOWED_SCHEMA)
+
+    def test_multiple_tables_in_schema_order(self):
+        """Several mentioned tables are returned in schema order."""
+        grounded = ground_schema_for_question("Which doctors prescribe each product?")
+        assert list(grounded) == ["product", "hcp"]
+
+    def test_no_keywords_returns_all_tables(self):
+        """Questions without table keywords fall back to the full schema."""
+        grounded = ground_schema_for_question("hello there")
+        assert set(grounded) == set(ALLOWED_SCHEMA)
+
+
+class TestIntrospectionCache:
+    """Tests for the introspection TTL cache."""
+
+    def test_cached_within_ttl(self, monkeypatch):
+        """Repeated calls within the TTL should query the database once."""
+        from app.agent import schema
+
+        calls = []
+
+        def fake_introspect():
+            calls.append(1)
+            return {"product": ["id"]}
+
+        monkeypatch.setattr(schema, "_introspect_schema_uncached", fake_introspect)
+        monkeypatch.setitem(schema._introspect_cache, "expires", 0.0)
+
+        assert schema.introspect_schema() == {"product": ["id"]}
+        assert schema.introspect_schema() == {"product": ["id"]}
+        assert len(calls) == 1
@@ -0,0 +1,21 @@
+"""
+Tests for the generated SQL cache.
+"""
+from app.services.sql_cache import SQLCache
+
+
+class TestSQLCache:
+    """Tests for SQLCache."""
+    
+    def test_hit_ignores_case_and_whitespace(self):
+        """Questions differing only in case/whitespace share an entry."""
+        cache = SQLCache()
+        cache.put("Top products by revenue?", "SELECT name FROM product", ["a"])
+        entry = cache.get("top  products BY revenue?")
+        assert entry is not None
+        assert entry.sql == "SELECT name FROM product"
+        assert entry.assumptions == ("a",)
+    
+    def test_miss(self):
+        """Unknown questions should miss."""
+        assert SQLCache().get("anything") is None
@@ -0,0 +1,81 @@
+"""
+Tests for column-wise query results.
+"""
+from decimal import Decimal
+
+from app.services.chart import generate_chart_spec
+from app.services.sql_exec import (
+    columns_from_rows,
+    rows_csv_from_columns,
+    sanity_check_results,
+)
+
+
+class TestColumnData:
+    """Tests for converting row tuples to column data."""
+    
+    def test_transpose(self):
+        """Row tuples become per-column value lists in row order."""
+        data = columns_from_rows(["name", "total"], [("A", 1), ("B", 2)])
+        assert data == {"name": ["A", "B"], "total": [1, 2]}
+    
+    def test_empty_result_keeps_columns(self):
+        """An empty result still lists every column."""
+        assert columns_from_rows(["a", "b"], []) == {"a": [], "b": []}
+    
+    def test_rows_csv_budget(self):
+        """Prompt rows stop at the size budget but always include the first row."""
+        data = columns_from_rows(["text"], [("x" * 100,) for _ in range(10)])
+        text, shown = rows_csv_from_columns(data, max_chars=350)
+        assert shown == 3
+        assert text.splitlines()[0] == "text"
+        assert len(text.splitlines()) == 4
+        assert rows_csv_from_columns(data, max_chars=10)[1] == 1
+    
+    def test_rows_csv_cells(self):
+        """Cells are quoted as needed, truncated, and NULLs are empty."""
+        data = columns_from_rows(["name", "note"], [("A, Inc", None), ("B", "y" * 200)])
+        text, shown = rows_csv_from_columns(data, max_cell_chars=6)
+        assert shown == 2
+        assert text == 'name,note\n"A, Inc",\nB,yyyyyy\n'
+    
+    def test_null_column_warning(self):
+        """All-NULL columns are reported by the sanity check."""
+        data = columns_from_rows(["a", "b"], [(1, None), (2, None)])
+        _, warning = sanity_check_results(["a", "b"], data, 2)
+        assert "'b'" in warning
+
+
+class TestChartFromColumns:
+    """Tests for chart generation from column data."""
+    
+    def test_bar_chart_values(self):
+        """Bar chart values hold only the plotted fields, sanitized."""
+        data = columns_from_rows(
+            ["id", "product_name", "total_revenue"],
+            [(1, "A", Decimal("1.5")), (2, "B", Decimal("2"))],
+        )
+        spec = generate_chart_spec(["id", "product_name", "total_revenue"], data)
+        assert spec["mark"] == "bar"
+        assert spec["data"]["values"] == [
+            {"product_name": "A", "total_revenue": 1.5},
+            {"product_name": "B", "total_revenue": 2.0},
+        ]
+    
+    def test_bar_chart_keeps_largest_values(self):
+        """Large bar charts plot the top values, in result order."""
+        from app.services.chart import MAX_CHART_POINTS
+        
+        revenues = [i % 7 for i in range(MAX_CHART_POINTS * 3)]
+        data = columns_from_rows(
+            ["name", "revenue"], [(f"p{i}", r) for i, r in enumerate(revenues)]
+        )
+        values = generate_chart_spec(["name", "revenue"], data)["data"]["values"]
+        assert len(values) == MAX_CHART_POINTS
+        assert min(v["revenue"] for v in values) >= sorted(revenues)[-MAX_CHART_POINTS]
+        names = [int(v["name"][1:]) for v in values]
+        assert names == sorted(names)
+    
+    def test_no_rows(self):
+        """Empty results produce no chart."""
+        assert generate_chart_spec(["a"], columns_from_rows(["a"], [])) == {}
@@ -0,0 +1,370 @@
+"""
+Tests for the SSE streaming layer.
+"""
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+from app.api import streaming
+from app.api.streaming import (
+    StreamingWorkflowRunner,
+    batch_sse_frames,
+    format_sse_event,
+    with_keepalive,
+)
+from app.services.response_cache import ResponseCache
+
+
+def _payload(frame: bytes) -> dict:
+    """Decode the JSON data line of a single SSE frame."""
+    data_line = frame.split(b"\n")[1]
+    assert data_line.startswith(b"data: ")
+    return orjson.loads(data_line[len(b"data: "):])
+
+
+def _event_types(body: bytes) -> list:
+    """Event names of every frame in a response body, in order."""
+    return [line[len(b"event: "):].decode() for line in body.split(b"\n") if line.startswith(b"event: ")]
+
+
+async def _collect(frames) -> list:
+    return [frame async for frame in frames]
+
+
+class _AuditRecorder:
+    """Stands in for the audit writer and keeps submitted records."""
+
+    def __init__(self):
+        self.records = []
+
+    def submit(self, record):
+        self.records.append(record)
+
+
+class TestFormatSseEvent:
+    """Tests for SSE frame formatting."""
+
+    def test_frame_layout(self):
+        """A frame is an event line, a JSON data line and a blank line."""
+        frame = format_sse_event("status", {"step": "x"}, "req-1")
+        assert frame.startswith(b"event: status\ndata: ")
+        assert frame.endswith(b"\n\n")
+        payload = _payload(frame)
+        assert payload["request_id"] == "req-1"
+        assert payload["step"] == "x"
+        assert "timestamp" in payload
+
+    def test_token_without_timestamp(self):
+        """Token frames can skip the timestamp."""
+        frame = format_sse_event("token", {"token": "hi"}, "req-1", with_timestamp=False)
+        assert _payload(frame) == {"request_id": "req-1", "token": "hi"}
+
+    def test_unknown_event_type(self):
+        """Event types without a precomputed prefix are still formatted."""
+        frame = format_sse_event("custom", {"a": 1}, "req-1", with_timestamp=False)
+        assert frame == b'event: custom\ndata: {"request_id":"req-1","a":1}\n\n'
+
+
+class TestBatchSseFrames:
+    """Tests for joining SSE frames into response chunks."""
+
+    def setup_method(self):
+        self.runner = StreamingWorkflowRunner("req-1")
+
+    def test_tokens_joined_and_flushed_before_other_events(self):
+        """Held tokens go out, in order, together with the next non-token event."""
+        tokens = [self.runner.token_event(t) for t in ("a", "b", "c")]
+        complete = self.runner.complete_event({"answer": "abc"})
+
+        async def frames():
+            for frame in tokens:
+                yield frame
+            yield complete
+
+        chunks = asyncio.run(_collect(batch_sse_frames(frames())))
+        assert chunks == [b"".join(tokens) + complete]
+
+    def test_non_token_event_flushes_immediately(self):
+        """A status event is never held back."""
+        status = self.runner.status_event("generating_sql", "...")
+        token = self.runner.token_event("a")
+
+        async def frames():
+            yield status
+            yield token
+
+        chunks = asyncio.run(_collect(batch_sse_frames(frames())))
+        assert chunks == [status, token]
+
+    def test_size_limit_flushes(self, monkeypatch):
+        """Tokens are flushed once FRAME_BATCH_BYTES accumulate."""
+        token = self.runner.token_event("a")
+        monkeypatch.setattr(streaming, "FRAME_BATCH_BYTES", len(token) * 2)
+
+        async def frames():
+            for _ in range(4):
+                yield token
+
+        chunks = asyncio.run(_collect(batch_sse_frames(frames())))
+        assert chunks == [token * 2, token * 2]
+
+    def test_held_token_flushed_when_source_is_quiet(self):
+        """A held token goes out at the deadline, not when the next frame arrives."""
+        token = self.runner.token_event("a")
+
+        async def frames():
+            yield token
+            await asyncio.sleep(0.5)
+            yield token
+
+        async def first_chunk():
+            batches = batch_sse_frames(frames())
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            chunk = await batches.__anext__()
+            elapsed = loop.time() - started
+            await batches.aclose()
+            return chunk, elapsed
+
+        chunk, elapsed = asyncio.run(first_chunk())
+        assert chunk == token
+        assert elapsed < 0.25
+
+
+class TestWithKeepalive:
+    """Tests for the keep-alive wrapper."""
+
+    def test_frames_forwarded_without_ping_when_busy(self):
+        """No ping is added while frames keep arriving."""
+        async def frames():
+            for i in range(10):
+                await asyncio.sleep(0.02)
+                yield b"frame %d" % i
+
+        chunks = asyncio.run(_collect(with_keepalive(frames(), interval=0.1)))
+        assert chunks == [b"frame %d" % i for i in range(10)]
+
+    def test_ping_when_idle(self):
+        """An idle interval produces a keep-alive comment."""
+        async def frames():
+            yield b"first"
+            await asyncio.sleep(0.35)
+            yield b"last"
+
+        chunks = asyncio.run(_collect(with_keepalive(frames(), interval=0.1)))
+        assert chunks[0] == b"first"
+        assert chunks[-1] == b"last"
+        assert set(chunks[1:-1]) == {streaming._SSE_KEEPALIVE}
+
+    def test_producer_exception_reraised(self):
+        """An error raised by the source reaches the consumer."""
+        async def frames():
+            yield b"first"
+            raise ValueError("boom")
+
+        async def consume():
+            seen = []
+            with pytest.raises(ValueError, match="boom"):
+                async for frame in with_keepalive(frames(), interval=10):
+                    seen.append(frame)
+            return seen
+
+        assert asyncio.run(consume()) == [b"first"]
+
+    def test_aclose_cancels_producer(self):
+        """Closing the stream (client disconnect) cancels the source."""
+        cancelled = []
+
+        async def frames():
+            try:
+                yield b"first"
+                await asyncio.sleep(10)
+                yield b"never"
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def consume():
+            stream = with_keepalive(frames(), interval=10)
+            assert await stream.__anext__() == b"first"
+            await asyncio.sleep(0)
+            await stream.aclose()
+            await asyncio.sleep(0)
+
+        asyncio.run(consume())
+        assert cancelled == [True]
+
+
+class _Delta:
+    def __init__(self, content):
+        self.choices = [SimpleNamespace(delta=SimpleNamespace(content=content))]
+
+
+class _FakeStreamingClient:
+    """Async OpenAI client stand-in whose completions stream fixed deltas."""
+
+    def __init__(self, deltas):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._deltas = deltas
+
+    async def _create(self, **kwargs):
+        assert kwargs["stream"] is True
+
+        async def stream():
+            for delta in self._deltas:
+                yield _Delta(delta)
+
+        return stream()
+
+
+class TestRunWorkflowStreaming:
+    """Tests for the streaming workflow runner."""
+
+    def _patch_pipeline(self, monkeypatch):
+        monkeypatch.setattr(streaming, "is_llm_available", lambda: True)
+        monkeypatch.setattr(streaming, "generate_sql", lambda question, schema: "SELECT name FROM product")
+        monkeypatch.setattr(streaming, "validate_sql", lambda sql: sql)
+        monkeypatch.setattr(streaming, "validate_sql_complete", lambda sql: (True, []))
+        monkeypatch.setattr(streaming, "execute_query", lambda sql: (["name"], {"name": ["Aspirin"]}, 1))
+        monkeypatch.setattr(
+            streaming, "_get_async_openai_client", lambda: _FakeStreamingClient(["Top ", "product ", "is Aspirin."])
+        )
+
+    def test_events_and_result(self, monkeypatch):
+        """Status events for each step, then tokens; the result is left on the runner."""
+        self._patch_pipeline(monkeypatch)
+        runner = StreamingWorkflowRunner("req-1")
+        events = asyncio.run(_collect(runner.run_workflow_streaming("1", "Top products?")))
+
+        steps = [_payload(e)["step"] for e in events if e.startswith(b"event: status")]
+        assert steps == ["analyzing_question", "generating_sql", "executing_sql", "summarizing_answer"]
+        tokens = "".join(_payload(e)["token"] for e in events if e.startswith(b"event: token"))
+        assert tokens == "Top product is Aspirin."
+        assert runner.result["answer"] == "Top product is Aspirin."
+        assert runner.result["sql_candidate"] == "SELECT name FROM product"
+        assert runner.result["row_count"] == 1
+        assert runner.result["column_data"] == {"name": ["Aspirin"]}
+
+    def test_llm_unavailable(self, monkeypatch):
+        """Without an LLM the runner stops after the first status event."""
+        monkeypatch.setattr(streaming, "is_llm_available", lambda: False)
+        runner = StreamingWorkflowRunner("req-1")
+        events = asyncio.run(_collect(runner.run_workflow_streaming("1", "Top products?")))
+        assert len(events) == 1
+        assert "OPENAI_API_KEY" in runner.result["answer"]
+
+    def test_execution_error_reported_in_result(self, monkeypatch):
+        """A failing query ends the run with an explanatory answer."""
+        self._patch_pipeline(monkeypatch)
+
+        def failing_execute(sql):
+            raise streaming.SQLExecutionError("relation missing")
+
+        monkeypatch.setattr(streaming, "execute_query", failing_execute)
+        runner = StreamingWorkflowRunner("req-1")
+        asyncio.run(_collect(runner.run_workflow_streaming("1", "Top products?")))
+        assert runner.result["answer"] == "Query execution failed: relation missing"
+        assert "column_data" not in runner.result
+
+
+class TestStreamChatResponse:
+    """Tests for stream_chat_response setup and the response cache."""
+
+    def _patch_setup(self, monkeypatch, first_question=True):
+        self.messages = []
+        self.audit = _AuditRecorder()
+        self.cache = ResponseCache()
+
+        async def fake_add_message(session_id, role, content, sql_query=None, conn=None):
+            self.messages.append((role, content, sql_query))
+
+        async def fake_should_auto_title(session_id, conn=None):
+            return first_question
+
+        async def fake_auto_title(session_id, message, conn=None):
+            pass
+
+        async def fake_context(session_id, conn=None):
+            return ""
+
+        class FakeEngine:
+            @contextlib.asynccontextmanager
+            async def connect(self):
+                yield None
+
+        monkeypatch.setattr(streaming, "add_message", fake_add_message)
+        monkeypatch.setattr(streaming, "should_auto_title", fake_should_auto_title)
+        monkeypatch.setattr(streaming, "auto_title_session", fake_auto_title)
+        monkeypatch.setattr(streaming, "get_conversation_context", fake_context)
+        monkeypatch.setattr(streaming, "get_async_engine", FakeEngine)
+        monkeypatch.setattr(streaming, "get_audit_writer", lambda: self.audit)
+        monkeypatch.setattr(streaming, "get_response_cache", lambda: self.cache)
+
+    def _run(self, message="Top products?"):
+        async def run():
+            body = b"".join(await _collect(streaming.stream_chat_response(1, 1, message, "req-1")))
+            await asyncio.sleep(0)  # let the background assistant write finish
+            return body
+
+        return asyncio.run(run())
+
+    def test_cache_hit_replays_without_workflow(self, monkeypatch):
+        """A cached first question is answered without running the workflow."""
+        self._patch_setup(monkeypatch)
+        self.cache.put("Top products?", "Aspirin leads.", "SELECT name FROM product", [], {}, [], 1)
+
+        async def no_workflow(*args, **kwargs):
+            raise AssertionError("workflow should not run")
+            yield
+
+        monkeypatch.setattr(StreamingWorkflowRunner, "run_workflow_streaming", no_workflow)
+        body = self._run()
+
+        assert _event_types(body) == ["token", "complete"]
+        assert b'"answer":"Aspirin leads."' in body
+        assert self.messages == [
+            ("user", "Top products?", None),
+            ("assistant", "Aspirin leads.", "SELECT name FROM product"),
+        ]
+        assert [r.error_text for r in self.audit.records] == ["Cache hit"]
+
+    def test_successful_result_cached(self, monkeypatch):
+        """A first question that ran a query is cached for the next ask."""
+        self._patch_setup(monkeypatch)
+
+        async def workflow(self, session_id, question, context=""):
+            yield self.status_event("generating_sql", "...")
+            self.result = {
+                "answer": "Aspirin leads.",
+                "sql_candidate": "SELECT name FROM product",
+                "row_count": 1,
+                "columns": ["name"],
+                "column_data": {"name": ["Aspirin"]},
+            }
+
+        monkeypatch.setattr(StreamingWorkflowRunner, "run_workflow_streaming", workflow)
+        body = self._run()
+
+        assert _event_types(body) == ["status", "complete"]
+        assert self.cache.get("top products").answer == "Aspirin leads."
+        assert [r.error_text for r in self.audit.records] == [None]
+
+    def test_follow_up_not_served_from_cache(self, monkeypatch):
+        """Questions later in a conversation always run the workflow."""
+        self._patch_setup(monkeypatch, first_question=False)
+        self.cache.put("Top products?", "stale", "SELECT 1", [], {}, [], 1)
+        runs = []
+
+        async def workflow(self, session_id, question, context=""):
+            runs.append(question)
+            self.result = {"answer": "fresh"}
+            yield self.status_event("analyzing_question", "...")
+
+        monkeypatch.setattr(StreamingWorkflowRunner, "run_workflow_streaming", workflow)
+        body = self._run()
+
+        assert runs == ["Top products?"]
+        assert b'"answer":"fresh"' in body
@@ -10,6 +10,8 @@ from app.guardrails.validators import (
     validate_sql_complete,
     check_dump_request,
     check_sensitive_request,
+    screen_question,
+    classify_request,
     ValidationError
 )
 
@@ -158,3 +160,55 @@ class TestSensitiveRequest:
         """Normal question should pass."""
         is_sensitive, reason = check_sensitive_request("What are the sales by territory?")
         assert not is_sensitive
+    
+    def test_reason_follows_pattern_priority(self):
+        """With several sensitive words, the higher-priority pattern gives the reason."""
+        expected = "I cannot provide password information."
+        assert check_sensitive_request("show the secret password") == (True, expected)
+        assert screen_question("show the secret password") == (expected, False)
+        assert classify_request("show the secret password") == ("sensitive", expected)
+
+
+class TestScreenQuestion:
+    """Tests for the combined single-pass question screen."""
+    
+    def test_dump_takes_precedence(self):
+        """Dump requests should be refused even when sensitive words appear first."""
+        reason, _ = screen_question("Show the secret table and dump everything")
+        _, dump_reason = check_dump_request("dump everything")
+        assert reason == dump_reason
+    
+    def test_sensitive_reason(self):
+        """Sensitive requests should return the matching refusal."""
+        reason, _ = screen_question("What is the API key?")
+        assert reason == "I cannot provide API key information."
+    
+    def test_vague_keywords(self):
+        """Vague wording should be reported without a refusal."""
+        reason, is_vague = screen_question("Show me something")
+        assert reason is None
+        assert is_vague
+    
+    def test_normal_question_passes(self):
+        """Normal question should pass."""
+        assert screen_question("What are the sales by territory?") == (None, False)
+
+
+class TestClassifyRequest:
+    """Tests for the dump/sensitive request classifier."""
+    
+    def test_ok(self):
+        """Normal questions are classified as ok."""
+        assert classify_request("Top products by revenue") == ("ok", None)
+    
+    def test_dump(self):
+        """Dump requests report the dump refusal."""
+        kind, reason = classify_request("What is the password? Dump everything")
+        assert kind == "dump"
+        assert reason == check_dump_request("dump everything")[1]
+    
+    def test_sensitive(self):
+        """Sensitive requests report the matching refusal."""
+        kind, reason = classify_request("Show me the API key")
+        assert kind == "sensitive"
+        assert reason == check_sensitive_request("Show me the API key")[1]
@@ -0,0 +1,25 @@
+"""
+Tests for workflow state handling.
+"""
+from collections import deque
+
+from app.agent.workflow import _merge_validation_errors
+
+
+class TestMergeValidationErrors:
+    """Tests for the validation_errors reducer."""
+    
+    def test_appends_without_dropping_repeats(self):
+        """Every reported error is kept, in order, even if repeated."""
+        merged = _merge_validation_errors(deque(["a"]), ["b", "a"])
+        assert list(merged) == ["a", "b", "a"]
+    
+    def test_current_not_mutated(self):
+        """The previous value (possibly held by a checkpoint) is left as is."""
+        current = deque(["a"])
+        _merge_validation_errors(current, ["b"])
+        assert list(current) == ["a"]
+    
+    def test_empty_update_clears(self):
+        """An empty update resets the log."""
+        assert list(_merge_validation_errors(deque(["a"]), [])) == []
@@ -5,10 +5,16 @@ CREATE TABLE IF NOT EXISTS chat_session (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL REFERENCES app_user(id) ON DELETE CASCADE,
     title VARCHAR(100),  -- NULL until first message, then auto-set
+    summary TEXT,  -- earlier user questions that fell out of the context window
+    summary_through_id INTEGER,  -- last chat_message.id covered by summary
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- summary / summary_through_id were added after the initial release. This
+-- script only runs on an empty data volume; existing databases get the
+-- columns from backend/app/db/migrations.py when the backend starts.
+
 -- Chat messages table (stores conversation history)
 CREATE TABLE IF NOT EXISTS chat_message (
     id SERIAL PRIMARY KEY,
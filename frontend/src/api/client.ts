@@ -100,7 +100,6 @@ export interface StreamStatusEvent {
 
 export interface StreamTokenEvent {
   request_id: string
-  timestamp: number
   token: string
 }
 